@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件年龄分析
+按文件最后一次使用时间（修改时间和访问时间中较晚的一个）分段统计，
+时间直接取自扫描时已有的stat结果，不需要额外的系统调用
+"""
+
+NS_PER_DAY = 86400 * 1000 * 1000 * 1000
+
+# 年龄分段，从最久未使用到最近使用排列：(名称, 起始天数)
+AGE_BUCKETS = [
+    ("2年以上", 730),
+    ("1-2年", 365),
+    ("90天-1年", 90),
+    ("30-90天", 30),
+    ("30天内", 0),
+]
+AGE_BUCKET_NAMES = [name for name, _ in AGE_BUCKETS]
+AGE_BUCKET_COUNT = len(AGE_BUCKETS)
+
+# 超过该天数未使用的文件视为冷数据
+COLD_DAYS = 365
+
+# 冷数据对应的年龄分段（起始天数不小于COLD_DAYS）
+COLD_BUCKETS = [i for i, (_, days) in enumerate(AGE_BUCKETS) if days >= COLD_DAYS]
+
+
+def age_boundaries(now_ns):
+    """计算分段边界时间戳（纳秒，从早到晚），配合bisect.bisect得到分段编号
+    Returns:
+        list: 长度为AGE_BUCKET_COUNT-1；bisect结果0为最久未使用的分段
+    """
+    return [now_ns - days * NS_PER_DAY for _, days in AGE_BUCKETS[:-1]]
+
+
+def cold_cutoff(now_ns, days=COLD_DAYS):
+    """冷数据的时间界限：最后使用时间早于该值的文件视为冷数据"""
+    return now_ns - days * NS_PER_DAY
+
+
+def cold_bytes(ages):
+    """由各年龄分段的大小计算冷数据大小"""
+    return sum(ages[i] for i in COLD_BUCKETS)
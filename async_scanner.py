@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步扫描接口
+在asyncio程序中扫描目录而不阻塞事件循环：列目录和stat在有界线程池中执行，
+文件记录通过异步迭代器逐个返回，进度可以await等待，多个根目录可以同时扫描
+用法: python async_scanner.py 路径1 [路径2 ...]
+"""
+
+import os
+import sys
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from disk_scanner_simple import DiskScanner, ProgressEstimator, format_size
+
+# 协程中取得正在运行的事件循环；asyncio.get_running_loop需要Python 3.7，
+# 更早的版本在协程中调用get_event_loop得到的也是正在运行的循环
+_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+
+class ScanProgress:
+    """一次异步扫描的进度
+
+    每处理完一个目录（完整扫描时按扫描器的进度间隔）更新一次，
+    await wait()等待下一次更新，扫描结束后立即返回。
+    """
+
+    def __init__(self):
+        self.files = 0          # 已扫描的文件数（流式遍历时为已放入队列的记录数）
+        self.bytes = 0
+        self.dirs_done = 0
+        self.dirs_pending = 0   # 已发现但尚未列完的目录数
+        self.total = 0          # 文件总数估算值
+        self.percent = 0.0
+        self.finished = False
+        self._waiters = []
+
+    def _notify(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(self)
+
+    def _set(self, percent, files, total):
+        """由完整扫描的进度回调更新（通过call_soon_threadsafe在事件循环中调用）"""
+        self.percent = percent
+        self.files = files
+        self.total = total
+        self._notify()
+
+    def _finish(self):
+        self.finished = True
+        self._notify()
+
+    async def wait(self):
+        """等待下一次进度更新
+        Returns:
+            ScanProgress: 自身
+        """
+        if self.finished:
+            return self
+        waiter = _running_loop().create_future()
+        self._waiters.append(waiter)
+        return await waiter
+
+
+class AsyncDirectoryScan:
+    """一次异步流式遍历，用async for逐个取得FileRecord
+
+    后台任务按深度优先顺序调度目录，同时最多concurrency个目录在线程池中列出，
+    列出的记录按目录成批放入有界队列；使用方处理较慢时停止调度新目录，
+    内存占用只与队列长度和单个目录的文件数有关。记录的顺序与目录完成的先后有关。
+    提前结束时调用aclose()（或使用async with）停止后台任务；没有调用就丢弃迭代器
+    （如在async for中break）时，后台任务在迭代器被回收时取消。
+    """
+
+    def __init__(self, scanner, executor, root, min_file_size, include_hidden, concurrency, queue_size):
+        self.root = os.fspath(root)
+        self.min_file_size = min_file_size
+        self.include_hidden = include_hidden
+        self.concurrency = concurrency
+        self.progress = ScanProgress()
+        self._scanner = scanner
+        self._executor = executor
+        self._queue_size = queue_size
+        self._queue = None
+        self._task = None
+        self._batch = []
+        self._batch_pos = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(self._queue_size)
+            # 后台任务只引用队列和进度，不引用迭代器本身，迭代器被丢弃时可以回收
+            self._task = asyncio.ensure_future(_walk(
+                self._scanner, self._executor, self.root, self.min_file_size, self.include_hidden,
+                self.concurrency, self._queue, self.progress))
+        while self._batch_pos >= len(self._batch):
+            # 每取一批记录让出一次事件循环，使用方的同步处理不会长时间占用循环
+            await asyncio.sleep(0)
+            batch = await self._queue.get()
+            if batch is None or isinstance(batch, Exception):
+                self._queue.put_nowait(batch)  # 再次调用__anext__时仍然结束
+                if batch is not None:
+                    raise batch
+                raise StopAsyncIteration
+            self._batch = batch
+            self._batch_pos = 0
+        record = self._batch[self._batch_pos]
+        self._batch_pos += 1
+        return record
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """停止后台调度；已在线程池中列出的目录完成后丢弃"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.progress._finish()
+
+    def __del__(self):
+        # 没有调用aclose()就丢弃了迭代器时取消后台任务，否则它会一直等待在已满的队列上
+        task = getattr(self, '_task', None)
+        if task is not None and not task.done():
+            try:
+                task.cancel()
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+
+async def _walk(scanner, executor, root, min_file_size, include_hidden, concurrency, queue, progress):
+    """AsyncDirectoryScan的后台任务：遍历目录，把记录按目录成批放入队列
+
+    正常结束时最后放入None，出错时放入异常对象，被取消时不再放入。
+    """
+    try:
+        loop = _running_loop()
+        # 挂载表读取和根目录stat也在线程池中进行
+        scanner._root_prefix_len = len(os.path.join(root, ''))
+        await loop.run_in_executor(executor, scanner._prepare_pruning, root)
+
+        read = scanner._read_directory
+        estimator = ProgressEstimator()
+        pending_dirs = [root]
+        running = set()
+        while pending_dirs or running:
+            while pending_dirs and len(running) < concurrency:
+                running.add(loop.run_in_executor(executor, read, pending_dirs.pop(), include_hidden))
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                listing = future.result()
+                progress.dirs_done += 1
+                if listing is None:
+                    continue
+                subdirs, file_count, records = listing
+                pending_dirs.extend(subdirs)
+                estimator.add_directory(file_count, len(subdirs))
+                if min_file_size:
+                    records = [record for record in records if record.size >= min_file_size]
+                if records:
+                    progress.files += len(records)
+                    progress.bytes += sum(record.size for record in records)
+                    # 队列已满时在此等待，不再调度新目录
+                    await queue.put(records)
+            progress.dirs_pending = len(pending_dirs) + len(running)
+            progress.total = estimator.total
+            progress.percent = estimator.progress(estimator.files_seen)
+            progress._notify()
+    except asyncio.CancelledError:
+        progress._finish()
+        raise
+    except Exception as e:
+        end = e
+    else:
+        progress.percent = 100.0
+        end = None
+    progress._finish()
+    await queue.put(end)
+
+
+class AsyncScanner:
+    """asyncio扫描接口
+
+    所有扫描共用一个有界线程池，max_workers限制同时进行的列目录/stat数，
+    每次遍历另有concurrency限制，同时扫描多个根目录时各自只占用部分线程，
+    事件循环只负责调度，不执行阻塞的文件系统调用。
+    每次扫描新建一个扫描器，从设置扫描器（scanner）复制过滤条件等设置，结果和状态互不影响。
+    每次完整扫描作为线程池中的一个任务串行运行：设置扫描器的并行遍历线程/进程数不复制，
+    查找重复文件也只用一个哈希线程，同时进行的扫描数只受max_workers限制。
+    扫描索引、检查点和快照是只能由一次扫描使用的文件，设置扫描器启用了它们时拒绝扫描；
+    哈希缓存内部加锁，各次扫描共用同一个。
+
+    示例:
+        async with AsyncScanner(max_workers=8) as scanner:
+            async for record in scanner.iter_entries("/data"):
+                ...
+    """
+
+    def __init__(self, scanner=None, max_workers=8, concurrency=4, queue_size=16, executor=None):
+        """
+        Args:
+            scanner: 提供设置的DiskScanner，None表示使用默认设置
+            max_workers: 线程池大小（传入executor时忽略）
+            concurrency: 每次遍历同时在线程池中列出的目录数上限
+            queue_size: 每次遍历缓存的目录批次数上限
+            executor: 使用已有的线程池，None表示创建新线程池（close()时关闭）
+        """
+        self.scanner = scanner if scanner is not None else DiskScanner()
+        self.concurrency = max(1, int(concurrency))
+        self.queue_size = max(1, int(queue_size))
+        self._own_executor = executor is None
+        self.executor = executor if executor is not None else ThreadPoolExecutor(
+            max_workers=max(1, int(max_workers)), thread_name_prefix="async_scanner")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """关闭自己创建的线程池"""
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+    def _check_shared_files(self, *features):
+        """设置扫描器启用了不能由多次扫描同时使用的文件时抛出ValueError"""
+        source = self.scanner
+        enabled = {
+            "扫描索引": source.scan_index is not None,
+            "检查点": source.checkpoint is not None,
+            "快照": bool(source.snapshot_path),
+        }
+        for feature in features:
+            if enabled[feature]:
+                raise ValueError(f"异步扫描不支持{feature}")
+
+    def _clone(self):
+        """为一次扫描新建扫描器，只复制设置（安静模式，不在控制台输出扫描过程，串行遍历）"""
+        source = self.scanner
+        scanner = DiskScanner()
+        scanner.set_quiet(True)
+        scanner.file_type_mapping = source.file_type_mapping
+        scanner.classifier = source.classifier
+        scanner.set_file_type_filter(source.file_type_filter)
+        scanner.path_filter = source.path_filter
+        scanner.set_progress_interval(source.progress_interval)
+        scanner.set_estimate_mode(source.estimate_mode)
+        scanner.history_file = source.history_file
+        scanner.set_walker_engine(source.walker_engine)
+        # 串行扫描，不在线程池之外另建工作线程池或进程池
+        scanner.set_parallel_workers(1)
+        scanner.set_duplicate_detection(source.find_duplicates, 1)
+        scanner.hash_cache = source.hash_cache
+        scanner.set_columnar_results(source.collect_columns)
+        scanner.set_memory_budget(source.memory_budget, source.spill_dir)
+        scanner.set_one_filesystem(source.one_filesystem)
+        scanner.set_skip_filesystem_types(source.skip_fs_types)
+        return scanner
+
+    def iter_entries(self, directory_path, min_file_size_kb=0, include_hidden=False):
+        """异步流式遍历，与DiskScanner.iter_entries返回相同的文件记录
+        Returns:
+            AsyncDirectoryScan: 异步迭代器，progress属性为ScanProgress
+        """
+        self._check_shared_files("扫描索引")
+        return AsyncDirectoryScan(self._clone(), self.executor, directory_path, min_file_size_kb * 1024,
+                                  include_hidden, self.concurrency, self.queue_size)
+
+    async def scan_directory(self, directory_path, min_file_size_kb=1, max_files=100, include_hidden=False,
+                             progress=None):
+        """异步执行完整扫描（汇总结果），扫描在线程池中进行，占用一个工作线程
+
+        任务被取消时通过取消令牌停止扫描，等扫描线程在下一个目录处结束后再抛出CancelledError。
+        Args:
+            progress: 接收进度的ScanProgress，None表示不报告进度
+        Returns:
+            DiskScanner: 保存了扫描结果的新扫描器；扫描失败时返回None
+        Raises:
+            ValueError: 设置扫描器启用了扫描索引、检查点或快照
+        """
+        self._check_shared_files("扫描索引", "检查点", "快照")
+        loop = _running_loop()
+        scanner = self._clone()
+        if progress is not None:
+            def report(percent, scanned_files, total):
+                loop.call_soon_threadsafe(progress._set, percent, scanned_files, total)
+            scanner.progress_callback = report
+
+        future = loop.run_in_executor(self.executor, scanner.scan_directory, directory_path,
+                                      min_file_size_kb, max_files, include_hidden)
+        try:
+            ok = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            scanner.cancel()
+            await asyncio.wait([future])
+            raise
+        finally:
+            if progress is not None:
+                progress._finish()
+        return scanner if ok else None
+
+
+async def _stream_root(scanner, root):
+    """流式遍历一个根目录并定期输出进度"""
+    scan = scanner.iter_entries(root)
+    count = 0
+    total = 0
+    async for record in scan:
+        count += 1
+        total += record.size
+        if count % 100000 == 0:
+            print(f"[进度] {root}: {count:,} 个文件, {format_size(total)}")
+    print(f"[信息] {root}: {count:,} 个文件, {format_size(total)}, {scan.progress.dirs_done:,} 个目录")
+
+
+async def _scan_roots(roots):
+    async with AsyncScanner() as scanner:
+        await asyncio.gather(*[_stream_root(scanner, root) for root in roots])
+
+
+def main():
+    """同时流式遍历多个根目录"""
+    roots = sys.argv[1:]
+    if not roots:
+        print("[错误] 请提供扫描路径")
+        return
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(_scan_roots(roots))
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,751 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描器性能基准测试
+在临时目录中生成合成目录树，对比不同扫描配置的耗时
+用法: python benchmark_scanner.py [目录数] [每目录文件数]
+"""
+
+import os
+import io
+import sys
+import asyncio
+import time
+import random
+import shutil
+import tempfile
+import contextlib
+import fnmatch
+import tracemalloc
+from pathlib import Path
+
+import column_stats
+import scan_snapshot
+from async_scanner import AsyncScanner
+from file_records import FileRecordStore
+from path_table import PathTable
+from disk_scanner_simple import DiskScanner
+from path_filter import PathFilter
+
+EXTENSIONS = [".txt", ".mp4", ".jpg", ".zip", ".py", ".pdf", ".log", ".dat", ""]
+
+
+def create_test_tree(base_dir, dir_count=200, files_per_dir=50, seed=42):
+    """生成合成测试目录树
+    Returns:
+        int: 生成的文件总数
+    """
+    rng = random.Random(seed)
+    total = 0
+    for d in range(dir_count):
+        sub_dir = os.path.join(base_dir, f"level{d % 10}", f"dir{d}")
+        os.makedirs(sub_dir, exist_ok=True)
+        for f in range(files_per_dir):
+            ext = rng.choice(EXTENSIONS)
+            with open(os.path.join(sub_dir, f"file{f}{ext}"), 'wb') as fh:
+                fh.write(b'\0' * rng.randint(0, 8192))
+            total += 1
+    return total
+
+
+def run_scan(scan_path, configure=None, repeat=3, min_file_size_kb=1, max_files=100):
+    """运行扫描并返回最短耗时和扫描器实例（屏蔽控制台输出）"""
+    best = None
+    scanner = None
+    for _ in range(repeat):
+        scanner = DiskScanner()
+        scanner.history_file = os.path.join(scan_path, os.pardir, "bench_history.json")
+        if configure:
+            configure(scanner)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            scanner.scan_directory(scan_path, min_file_size_kb, max_files)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, scanner
+
+
+def results_identical(a, b):
+    """比较两个扫描器的结果是否完全一致"""
+    return (a.scanned_files == b.scanned_files
+            and a.total_files == b.total_files
+            and a.total_size == b.total_size
+            and dict(a.file_types) == dict(b.file_types)
+            and [(e.path, e.size, e.allocated) for e in a.largest_files]
+            == [(e.path, e.size, e.allocated) for e in b.largest_files])
+
+
+def bench_walker_engines(scan_path, file_count):
+    """对比 os.walk + Path 与 os.scandir 两种遍历引擎"""
+    print("\n[基准] 遍历引擎对比")
+    print("-" * 60)
+    results = {}
+    for engine in ("walk", "scandir"):
+        elapsed, scanner = run_scan(scan_path, lambda s, e=engine: s.set_walker_engine(e))
+        results[engine] = scanner
+        print(f"{engine:<10} {elapsed:8.3f} 秒  {file_count / elapsed:12,.0f} 文件/秒")
+
+    same = results_identical(results["walk"], results["scandir"])
+    print(f"结果一致: {'是' if same else '否'}")
+
+
+def bench_parallel_workers(scan_path, file_count):
+    """对比不同工作线程/进程数的并行遍历"""
+    print("\n[基准] 并行遍历对比")
+    print("-" * 60)
+    _, serial = run_scan(scan_path, repeat=1)
+    for workers in (1, 2, 4, 8):
+        elapsed, scanner = run_scan(scan_path, lambda s, w=workers: s.set_parallel_workers(w))
+        same = results_identical(serial, scanner)
+        print(f"{workers:>2} 线程   {elapsed:8.3f} 秒  {file_count / elapsed:12,.0f} 文件/秒  "
+              f"结果一致: {'是' if same else '否'}")
+
+    for workers in (2, 4):
+        elapsed, scanner = run_scan(scan_path, lambda s, w=workers: s.set_parallel_workers(w, "processes"))
+        same = results_identical(serial, scanner)
+        print(f"{workers:>2} 进程   {elapsed:8.3f} 秒  {file_count / elapsed:12,.0f} 文件/秒  "
+              f"结果一致: {'是' if same else '否'}")
+
+
+def legacy_classify(scanner, file_ext, selected_types):
+    """旧版分类逻辑：逐个类型遍历过滤，再查另一张类型表（仅用于对比）"""
+    matched = False
+    for type_name, extensions in scanner.file_type_mapping.items():
+        if type_name in selected_types and file_ext in extensions:
+            matched = True
+            break
+    if not matched and "其他文件" in selected_types:
+        known_extensions = set()
+        for extensions in scanner.file_type_mapping.values():
+            known_extensions.update(extensions)
+        matched = file_ext not in known_extensions
+    if not matched:
+        return None
+    legacy_types = {'.txt': '文本文件', '.mp4': '视频', '.jpg': '图片', '.zip': '压缩文件', '.py': '代码文件'}
+    return legacy_types.get(file_ext, f'其他文件({file_ext})') if file_ext else "无扩展名"
+
+
+def bench_classifier(name_count=2000000):
+    """对比旧版分类逻辑与预编译分类器（合成文件名，不涉及磁盘）"""
+    print(f"\n[基准] 文件分类 ({name_count:,} 个合成文件名)")
+    print("-" * 60)
+    rng = random.Random(7)
+    names = [f"file{i}{rng.choice(EXTENSIONS)}" for i in range(name_count)]
+    selected_types = ["视频文件", "文档文件", "其他文件"]
+    scanner = DiskScanner()
+    scanner.set_file_type_filter(selected_types)
+
+    start = time.perf_counter()
+    for name in names:
+        legacy_classify(scanner, os.path.splitext(name)[1].lower(), selected_types)
+    legacy = time.perf_counter() - start
+
+    lookup, other = scanner._category_lookup, scanner._other_category
+    start = time.perf_counter()
+    for name in names:
+        i = name.rfind('.')
+        lookup.get(name[i:].lower() if i > 0 else '', other)
+    compiled = time.perf_counter() - start
+
+    print(f"旧版逻辑   {legacy:8.3f} 秒")
+    print(f"预编译表   {compiled:8.3f} 秒  加速 {legacy / compiled:.1f} 倍")
+
+
+def age_directories(scan_path, seconds=3600):
+    """把目录的修改时间调到过去，模拟长期未变化的目录树"""
+    past = time.time() - seconds
+    for root, dirs, files in os.walk(scan_path):
+        os.utime(root, (past, past))
+
+
+class _SlowDirEntry:
+    """给DirEntry.stat加上固定延迟的代理（模拟NFS等高延迟存储的逐文件stat）"""
+
+    __slots__ = ('_entry', '_latency', 'name', 'path')
+
+    def __init__(self, entry, latency):
+        self._entry = entry
+        self._latency = latency
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks=True):
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def stat(self, follow_symlinks=True):
+        time.sleep(self._latency)
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+
+@contextlib.contextmanager
+def simulated_latency(latency):
+    """在with块中给os.scandir、os.stat和逐文件stat各加上latency秒的延迟"""
+    real_scandir, real_stat = os.scandir, os.stat
+
+    @contextlib.contextmanager
+    def slow_scandir(path):
+        time.sleep(latency)
+        with real_scandir(path) as it:
+            yield (_SlowDirEntry(entry, latency) for entry in it)
+
+    def slow_stat(path, *args, **kwargs):
+        time.sleep(latency)
+        return real_stat(path, *args, **kwargs)
+
+    os.scandir, os.stat = slow_scandir, slow_stat
+    try:
+        yield
+    finally:
+        os.scandir, os.stat = real_scandir, real_stat
+
+
+def bench_scan_index(scan_path, file_count, latency=0.0001):
+    """对比完整扫描与使用扫描索引的重复扫描（本地页缓存和模拟的高延迟存储）"""
+    print("\n[基准] 扫描索引（增量重复扫描）")
+    print("-" * 60)
+    index_path = os.path.join(scan_path, os.pardir, "bench_index.db")
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    age_directories(scan_path)
+
+    full_time, full = run_scan(scan_path, repeat=1)
+    first_time, _ = run_scan(scan_path, lambda s: s.set_scan_index(index_path), repeat=1)
+    rescan_time, rescan = run_scan(scan_path, lambda s: s.set_scan_index(index_path), repeat=3)
+
+    print(f"完整扫描         {full_time:8.3f} 秒")
+    print(f"首次建立索引     {first_time:8.3f} 秒")
+    print(f"未变化时重复扫描 {rescan_time:8.3f} 秒  ({rescan_time / full_time * 100:.0f}% 的完整扫描时间)")
+    print(f"跳过列目录: {rescan.scan_index.hits:,} 个目录, 跳过stat: {file_count:,} 次")
+    print(f"结果一致: {'是' if results_identical(full, rescan) else '否'}")
+    rescan.scan_index.close()
+
+    # 本地页缓存中的元数据访问很快，逐文件的统计处理占了大部分时间；
+    # 索引省去的是列目录和逐文件stat，在每次元数据访问都有网络往返的存储上收益最大
+    with simulated_latency(latency):
+        slow_full_time, slow_full = run_scan(scan_path, repeat=1)
+        slow_rescan_time, slow_rescan = run_scan(scan_path, lambda s: s.set_scan_index(index_path), repeat=1)
+    print(f"模拟高延迟存储 (每次元数据访问 +{latency * 1000:g} 毫秒):")
+    print(f"完整扫描         {slow_full_time:8.3f} 秒")
+    print(f"未变化时重复扫描 {slow_rescan_time:8.3f} 秒  "
+          f"({slow_rescan_time / slow_full_time * 100:.0f}% 的完整扫描时间)  "
+          f"结果一致: {'是' if results_identical(slow_full, slow_rescan) else '否'}")
+    slow_rescan.scan_index.close()
+
+
+def bench_iter_entries(scan_path, file_count):
+    """对比流式遍历（iter_entries）与完整扫描的耗时、首个结果的延迟和内存峰值"""
+    print("\n[基准] 流式遍历 (最小文件大小 0 KB)")
+    print("-" * 60)
+    scanner = DiskScanner()
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    count = 0
+    total = 0
+    for record in scanner.iter_entries(scan_path):
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+        total += record.size
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"iter_entries   {elapsed:8.3f} 秒  首个记录 {first * 1000:7.2f} 毫秒  "
+          f"内存峰值 {peak / 1024:8,.0f} KB  ({count:,} 个文件)")
+
+    tracemalloc.start()
+    elapsed, scanner = run_scan(scan_path, repeat=1, min_file_size_kb=0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"scan_directory {elapsed:8.3f} 秒  {'':23}内存峰值 {peak / 1024:8,.0f} KB  "
+          f"总大小一致: {'是' if scanner.total_size == total else '否'}")
+
+
+def bench_async_scanning(scan_path, file_count, root_count=3):
+    """在事件循环中同时流式遍历多个根目录，统计耗时和事件循环的最大延迟"""
+    print(f"\n[基准] 异步扫描 (同时扫描 {root_count} 个根目录)")
+    print("-" * 60)
+
+    async def monitor(stop, lags):
+        # 每5毫秒唤醒一次，记录实际唤醒比预期晚的时间
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+
+    async def stream(scanner):
+        count = 0
+        async for _ in scanner.iter_entries(scan_path):
+            count += 1
+        return count
+
+    async def blocking():
+        # 直接在协程中调用阻塞的完整扫描（对比）
+        run_scan(scan_path, repeat=1, min_file_size_kb=0)
+        return file_count
+
+    async def measure(make_jobs):
+        stop = asyncio.Event()
+        lags = []
+        watcher = asyncio.ensure_future(monitor(stop, lags))
+        await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        counts = await asyncio.gather(*make_jobs())
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await watcher
+        return elapsed, max(lags), sum(counts)
+
+    async def run_all():
+        results = [("阻塞扫描", await measure(lambda: [blocking() for _ in range(root_count)]))]
+        for workers, concurrency in ((4, 2), (8, 4)):
+            async with AsyncScanner(max_workers=workers, concurrency=concurrency) as scanner:
+                label = f"异步 {workers}线程/{concurrency}并发"
+                results.append((label, await measure(lambda: [stream(scanner) for _ in range(root_count)])))
+        return results
+
+    loop = asyncio.new_event_loop()
+    try:
+        for label, (elapsed, max_lag, count) in loop.run_until_complete(run_all()):
+            print(f"{label:<18} {elapsed:8.3f} 秒  事件循环最大延迟 {max_lag * 1000:8.1f} 毫秒  ({count:,} 个文件)")
+    finally:
+        loop.close()
+
+
+def bench_progress_reporting(scan_path, file_count):
+    """对比有无进度报告时的扫描吞吐量（控制台输出写入os.devnull）"""
+    print("\n[基准] 进度报告开销")
+    print("-" * 60)
+    callback_count = [0]
+
+    def callback(progress, scanned_files, total_files):
+        callback_count[0] += 1
+
+    configs = [
+        ("每个目录都报告", lambda s: (s.set_progress_interval(0), s.set_progress_callback(callback))),
+        ("每100毫秒报告", lambda s: (s.set_progress_interval(0.1), s.set_progress_callback(callback))),
+        ("安静模式无回调", lambda s: s.set_quiet(True)),
+    ]
+    with open(os.devnull, 'w') as devnull:
+        for label, configure in configs:
+            callback_count[0] = 0
+            scanner = DiskScanner()
+            scanner.history_file = os.path.join(scan_path, os.pardir, "bench_history.json")
+            configure(scanner)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(devnull):
+                scanner.scan_directory(scan_path, 1, 100)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<10} {elapsed:8.3f} 秒  {file_count / elapsed:12,.0f} 文件/秒  "
+                  f"回调 {callback_count[0]:,} 次")
+
+
+def bench_duplicates(scan_path, file_count):
+    """统计分阶段查找重复文件读取的数据量（合成树中同样大小的文件内容相同）"""
+    print("\n[基准] 重复文件查找")
+    print("-" * 60)
+    for workers in (1, 4):
+        elapsed, scanner = run_scan(scan_path, lambda s, w=workers: s.set_duplicate_detection(True, w),
+                                    repeat=1, min_file_size_kb=0)
+        candidates = sum(len(paths) for paths in scanner.size_groups.values())
+        candidate_bytes = sum(size * len(paths) for size, paths in scanner.size_groups.items())
+        reclaimable = sum(group.reclaimable for group in scanner.duplicate_groups)
+        print(f"{workers:>2} 线程   {elapsed:8.3f} 秒  候选 {candidates:,} 个 "
+              f"({scanner.format_size(candidate_bytes)}), {len(scanner.duplicate_groups):,} 组, "
+              f"可释放 {scanner.format_size(reclaimable)}")
+
+
+def bench_hash_cache(base_dir, pair_count=100, file_kb=512):
+    """对比有无哈希缓存时重复查找重复文件的耗时（成对的大文件需要完整哈希）"""
+    print(f"\n[基准] 哈希缓存 ({pair_count} 对 {file_kb} KB 的重复文件)")
+    print("-" * 60)
+    dup_path = os.path.join(base_dir, "dups")
+    rng = random.Random(3)
+    for i in range(pair_count):
+        data = bytes(rng.getrandbits(8) for _ in range(64)) * (file_kb * 16)
+        for copy in ("a", "b"):
+            os.makedirs(os.path.join(dup_path, copy), exist_ok=True)
+            with open(os.path.join(dup_path, copy, f"file{i}.dat"), 'wb') as fh:
+                fh.write(data)
+    # 刚写入的文件不会进入缓存，把修改时间调到过去
+    past = time.time() - 3600
+    for root, dirs, files in os.walk(dup_path):
+        for name in files:
+            os.utime(os.path.join(root, name), (past, past))
+
+    cache_path = os.path.join(base_dir, "bench_hash_cache.db")
+
+    def with_cache(s):
+        s.set_duplicate_detection(True)
+        s.set_hash_cache(cache_path)
+
+    no_cache, _ = run_scan(dup_path, lambda s: s.set_duplicate_detection(True), repeat=1)
+    first, _ = run_scan(dup_path, with_cache, repeat=1)
+    cached, scanner = run_scan(dup_path, with_cache, repeat=3)
+    print(f"不使用缓存       {no_cache:8.3f} 秒")
+    print(f"首次建立缓存     {first:8.3f} 秒")
+    print(f"使用缓存重复分析 {cached:8.3f} 秒  命中 {scanner.hash_cache.hits:,} 次, "
+          f"未命中 {scanner.hash_cache.misses:,} 次")
+    scanner.hash_cache.close()
+
+
+def bench_path_patterns(base_dir, project_count=200, excluded_per_project=50):
+    """对比排除模式提前剪除目录与完整遍历（每个项目下有大量被排除的缓存目录）"""
+    excluded_total = project_count * excluded_per_project
+    print(f"\n[基准] 排除模式 ({excluded_total:,} 个被排除的子目录)")
+    print("-" * 60)
+    tree_path = os.path.join(base_dir, "projects")
+    for p in range(project_count):
+        project = os.path.join(tree_path, f"project{p}")
+        os.makedirs(os.path.join(project, "src"), exist_ok=True)
+        with open(os.path.join(project, "src", "main.py"), 'wb') as fh:
+            fh.write(b'\0' * 2048)
+        for c in range(excluded_per_project):
+            cache_dir = os.path.join(project, "node_modules", f"pkg{c}")
+            os.makedirs(cache_dir, exist_ok=True)
+            for f in range(2):
+                with open(os.path.join(cache_dir, f"index{f}.js"), 'wb') as fh:
+                    fh.write(b'\0' * 2048)
+
+    full_time, full = run_scan(tree_path, repeat=3)
+    pruned_time, pruned = run_scan(tree_path, lambda s: s.set_path_patterns(exclude=["node_modules"]), repeat=3)
+    print(f"完整遍历         {full_time:8.3f} 秒  列出 {full._estimator.dirs_done:,} 个目录")
+    print(f"排除node_modules {pruned_time:8.3f} 秒  列出 {pruned._estimator.dirs_done:,} 个目录  "
+          f"({pruned_time / full_time * 100:.0f}% 的完整遍历时间)")
+
+    # 匹配器本身：20个模式合并为一个正则 vs 逐个fnmatch
+    patterns = [f"*.tmp{i}" for i in range(10)] + [f"cache{i}" for i in range(10)]
+    names = [f"file{i}{ext}" for i, ext in enumerate(EXTENSIONS * 50000)]
+    matcher = PathFilter(exclude=patterns)
+    start = time.perf_counter()
+    for name in names:
+        any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+    loop_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for name in names:
+        matcher.is_excluded(name, name)
+    compiled_time = time.perf_counter() - start
+    print(f"逐个fnmatch      {loop_time:8.3f} 秒  ({len(names):,} 个名称, {len(patterns)} 个模式)")
+    print(f"编译后的匹配器   {compiled_time:8.3f} 秒  加速 {loop_time / compiled_time:.1f} 倍")
+
+
+def bench_column_stats(row_count=2000000):
+    """对比列式统计的NumPy实现与纯Python实现（合成的列式结果，不涉及磁盘）"""
+    print(f"\n[基准] 列式统计 ({row_count:,} 行合成结果)")
+    print("-" * 60)
+    rng = random.Random(11)
+    columns = column_stats.ScanColumns()
+    categories = [columns.category_id(f"类型{i}") for i in range(12)]
+    directories = [columns.directory_id(f"/data/dir{i}") for i in range(row_count // 50 + 1)]
+    now_ns = int(time.time() * 1e9)
+    for i in range(row_count):
+        columns.append(int(rng.lognormvariate(10, 3)), now_ns - rng.randrange(10 ** 17),
+                       rng.choice(categories), directories[i // 50])
+
+    def run_all():
+        start = time.perf_counter()
+        result = (column_stats.size_histogram(columns), column_stats.size_percentiles(columns),
+                  column_stats.category_sums(columns), column_stats.directory_sums(columns, 20))
+        return time.perf_counter() - start, result
+
+    numpy_available = column_stats.NUMPY_AVAILABLE
+    column_stats.NUMPY_AVAILABLE = False
+    try:
+        python_time, python_result = run_all()
+    finally:
+        column_stats.NUMPY_AVAILABLE = numpy_available
+    print(f"纯Python    {python_time:8.3f} 秒  (直方图+分位数+按类型+按目录)")
+    if not numpy_available:
+        print("NumPy未安装，跳过向量化实现")
+        return
+    numpy_time, numpy_result = run_all()
+    print(f"NumPy       {numpy_time:8.3f} 秒  加速 {python_time / numpy_time:.1f} 倍  "
+          f"结果一致: {'是' if numpy_result == python_result else '否'}")
+
+
+def bench_record_store(record_count=100000):
+    """对比 (Path, 大小, 实际占用) 元组列表与紧凑记录存储的内存占用和逐行访问耗时"""
+    print(f"\n[基准] 文件记录存储 ({record_count:,} 个文件)")
+    print("-" * 60)
+    rng = random.Random(11)
+    paths = [os.path.join(os.sep, "data", f"project{i % 500}", f"module{i % 37}", f"file_{i}.dat")
+             for i in range(record_count)]
+    sizes = [rng.randint(0, 1 << 30) for _ in range(record_count)]
+
+    def build_tuples():
+        return [(Path(path), size, size) for path, size in zip(paths, sizes)]
+
+    def build_store():
+        store = FileRecordStore()
+        for path, size in zip(paths, sizes):
+            store.append(path, size, size)
+        # 与扫描器相同，建立完成后只保留路径表的各列
+        store.directories.drop_index()
+        return store
+
+    def read_tuples(rows):
+        return sum(len(file_path.name) + len(str(file_path.parent)) + size for file_path, size, _ in rows)
+
+    def read_store(store):
+        return sum(len(entry.name) + len(entry.parent) + entry.size for entry in store)
+
+    checksums = []
+    for label, build, read in (("Path元组列表", build_tuples, read_tuples), ("FileRecordStore", build_store, read_store)):
+        tracemalloc.start()
+        rows = build()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del rows
+        # 另外构建一次计时：tracemalloc会成倍放大创建对象较多的实现的耗时
+        start = time.perf_counter()
+        rows = build()
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        checksums.append(read(rows))
+        read_time = time.perf_counter() - start
+        del rows
+        print(f"{label:<16} 内存 {current / 1024:10,.0f} KB ({current / record_count:6.1f} 字节/行)  "
+              f"构建 {build_time:6.3f} 秒  读取名称/目录 {read_time:6.3f} 秒")
+    print(f"读取结果一致: {'是' if checksums[0] == checksums[1] else '否'}")
+
+
+def bench_path_table(dir_count=200000):
+    """对比完整路径列表加索引字典与前缀压缩路径表的内存占用、构建、查询和路径重建耗时
+
+    路径表的查询字典只在建立和按路径查询时需要，目录树、列式结果和文件记录建立完成后
+    只保留各列（drop_index），显示和导出时只重建路径，因此分别给出两种状态下的内存。
+    """
+    print(f"\n[基准] 目录路径表 ({dir_count:,} 个目录)")
+    print("-" * 60)
+    rng = random.Random(13)
+    root = os.path.join(os.sep, "data", "projects")
+    # 深度不超过8层的随机目录树
+    paths = [root]
+    depths = [0]
+    while len(paths) < dir_count:
+        parent = rng.randrange(len(paths))
+        if depths[parent] < 8:
+            paths.append(os.path.join(paths[parent], f"dir_{len(paths) % 997}"))
+            depths.append(depths[parent] + 1)
+    paths = sorted(set(paths))
+
+    # 两种方式都与DirectoryTree.build一样由normpath得到的新字符串构建
+    def build_list():
+        # 原DirectoryTree的方式：完整路径列表和 路径->编号 字典，二者一直保留
+        rows = [os.path.normpath(path) for path in paths]
+        return rows, {path: i for i, path in enumerate(rows)}
+
+    def build_table():
+        table = PathTable()
+        for path in paths:
+            table.intern(os.path.normpath(path))
+        return table
+
+    def compact_list(rows):
+        return rows
+
+    def compact_table(table):
+        table.drop_index()
+        return table
+
+    def lookup_list(rows):
+        return [rows[1][path] for path in paths]
+
+    def lookup_table(table):
+        return [table.lookup(path) for path in paths]
+
+    def rebuild_list(rows):
+        return [rows[0][i] for i in range(len(rows[0]))]
+
+    def rebuild_table(table):
+        return [table.path(did) for did in range(len(table))]
+
+    results = []
+    for label, build, compact, lookup, rebuild in (
+            ("完整路径列表", build_list, compact_list, lookup_list, rebuild_list),
+            ("PathTable", build_table, compact_table, lookup_table, rebuild_table)):
+        tracemalloc.start()
+        rows = build()
+        indexed, _ = tracemalloc.get_traced_memory()
+        rows = compact(rows)
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del rows
+        # 另外构建一次计时：tracemalloc会成倍放大创建对象较多的实现的耗时
+        start = time.perf_counter()
+        rows = build()
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        ids = lookup(rows)
+        lookup_time = time.perf_counter() - start
+        rows = compact(rows)
+        start = time.perf_counter()
+        rebuilt = rebuild(rows)
+        rebuild_time = time.perf_counter() - start
+        results.append([rebuilt[did] for did in ids])
+        del rows
+        print(f"{label:<12} 内存 {indexed / len(paths):6.1f} 字节/目录 (只保留各列 {retained / len(paths):6.1f})  "
+              f"构建 {build_time:6.3f} 秒  查询 {lookup_time:6.3f} 秒  重建全部路径 {rebuild_time:6.3f} 秒")
+    print(f"路径一致: {'是' if results[0] == results[1] == paths else '否'}")
+
+
+def bench_results_file(scan_path, base_dir, row_count=2000000):
+    """保存二进制结果文件并用mmap重新打开，载入耗时应与行数无关"""
+    print(f"\n[基准] 二进制结果文件 (扫描结果 + {row_count:,} 行合成列式结果)")
+    print("-" * 60)
+    _, scanner = run_scan(scan_path, lambda s: s.set_columnar_results(True), repeat=1, min_file_size_kb=0)
+    rng = random.Random(17)
+    columns = column_stats.ScanColumns()
+    categories = [columns.category_id(f"类型{i}") for i in range(12)]
+    directories = [columns.directory_id(os.path.join(scan_path, f"dir{i}")) for i in range(row_count // 50 + 1)]
+    now_ns = int(time.time() * 1e9)
+    for i in range(row_count):
+        columns.append(int(rng.lognormvariate(10, 3)), now_ns - rng.randrange(10 ** 17),
+                       rng.choice(categories), directories[i // 50])
+    scanner.columns = columns
+    scanner.set_quiet(True)
+
+    results_path = os.path.join(base_dir, "scan_results.bin")
+    start = time.perf_counter()
+    scanner.save_results_file(results_path, scan_path, 0, 100, False)
+    save_time = time.perf_counter() - start
+
+    loaded = DiskScanner()
+    start = time.perf_counter()
+    loaded.load_results(results_path)
+    load_time = time.perf_counter() - start
+    start = time.perf_counter()
+    histogram = column_stats.size_histogram(loaded.columns)
+    stats_time = time.perf_counter() - start
+    same = ([entry.path for entry in loaded.largest_files] == [entry.path for entry in scanner.largest_files]
+            and loaded.directory_tree.top_directories(20) == scanner.directory_tree.top_directories(20)
+            and histogram == column_stats.size_histogram(columns))
+    print(f"保存结果文件 {save_time:8.3f} 秒  {scanner.format_size(os.path.getsize(results_path))}")
+    print(f"mmap载入     {load_time:8.3f} 秒")
+    print(f"载入后直方图 {stats_time:8.3f} 秒  结果一致: {'是' if same else '否'}")
+
+
+def bench_snapshot_diff(base_dir, entry_count=1000000):
+    """写出两个合成快照并对比，统计耗时和内存峰值（不涉及扫描）"""
+    print(f"\n[基准] 快照对比 (每个快照 {entry_count:,} 个文件)")
+    print("-" * 60)
+    rng = random.Random(5)
+    root = os.path.join(base_dir, "snapshot_root")
+    prefix_len = len(os.path.join(root, ""))
+    paths = [os.path.join(root, f"dir{i % 1000}", f"sub{i % 37}", f"file{i}.dat") for i in range(entry_count)]
+    sizes = [rng.randint(0, 1 << 20) for _ in range(entry_count)]
+
+    old_path = os.path.join(base_dir, "old.snapshot")
+    new_path = os.path.join(base_dir, "new.snapshot")
+    start = time.perf_counter()
+    writer = scan_snapshot.SnapshotWriter(prefix_len, temp_dir=base_dir)
+    for path, size in zip(paths, sizes):
+        writer.add(path, size, size)
+    writer.finish(old_path, root)
+    write_time = time.perf_counter() - start
+
+    # 新快照：删除1%，新增1%，1%的文件变大
+    writer = scan_snapshot.SnapshotWriter(prefix_len, temp_dir=base_dir)
+    for i, (path, size) in enumerate(zip(paths, sizes)):
+        if i % 100 == 1:
+            continue
+        writer.add(path, size + (4096 if i % 100 == 2 else 0), size)
+        if i % 100 == 3:
+            writer.add(path + ".new", size, size)
+    writer.finish(new_path, root)
+    del paths, sizes
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    diff = scan_snapshot.diff_snapshots(old_path, new_path)
+    diff_time = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"写出快照     {write_time:8.3f} 秒")
+    print(f"流式对比     {diff_time:8.3f} 秒  内存峰值 {peak / 1024:,.0f} KB  "
+          f"(新增 {diff.added_count:,}, 删除 {diff.removed_count:,}, 变大 {diff.grown_count:,})")
+
+
+def bench_memory(scan_path, file_count):
+    """统计最小文件大小为0时扫描的内存峰值（最大文件列表只保留max_files个）"""
+    print("\n[基准] 内存峰值 (最小文件大小 0 KB)")
+    print("-" * 60)
+    for max_files in (100, 1000):
+        tracemalloc.start()
+        run_scan(scan_path, repeat=1, min_file_size_kb=0, max_files=max_files)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"max_files={max_files:<6} 峰值 {peak / 1024:10,.0f} KB  ({file_count:,} 个文件)")
+
+
+def bench_memory_budget(base_dir, dir_count=5000, files_per_dir=4):
+    """对比不同内存预算下扫描的内存峰值（目录多、查找重复文件、保存快照）"""
+    print(f"\n[基准] 内存预算 ({dir_count:,} 个目录 x {files_per_dir} 个文件, 查找重复文件并保存快照)")
+    print("-" * 60)
+    scan_path = os.path.join(base_dir, "budget_tree")
+    create_test_tree(scan_path, dir_count, files_per_dir, seed=7)
+    snapshot_path = os.path.join(base_dir, "budget.snapshot")
+
+    def configure(scanner, budget):
+        scanner.set_duplicate_detection(True)
+        scanner.set_snapshot(snapshot_path)
+        scanner.set_memory_budget(budget, base_dir)
+
+    # 预算包括扫描结束后留在内存中的结果（目录树、重复文件组），此处约5 MB
+    baseline = None
+    for budget in (0, 12 << 20, 8 << 20):
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+        tracemalloc.start()
+        elapsed, scanner = run_scan(scan_path, lambda s, b=budget: configure(s, b), repeat=1, min_file_size_kb=0)
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        tree = scanner.directory_tree
+        result = ([tree.info(node) for node in range(len(tree))],
+                  [(group.size, group.paths) for group in scanner.duplicate_groups])
+        if baseline is None:
+            baseline = result
+        label = scanner.format_size(budget) if budget else "不限制"
+        print(f"预算 {label:<10} {elapsed:8.3f} 秒  内存峰值 {peak / 1024:10,.0f} KB  "
+              f"结果占用 {retained / 1024:8,.0f} KB  结果一致: {'是' if result == baseline else '否'}")
+        assert result == baseline, "设置内存预算后结果不一致"
+        assert not budget or peak < budget, f"内存峰值 {peak:,} 字节超出预算 {budget:,} 字节"
+
+
+def main():
+    """主函数"""
+    dir_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    files_per_dir = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    base_dir = tempfile.mkdtemp(prefix="disk_scanner_bench_")
+    try:
+        scan_path = os.path.join(base_dir, "tree")
+        file_count = create_test_tree(scan_path, dir_count, files_per_dir)
+        print(f"[信息] 测试目录: {scan_path} ({file_count:,} 个文件)")
+
+        bench_walker_engines(scan_path, file_count)
+        bench_parallel_workers(scan_path, file_count)
+        bench_memory(scan_path, file_count)
+        bench_iter_entries(scan_path, file_count)
+        bench_async_scanning(scan_path, file_count)
+        bench_progress_reporting(scan_path, file_count)
+        bench_scan_index(scan_path, file_count)
+        bench_duplicates(scan_path, file_count)
+        bench_hash_cache(base_dir)
+        bench_path_patterns(base_dir)
+        bench_snapshot_diff(base_dir)
+        bench_memory_budget(base_dir)
+        bench_classifier()
+        bench_column_stats()
+        bench_record_store()
+        bench_path_table()
+        bench_results_file(scan_path, base_dir)
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
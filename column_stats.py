@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列式扫描结果与统计
+扫描时把每个符合条件的文件记录为并列数组中的一行（大小、最后使用时间、
+类型编号、目录编号），统计时用NumPy对整列做向量化运算；
+NumPy未安装时使用等价的纯Python实现，结果完全相同
+"""
+
+import bisect
+from array import array
+
+from memory_estimate import array_bytes
+from path_table import PathTable
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# 不超过该值的整数可以用float64精确表示（8 PB）
+EXACT_FLOAT_LIMIT = 2 ** 53
+
+
+class ScanColumns:
+    """列式存储的扫描结果
+
+    每个文件一行，各列存放在紧凑的array中（每行约20字节），
+    类型和目录保存为编号，类型名只在categories中存一份，目录保存在前缀压缩的
+    路径表directories（PathTable）中。
+    行的顺序与遍历顺序有关，统计结果与顺序无关。
+    """
+
+    def __init__(self):
+        self.size = array('q')
+        self.last_used = array('q')   # 修改时间和访问时间中较晚的一个（纳秒）
+        self.category = array('H')
+        self.directory = array('l')
+        self.categories = []
+        self.directories = PathTable()
+        self._category_ids = {}
+
+    @classmethod
+    def from_columns(cls, size, last_used, category, directory, categories, directories):
+        """由已有的列（如结果文件中的memoryview）构造，不复制数据；构造出的结果只读
+        Args:
+            categories: 类型名列表
+            directories: PathTable
+        """
+        columns = cls()
+        columns.size = size
+        columns.last_used = last_used
+        columns.category = category
+        columns.directory = directory
+        columns.categories = list(categories)
+        columns.directories = directories
+        columns._category_ids = {name: i for i, name in enumerate(columns.categories)}
+        return columns
+
+    def __len__(self):
+        return len(self.size)
+
+    def category_id(self, name):
+        """返回文件类型的编号，必要时分配新编号"""
+        cid = self._category_ids.get(name)
+        if cid is None:
+            cid = self._category_ids[name] = len(self.categories)
+            self.categories.append(name)
+        return cid
+
+    def directory_id(self, path):
+        """返回目录的编号，必要时分配新编号"""
+        return self.directories.intern(path)
+
+    def append(self, size, last_used, category, directory):
+        """追加一行（category和directory为编号）"""
+        self.size.append(size)
+        self.last_used.append(last_used)
+        self.category.append(category)
+        self.directory.append(directory)
+
+    def memory_used(self):
+        """估计占用的内存（字节）：各列和目录路径表"""
+        return (array_bytes(self.size, self.last_used, self.category, self.directory)
+                + self.directories.memory_used())
+
+    def extend(self, other):
+        """追加另一个ScanColumns的所有行，类型和目录重新编号"""
+        category_map = [self.category_id(name) for name in other.categories]
+        directory_map = [self.directory_id(other.directories.path(did)) for did in range(len(other.directories))]
+        self.size.extend(other.size)
+        self.last_used.extend(other.last_used)
+        self.category.extend(array('H', [category_map[c] for c in other.category]))
+        self.directory.extend(array('l', [directory_map[d] for d in other.directory]))
+
+    def checkpoint_marks(self):
+        """各个只追加的结构当前的长度 (行数, 类型数, 目录数, 目录名称数)，供checkpoint_delta()使用"""
+        directories = self.directories
+        return len(self.size), len(self.categories), len(directories), len(directories.names)
+
+    def checkpoint_delta(self, marks):
+        """上次标记之后追加的部分（保存检查点时只写出新增的行和目录）
+        Args:
+            marks: 上次checkpoint_marks()的返回值，None表示从头开始
+        Returns:
+            tuple: (新的标记, 增量)
+        """
+        rows, categories, dirs, names = marks or (0, 0, 0, 0)
+        directories = self.directories
+        delta = (self.size[rows:], self.last_used[rows:], self.category[rows:], self.directory[rows:],
+                 self.categories[categories:], directories.parent[dirs:], directories.name_id[dirs:],
+                 directories.names[names:])
+        return self.checkpoint_marks(), delta
+
+    @classmethod
+    def from_checkpoint_deltas(cls, deltas):
+        """按保存顺序拼接checkpoint_delta()返回的各个增量，重建完整的列式结果"""
+        size, last_used, category, directory = array('q'), array('q'), array('H'), array('l')
+        categories, parent, name_id, names = [], array('q'), array('q'), []
+        for delta in deltas:
+            size.extend(delta[0])
+            last_used.extend(delta[1])
+            category.extend(delta[2])
+            directory.extend(delta[3])
+            categories.extend(delta[4])
+            parent.extend(delta[5])
+            name_id.extend(delta[6])
+            names.extend(delta[7])
+        return cls.from_columns(size, last_used, category, directory, categories,
+                                PathTable.from_columns(parent, name_id, names))
+
+    def __getstate__(self):
+        # 编号字典可以由名称列表重建，不随进程间传递
+        state = self.__dict__.copy()
+        del state['_category_ids']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._category_ids = {name: i for i, name in enumerate(self.categories)}
+
+    def as_numpy(self):
+        """返回各列的NumPy数组（与array共享内存，不复制）"""
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("NumPy未安装")
+        return (np.frombuffer(self.size, dtype=np.int64),
+                np.frombuffer(self.last_used, dtype=np.int64),
+                np.frombuffer(self.category, dtype=np.uint16),
+                np.frombuffer(self.directory, dtype=np.dtype('i%d' % self.directory.itemsize)))
+
+
+def _bin_of(size, bits_per_bin):
+    """文件大小所在的对数分段编号：0为空文件，k覆盖[2^((k-1)*b), 2^(k*b))"""
+    return (size.bit_length() + bits_per_bin - 1) // bits_per_bin
+
+
+def _group_sums(keys, sizes, group_count):
+    """按编号分组求文件数和总大小
+    Returns:
+        tuple: (各组文件数, 各组总大小)，使用NumPy时为int64数组，否则为列表
+    """
+    if NUMPY_AVAILABLE and group_count:
+        counts = np.bincount(keys, minlength=group_count)
+        if int(sizes.sum()) < EXACT_FLOAT_LIMIT:
+            # 总和不超过2^53时，浮点权重累加的每一步都是精确的整数
+            totals = np.bincount(keys, weights=sizes, minlength=group_count).astype(np.int64)
+            return counts, totals
+        # 超大总量时按组排序后用reduceat求和，保持整数精度
+        order = np.argsort(keys, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        present = counts > 0
+        totals = np.zeros(group_count, dtype=np.int64)
+        if present.any():
+            totals[present] = np.add.reduceat(sizes[order], starts[present])
+        return counts, totals
+
+    counts = [0] * group_count
+    totals = [0] * group_count
+    for key, size in zip(keys, sizes):
+        counts[key] += 1
+        totals[key] += size
+    return counts, totals
+
+
+def size_histogram(columns, bits_per_bin=1):
+    """按对数刻度统计文件大小分布
+    Args:
+        columns: ScanColumns
+        bits_per_bin: 每个分段跨越的二进制位数，1表示按2倍分段，10表示按1024倍分段
+    Returns:
+        list: [(下限, 上限, 文件数, 总大小), ...]，只包含非空分段；空文件的分段为(0, 1)
+    """
+    if not len(columns):
+        return []
+    if NUMPY_AVAILABLE:
+        sizes = columns.as_numpy()[0]
+        # frexp的指数即为整数的bit_length（2^53以内精确）
+        bins = (np.frexp(sizes.astype(np.float64))[1] + bits_per_bin - 1) // bits_per_bin
+        bin_count = int(bins.max()) + 1
+    else:
+        sizes = columns.size
+        bins = [_bin_of(size, bits_per_bin) for size in sizes]
+        bin_count = max(bins) + 1
+    counts, totals = _group_sums(bins, sizes, bin_count)
+
+    result = []
+    for k in range(bin_count):
+        if counts[k]:
+            low = 0 if k == 0 else 1 << ((k - 1) * bits_per_bin)
+            high = 1 if k == 0 else 1 << (k * bits_per_bin)
+            result.append((low, high, int(counts[k]), int(totals[k])))
+    return result
+
+
+def size_percentiles(columns, percentiles=(50, 90, 99, 99.9)):
+    """文件大小的分位数（取不超过该位置的实际文件大小，不插值）
+    Returns:
+        list: [(百分位, 文件大小), ...]；没有文件时为空列表
+    """
+    n = len(columns)
+    if not n:
+        return []
+    positions = [int(p / 100 * (n - 1)) for p in percentiles]
+    if NUMPY_AVAILABLE:
+        # 只做部分排序，不需要完整排序
+        values = np.partition(columns.as_numpy()[0], sorted(set(positions)))
+    else:
+        values = sorted(columns.size)
+    return [(p, int(values[i])) for p, i in zip(percentiles, positions)]
+
+
+def category_sums(columns):
+    """按文件类型汇总
+    Returns:
+        dict: {类型名: (文件数, 总大小)}
+    """
+    if NUMPY_AVAILABLE:
+        sizes, _, categories, _ = columns.as_numpy()
+    else:
+        sizes, categories = columns.size, columns.category
+    counts, totals = _group_sums(categories, sizes, len(columns.categories))
+    return {name: (int(counts[i]), int(totals[i])) for i, name in enumerate(columns.categories) if counts[i]}
+
+
+def directory_sums(columns, k=None):
+    """按所在目录汇总（只统计目录直接包含的文件，不含子目录）
+    Args:
+        k: 只返回总大小最大的k个目录，None表示全部
+    Returns:
+        list: [(目录, 文件数, 总大小), ...]，按总大小从大到小排列
+    """
+    if NUMPY_AVAILABLE:
+        sizes, _, _, directories = columns.as_numpy()
+    else:
+        sizes, directories = columns.size, columns.directory
+    counts, totals = _group_sums(directories, sizes, len(columns.directories))
+    if NUMPY_AVAILABLE and k is not None and k < len(totals):
+        # 只为可能入选的目录（总大小不小于第k大的值）构造结果
+        threshold = np.partition(totals, len(totals) - k)[len(totals) - k] if k > 0 else totals.max() + 1
+        selected = np.nonzero((totals >= threshold) & (counts > 0))[0].tolist()
+    else:
+        selected = [i for i in range(len(columns.directories)) if counts[i]]
+    result = [(columns.directories.path(i), int(counts[i]), int(totals[i])) for i in selected]
+    result.sort(key=lambda item: (-item[2], item[0]))
+    return result if k is None else result[:k]
+
+
+def age_sums(columns, boundaries):
+    """按最后使用时间分段汇总
+    Args:
+        boundaries: 从早到晚排列的分段边界（纳秒），如age_analysis.age_boundaries()的结果
+    Returns:
+        list: [(文件数, 总大小), ...]，共len(boundaries)+1段，与bisect.bisect的编号一致
+    """
+    if NUMPY_AVAILABLE:
+        sizes, last_used, _, _ = columns.as_numpy()
+        buckets = np.searchsorted(np.asarray(boundaries, dtype=np.int64), last_used, side='right')
+    else:
+        sizes = columns.size
+        buckets = [bisect.bisect(boundaries, value) for value in columns.last_used]
+    counts, totals = _group_sums(buckets, sizes, len(boundaries) + 1)
+    return [(int(count), int(total)) for count, total in zip(counts, totals)]
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目录占用统计（类似du的目录树）
+在扫描过程中记录每个目录直接包含的文件，扫描结束后向上汇总，
+可以随时查询任意深度下占用空间最大的目录，无需重新扫描
+"""
+
+import os
+import json
+import heapq
+from array import array
+
+from age_analysis import AGE_BUCKET_COUNT, cold_bytes
+from path_table import PathTable
+
+
+class DirectoryTree:
+    """紧凑的目录占用树
+
+    每个目录是一个节点，各项数据按节点编号存放在并列的数组中：
+    父节点编号、递归总大小、递归文件数、深度，以及最大的直接子项（文件或子目录）。
+    各年龄分段的递归大小也按分段各存一个数组（age_bytes[分段][节点]）。
+    目录路径保存在路径表table中（编号与节点编号相同），每个目录只保存最后一级名称，
+    查询结果需要时才重建完整路径。
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.table = PathTable()
+        self.parent = array('l')
+        self.depth = array('l')
+        self.total_bytes = array('q')
+        self.file_count = array('q')
+        self.largest_name = []
+        self.largest_size = array('q')
+        self.age_bytes = [array('q') for _ in range(AGE_BUCKET_COUNT)]
+
+    def __len__(self):
+        return len(self.table)
+
+    def path(self, node):
+        """重建节点的完整路径"""
+        return self.table.path(node)
+
+    @classmethod
+    def from_columns(cls, root, table, parent, depth, total_bytes, file_count, largest_name, largest_size, age_bytes):
+        """由已有的列（如结果文件中的memoryview）构造，不复制数据；构造出的目录树只读
+        Args:
+            table: 节点路径的PathTable
+            largest_name: 各节点最大子项名的序列（没有子项时为None）
+            age_bytes: 各年龄分段的列
+        """
+        tree = cls(root)
+        tree.table = table
+        tree.parent = parent
+        tree.depth = depth
+        tree.total_bytes = total_bytes
+        tree.file_count = file_count
+        tree.largest_name = largest_name
+        tree.largest_size = largest_size
+        tree.age_bytes = list(age_bytes)
+        return tree
+
+    def _add_path(self, path, parent):
+        """把节点路径加入路径表，返回节点编号"""
+        if parent >= 0:
+            name = os.path.basename(path)
+            if self.table.join(parent, name) == path:
+                return self.table.add(parent, name, path)
+        # 根节点，以及不能与上级路径直接拼接的目录（如相对根目录"."的子目录）保存完整路径
+        return self.table.add(-1, path, path)
+
+    def _add_node(self, path, parent, depth):
+        node = self._add_path(path, parent)
+        self.parent.append(parent)
+        self.depth.append(depth)
+        self.total_bytes.append(0)
+        self.file_count.append(0)
+        self.largest_name.append(None)
+        self.largest_size.append(-1)
+        for column in self.age_bytes:
+            column.append(0)
+        return node
+
+    def _lookup(self, path):
+        return self.table.lookup(os.path.normpath(os.fspath(path)))
+
+    def _node_for(self, path):
+        """返回目录对应的节点编号，必要时创建它和所有上级目录的节点"""
+        node = self.table.lookup(path)
+        if node is not None:
+            return node
+        if not self._under_root(path):
+            # 不在扫描根目录之下的路径挂在根节点上
+            return 0
+        # 相对根目录"."的一级子目录规范化后没有上级部分（"./a"为"a"）
+        parent = self._node_for(os.path.dirname(path) or os.curdir)
+        return self._add_node(path, parent, self.depth[parent] + 1)
+
+    def _under_root(self, path):
+        """规范化的路径是否在扫描根目录之下（不含根目录本身）"""
+        root = self.root
+        if path == root:
+            return False
+        if root == os.curdir:
+            return not (os.path.isabs(path) or path == os.pardir or path.startswith(os.pardir + os.sep))
+        return path.startswith(os.path.join(root, ''))
+
+    @classmethod
+    def build(cls, root, dir_stats):
+        """由扫描收集的目录直接文件统计构建目录树
+        Args:
+            root: 扫描根目录
+            dir_stats: {目录路径: [直接文件总大小, 直接文件数, 最大文件名, 最大文件大小, 各年龄分段大小]}，
+                       或按路径排序的 (目录路径, 统计) 序列（同一目录可出现多次，依次累加）
+        """
+        root = os.path.normpath(os.fspath(root))
+        tree = cls(root)
+        tree._add_node(root, -1, 0)
+
+        # 按路径排序后建立节点，保证节点编号与遍历方式无关
+        items = sorted(dir_stats.items()) if isinstance(dir_stats, dict) else dir_stats
+        for path, (size, count, largest_name, largest_size, ages) in items:
+            node = tree._node_for(os.path.normpath(path))
+            tree.total_bytes[node] += size
+            tree.file_count[node] += count
+            for column, age_size in zip(tree.age_bytes, ages):
+                column[node] += age_size
+            if largest_name is not None and largest_size > tree.largest_size[node]:
+                tree.largest_name[node] = largest_name
+                tree.largest_size[node] = largest_size
+
+        # 子节点编号总是大于父节点，倒序遍历即可自底向上汇总
+        for node in range(len(tree) - 1, 0, -1):
+            parent = tree.parent[node]
+            tree.total_bytes[parent] += tree.total_bytes[node]
+            tree.file_count[parent] += tree.file_count[node]
+            for column in tree.age_bytes:
+                column[parent] += column[node]
+
+        # 汇总完成后再比较子目录与文件，得到最大的直接子项
+        table = tree.table
+        for node in range(1, len(tree)):
+            parent = tree.parent[node]
+            if tree.total_bytes[node] > tree.largest_size[parent]:
+                tree.largest_name[parent] = os.path.basename(table.name(node)) + os.sep
+                tree.largest_size[parent] = tree.total_bytes[node]
+        # 建立完成后只保留路径表的各列，查询字典在按路径查询时才重建
+        table.drop_index()
+        return tree
+
+    def info(self, node):
+        """返回节点信息 (路径, 总大小, 文件数, 最大子项名, 最大子项大小)"""
+        return (self.path(node), self.total_bytes[node], self.file_count[node],
+                self.largest_name[node], max(self.largest_size[node], 0))
+
+    def ages(self, node):
+        """返回节点各年龄分段的递归大小，顺序与AGE_BUCKETS相同"""
+        return [column[node] for column in self.age_bytes]
+
+    def age_profile(self, path):
+        """查询一个目录各年龄分段的大小，不存在时返回None"""
+        node = self._lookup(path)
+        return self.ages(node) if node is not None else None
+
+    def get(self, path):
+        """查询一个目录的统计信息，不存在时返回None"""
+        node = self._lookup(path)
+        return self.info(node) if node is not None else None
+
+    def children(self, path):
+        """返回一个目录的直接子目录信息，按大小从大到小排列"""
+        node = self._lookup(path)
+        if node is None:
+            return []
+        result = [self.info(child) for child in range(node + 1, len(self))
+                  if self.parent[child] == node]
+        result.sort(key=lambda item: (item[1], item[0]), reverse=True)
+        return result
+
+    def top_directories(self, k=10, depth=None):
+        """返回占用空间最大的k个目录
+        Args:
+            k: 返回的目录数
+            depth: 相对扫描根目录的深度（根目录为0），None表示任意深度（不含根目录）
+        Returns:
+            list: [(路径, 总大小, 文件数, 最大子项名, 最大子项大小), ...]
+        """
+        nodes = self._nodes_at(depth)
+        totals = self.total_bytes
+        # 先按大小选出候选节点（含与第k名同样大小的节点），只为候选节点重建路径
+        best = [(totals[node], self.path(node), node) for node in self._candidates(nodes, totals.__getitem__, k)]
+        best.sort(reverse=True)
+        return [self.info(node) for _, _, node in best[:k]]
+
+    def top_cold_directories(self, k=10, depth=None):
+        """返回冷数据（超过COLD_DAYS天未使用）最多的k个目录
+        Args:
+            k: 返回的目录数
+            depth: 相对扫描根目录的深度，None表示任意深度（不含根目录）
+        Returns:
+            list: [(路径, 冷数据大小, 总大小), ...]，不含没有冷数据的目录
+        """
+        cold = {}
+        for node in self._nodes_at(depth):
+            size = cold_bytes(self.ages(node))
+            if size > 0:
+                cold[node] = size
+        best = [(cold[node], self.path(node), node) for node in self._candidates(cold, cold.__getitem__, k)]
+        best.sort(reverse=True)
+        return [(path, size, self.total_bytes[node]) for size, path, node in best[:k]]
+
+    def _nodes_at(self, depth):
+        """指定深度的节点，None表示除根节点外的全部节点"""
+        if depth is None:
+            return range(1, len(self))
+        return [node for node in range(len(self)) if self.depth[node] == depth]
+
+    @staticmethod
+    def _candidates(nodes, value, k):
+        """值不小于第k大值的节点（同值时按路径排序，候选需包含所有同值节点）"""
+        top = heapq.nlargest(k, nodes, key=value)
+        if not top or len(top) < k:
+            return top
+        threshold = value(top[-1])
+        return [node for node in nodes if value(node) >= threshold]
+
+    def save(self, file_path):
+        """以列格式保存为JSON文件，供导出工具读取"""
+        data = {
+            'root': self.root,
+            'names': list(self.table.names),
+            'name_id': self.table.name_id.tolist(),
+            'name_parent': self.table.parent.tolist(),
+            'parent': self.parent.tolist(),
+            'depth': self.depth.tolist(),
+            'total_bytes': self.total_bytes.tolist(),
+            'file_count': self.file_count.tolist(),
+            'largest_name': list(self.largest_name),
+            'largest_size': self.largest_size.tolist(),
+            'age_bytes': [column.tolist() for column in self.age_bytes],
+        }
+        with open(file_path, 'w', encoding='utf-8', errors='surrogateescape') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, file_path):
+        """读取save()保存的目录树"""
+        with open(file_path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+            data = json.load(f)
+        tree = cls(data['root'])
+        tree.parent = array('l', data['parent'])
+        if 'names' in data:
+            tree.table = PathTable.from_columns(array('q', data['name_parent']), array('q', data['name_id']),
+                                                data['names'])
+        else:
+            # 旧版本保存完整路径列表，按节点顺序重新加入路径表
+            for path, parent in zip(data['paths'], tree.parent):
+                tree._add_path(path, parent)
+        tree.depth = array('l', data['depth'])
+        tree.total_bytes = array('q', data['total_bytes'])
+        tree.file_count = array('q', data['file_count'])
+        tree.largest_name = data['largest_name']
+        tree.largest_size = array('q', data['largest_size'])
+        # 旧版本保存的文件没有年龄分段数据
+        age_bytes = data.get('age_bytes') or [[0] * len(tree)] * AGE_BUCKET_COUNT
+        tree.age_bytes = [array('q', column) for column in age_bytes]
+        return tree
@@ -16,7 +16,10 @@ import time
 
 # 尝试导入扫描器功能
 try:
-    from disk_scanner_simple import DiskScanner
+    from disk_scanner_simple import DiskScanner, CancellationToken
+    from column_stats import NUMPY_AVAILABLE, size_histogram, size_percentiles
+    from scan_results_file import RESULTS_FILE
+    from scan_checkpoint import CHECKPOINT_FILE
     SCANNER_AVAILABLE = True
     print("Scanner imported successfully")
 except ImportError as e:
@@ -53,6 +56,14 @@ class DiskAnalyzerGUI:
         # 初始化变量
         self.is_scanning = False
         self.scanner = None
+        self.scan_thread = None
+        # 当前显示的结果所在的二进制结果文件（扫描后保存的或打开的文件），导出时读取
+        self.results_file = None
+
+        # 进度更新合并：扫描线程只记录最新进度，主线程按需刷新
+        self._progress_lock = threading.Lock()
+        self._pending_progress = 0
+        self._progress_flush_scheduled = False
 
         # 创建界面
         self.create_widgets()
@@ -155,7 +166,13 @@ class DiskAnalyzerGUI:
         self.include_hidden_var = tk.BooleanVar(value=False)
         hidden_check = ttk.Checkbutton(settings_frame, text="包含隐藏文件",
                                       variable=self.include_hidden_var)
-        hidden_check.pack(side=tk.LEFT, padx=(0, 5))
+        hidden_check.pack(side=tk.LEFT, padx=(0, 15))
+
+        # 可中断续扫：定期保存检查点，默认关闭
+        self.checkpoint_var = tk.BooleanVar(value=False)
+        checkpoint_check = ttk.Checkbutton(settings_frame, text="可中断续扫",
+                                           variable=self.checkpoint_var)
+        checkpoint_check.pack(side=tk.LEFT, padx=(0, 5))
 
         # 文件类型过滤器
         self.create_file_type_filter(main_frame)
@@ -178,7 +195,11 @@ class DiskAnalyzerGUI:
 
         self.export_button = ttk.Button(center_frame, text="导出结果",
                                        command=self.export_results, state=tk.DISABLED)
-        self.export_button.pack(side=tk.LEFT)
+        self.export_button.pack(side=tk.LEFT, padx=(0, 10))
+
+        self.open_button = ttk.Button(center_frame, text="打开结果",
+                                     command=self.open_results)
+        self.open_button.pack(side=tk.LEFT)
 
         # 进度条（独占一行显示）
         progress_frame = ttk.Frame(main_frame)
@@ -222,14 +243,14 @@ class DiskAnalyzerGUI:
         self.notebook.add(self.files_frame, text="最大文件")
 
         # 创建表格
-        columns = ("排名", "文件名", "大小", "路径")
+        columns = ("排名", "文件名", "大小", "实际占用", "路径")
         self.files_tree = ttk.Treeview(self.files_frame, columns=columns, show="headings", height=15)
 
         for col in columns:
             self.files_tree.heading(col, text=col)
             if col == "排名":
                 self.files_tree.column(col, width=50)
-            elif col == "大小":
+            elif col in ("大小", "实际占用"):
                 self.files_tree.column(col, width=100)
             else:
                 self.files_tree.column(col, width=200)
@@ -244,6 +265,40 @@ class DiskAnalyzerGUI:
         self.files_frame.columnconfigure(0, weight=1)
         self.files_frame.rowconfigure(0, weight=1)
 
+        # 目录占用页面（扫描结束后按所选深度查询，无需重新扫描）
+        self.dirs_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.dirs_frame, text="目录占用")
+
+        depth_frame = ttk.Frame(self.dirs_frame)
+        depth_frame.grid(row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 5))
+        ttk.Label(depth_frame, text="目录深度:").pack(side=tk.LEFT)
+        self.dir_depth_var = tk.StringVar(value="1")
+        depth_combo = ttk.Combobox(depth_frame, textvariable=self.dir_depth_var,
+                                   values=("任意", "1", "2", "3"), width=6, state="readonly")
+        depth_combo.pack(side=tk.LEFT, padx=(5, 0))
+        depth_combo.bind("<<ComboboxSelected>>", lambda event: self.show_directories())
+
+        dir_columns = ("排名", "目录", "大小", "文件数", "最大子项")
+        self.dirs_tree = ttk.Treeview(self.dirs_frame, columns=dir_columns, show="headings", height=14)
+
+        for col in dir_columns:
+            self.dirs_tree.heading(col, text=col)
+            if col == "排名":
+                self.dirs_tree.column(col, width=50)
+            elif col in ("大小", "文件数"):
+                self.dirs_tree.column(col, width=100)
+            else:
+                self.dirs_tree.column(col, width=200)
+
+        dirs_scrollbar = ttk.Scrollbar(self.dirs_frame, orient=tk.VERTICAL, command=self.dirs_tree.yview)
+        self.dirs_tree.configure(yscrollcommand=dirs_scrollbar.set)
+
+        self.dirs_tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        dirs_scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+
+        self.dirs_frame.columnconfigure(0, weight=1)
+        self.dirs_frame.rowconfigure(1, weight=1)
+
     def browse_folder(self):
         """浏览文件夹"""
         try:
@@ -451,31 +506,29 @@ class DiskAnalyzerGUI:
         return selected_types if selected_types else ["全部文件"]
 
     def update_progress(self, progress, scanned_files, total_files):
-        """更新进度条和百分比显示"""
+        """更新进度条和百分比显示（在扫描线程中调用）
+
+        只记录最新的进度，界面上最多排队一次刷新；刷新前到达的多次更新
+        合并为一次，避免Tk事件队列被进度事件占满。
+        """
         try:
-            # 使用线程安全的方式更新进度条和百分比标签
-            self.root.after(0, lambda: self.progress_var.set(progress))
-            self.root.after(0, lambda: self.progress_label.config(text=f"{progress:.0f}%"))
-
-            # 对于演示模式，添加平滑动画
-            if not SCANNER_AVAILABLE or self.scanner is None:
-                # 演示模式下，让进度条更平滑
-                current = self.progress_var.get()
-                if progress > current + 1:
-                    # 分步更新，创造动画效果
-                    steps = int(progress - current)
-                    for i in range(1, steps + 1):
-                        new_progress = current + i
-                        self.root.after(i * 20, lambda p=new_progress: (
-                            self.progress_var.set(p),
-                            self.progress_label.config(text=f"{p:.0f}%")
-                        ))
-
-            # 可选：更新状态信息（如果需要显示的话）
-            # self.root.after(0, lambda: self.status_var.set(f"正在扫描: {progress:.1f}% ({scanned_files:,}/{total_files:,})"))
+            with self._progress_lock:
+                self._pending_progress = progress
+                if self._progress_flush_scheduled:
+                    return
+                self._progress_flush_scheduled = True
+            self.root.after(0, self._flush_progress)
         except:
             pass  # 忽略更新错误，不影响扫描
 
+    def _flush_progress(self):
+        """在主线程中把最新的进度显示到界面上"""
+        with self._progress_lock:
+            progress = self._pending_progress
+            self._progress_flush_scheduled = False
+        self.progress_var.set(progress)
+        self.progress_label.config(text=f"{progress:.0f}%")
+
     def get_min_size_bytes(self):
         """获取最小文件大小（字节）"""
         try:
@@ -510,25 +563,74 @@ class DiskAnalyzerGUI:
             self.simulate_scan(scan_path)
             return
 
+        # 上一次扫描的线程还没有退出时不能开始新的扫描
+        if self.scan_thread is not None and self.scan_thread.is_alive():
+            messagebox.showinfo("提示", "上一次扫描正在停止，请稍候再试")
+            return
+
         # 禁用扫描相关按钮
         self.scan_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
         self.browse_button.config(state=tk.DISABLED)
+        self.open_button.config(state=tk.DISABLED)
 
-        # 清空结果
-        self.overview_text.delete(1.0, tk.END)
-        for item in self.files_tree.get_children():
-            self.files_tree.delete(item)
+        self.clear_results()
+        self.results_file = None
 
         self.is_scanning = True
         self.progress_var.set(0)
         self.progress_label.config(text="0%")
         self.status_var.set("正在扫描...")
 
+        # 每次扫描使用新的取消令牌
+        self.scanner.set_cancel_token(CancellationToken())
+
         # 在新线程中执行扫描
-        scan_thread = threading.Thread(target=self.scan_worker, args=(scan_path,))
-        scan_thread.daemon = True
-        scan_thread.start()
+        self.scan_thread = threading.Thread(target=self.scan_worker, args=(scan_path,))
+        self.scan_thread.daemon = True
+        self.scan_thread.start()
+
+    def clear_results(self):
+        """清空结果显示"""
+        self.overview_text.delete(1.0, tk.END)
+        for item in self.files_tree.get_children():
+            self.files_tree.delete(item)
+        for item in self.dirs_tree.get_children():
+            self.dirs_tree.delete(item)
+
+    def open_results(self):
+        """打开保存的二进制结果文件，不重新扫描"""
+        if not SCANNER_AVAILABLE or self.scanner is None:
+            messagebox.showinfo("演示模式", "演示模式下不能打开结果文件")
+            return
+
+        file_path = filedialog.askopenfilename(
+            title="打开扫描结果",
+            initialfile=RESULTS_FILE,
+            filetypes=[("扫描结果文件", "*.bin"), ("所有文件", "*.*")]
+        )
+        if not file_path:
+            return
+
+        try:
+            meta = self.scanner.load_results(file_path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"无法打开结果文件：{e}")
+            return
+
+        # 界面上的路径和设置改为保存时的值
+        settings = meta['settings']
+        self.path_var.set(meta['scan_path'])
+        if 'max_files' in settings:
+            self.max_files_var.set(str(settings['max_files']))
+        if 'include_hidden' in settings:
+            self.include_hidden_var.set(settings['include_hidden'])
+
+        self.results_file = file_path
+        self.clear_results()
+        self.show_results()
+        self.progress_var.set(100 if self.scanner.scan_complete else 0)
+        self.status_var.set(f"已打开结果文件（扫描于 {meta['created']}）")
 
     def simulate_scan(self, scan_path):
         """模拟扫描（演示模式）"""
@@ -577,7 +679,7 @@ class DiskAnalyzerGUI:
         ]
 
         for i, (name, size, path) in enumerate(demo_files, 1):
-            self.files_tree.insert("", tk.END, values=(i, name, size, path))
+            self.files_tree.insert("", tk.END, values=(i, name, size, size, path))
 
         self.export_button.config(state=tk.NORMAL)
         self.scan_finished()
@@ -595,8 +697,16 @@ class DiskAnalyzerGUI:
             # 设置文件类型过滤器
             self.scanner.set_file_type_filter(selected_types)
 
-            # 设置进度回调
+            # 设置进度回调；GUI中不需要控制台进度输出
             self.scanner.set_progress_callback(self.update_progress)
+            self.scanner.set_quiet(True)
+
+            # 安装了NumPy时收集列式结果，大小分布统计为向量化运算
+            self.scanner.set_columnar_results(NUMPY_AVAILABLE)
+
+            # 勾选“可中断续扫”时定期保存检查点，扫描中途关闭窗口后再次扫描同一目录时继续；
+            # 未勾选时不读取也不写入检查点，每次都完整扫描
+            self.scanner.set_checkpoint(CHECKPOINT_FILE if self.checkpoint_var.get() else None)
 
             # 执行扫描
             success = self.scanner.scan_directory(scan_path, min_size//1024, max_files, include_hidden)
@@ -604,6 +714,11 @@ class DiskAnalyzerGUI:
             if success:
                 # 在主线程中更新界面
                 self.root.after(0, self.show_results)
+
+                # 保存二进制结果文件，之后可直接打开，导出时也不必解析文本结果；保存失败不影响显示
+                saved = self.scanner.save_results_file(RESULTS_FILE, scan_path, min_size//1024,
+                                                       max_files, include_hidden)
+                self.results_file = RESULTS_FILE if saved else None
             else:
                 self.root.after(0, lambda: self.status_var.set("扫描失败"))
 
@@ -623,8 +738,13 @@ class DiskAnalyzerGUI:
         selected_types = self.get_selected_file_types()
         filter_info = "文件类型: " + ", ".join(selected_types) if selected_types else "全部文件"
 
+        if self.scanner.scan_complete:
+            title = "扫描完成！"
+        else:
+            title = "扫描已停止！以下为部分结果（不完整）"
+
         overview_text = f"""
-扫描完成！
+{title}
 {'='*50}
 
 扫描路径: {self.path_var.get()}
@@ -632,7 +752,8 @@ class DiskAnalyzerGUI:
 扫描文件数: {self.scanner.scanned_files:,}
 符合条件文件: {self.scanner.total_files:,}
 总大小: {self.scanner.format_size(self.scanner.total_size)}
-扫描耗时: {time.time() - self.scanner.start_time:.2f} 秒
+实际占用: {self.scanner.format_size(getattr(self.scanner, 'total_allocated', self.scanner.total_size))}
+扫描耗时: {self.scanner.scan_time():.2f} 秒
 
 文件类型统计:
 {'-'*30}
@@ -644,33 +765,79 @@ class DiskAnalyzerGUI:
                 percentage = (stats['size'] / self.scanner.total_size * 100) if self.scanner.total_size > 0 else 0
                 overview_text += f"{file_type}: {stats['count']}个文件, {self.scanner.format_size(stats['size'])} ({percentage:.1f}%)\n"
 
+        columns = getattr(self.scanner, 'columns', None)
+        if columns is not None and len(columns):
+            overview_text += f"\n文件大小分布:\n{'-'*30}\n"
+            for low, high, count, total in size_histogram(columns, bits_per_bin=3):
+                overview_text += (f"{self.scanner.format_size(low)} - {self.scanner.format_size(high)}: "
+                                  f"{count:,}个文件, {self.scanner.format_size(total)}\n")
+            overview_text += "分位数: " + ", ".join(
+                f"P{p:g} {self.scanner.format_size(size)}" for p, size in size_percentiles(columns)) + "\n"
+
         self.overview_text.insert(tk.END, overview_text)
 
         # 显示最大文件列表
-        for i, (file_path, file_size) in enumerate(self.scanner.largest_files, 1):
+        for i, entry in enumerate(self.scanner.largest_files, 1):
             self.files_tree.insert("", tk.END, values=(
                 i,
-                file_path.name,
-                self.scanner.format_size(file_size),
-                str(file_path.parent)
+                entry.name,
+                self.scanner.format_size(entry.size),
+                self.scanner.format_size(entry.allocated),
+                entry.parent
             ))
 
-        self.status_var.set("扫描完成")
-        self.progress_label.config(text="100%")
+        self.show_directories()
+
+        if self.scanner.scan_complete:
+            self.status_var.set("扫描完成")
+            self.progress_label.config(text="100%")
+        else:
+            self.status_var.set("已停止扫描（部分结果）")
         self.export_button.config(state=tk.NORMAL)
 
+    def show_directories(self):
+        """按所选深度显示占用空间最大的目录"""
+        for item in self.dirs_tree.get_children():
+            self.dirs_tree.delete(item)
+
+        tree = getattr(self.scanner, 'directory_tree', None)
+        if tree is None:
+            return
+
+        depth = self.dir_depth_var.get()
+        depth = None if depth == "任意" else int(depth)
+        for i, (dir_path, dir_size, dir_files, child_name, child_size) in \
+                enumerate(tree.top_directories(100, depth), 1):
+            child = f"{child_name} ({self.scanner.format_size(child_size)})" if child_name else ""
+            self.dirs_tree.insert("", tk.END, values=(
+                i,
+                dir_path,
+                self.scanner.format_size(dir_size),
+                f"{dir_files:,}",
+                child
+            ))
+
     def stop_scan(self):
         """停止扫描"""
         self.is_scanning = False
-        self.status_var.set("已停止扫描")
-        self.scan_finished()
+        self.stop_button.config(state=tk.DISABLED)
+
+        if self.scan_thread is not None and self.scan_thread.is_alive():
+            # 通知扫描器在下一个目录处停止，线程退出后由scan_worker恢复按钮状态
+            self.status_var.set("正在停止扫描...")
+            self.scanner.cancel()
+        else:
+            self.status_var.set("已停止扫描")
+            self.scan_finished()
 
     def scan_finished(self):
         """扫描完成后的处理"""
         self.scan_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
         self.browse_button.config(state=tk.NORMAL)
-        self.progress_var.set(100)
+        self.open_button.config(state=tk.NORMAL)
+        if self.scanner is None or getattr(self.scanner, 'scan_complete', True):
+            self.progress_var.set(100)
 
     def export_results(self):
         """导出结果（支持多种格式选择）"""
@@ -798,7 +965,7 @@ class DiskAnalyzerGUI:
         """导出Excel文件"""
         try:
             from export_excel import create_excel_format, try_open_excel_with_file
-            success, excel_file = create_excel_format()
+            success, excel_file = create_excel_format(self.results_file)
 
             if success and excel_file:
                 # 移动文件到指定目录
@@ -1111,7 +1278,7 @@ class DiskAnalyzerGUI:
                 os.remove(csv_file)
 
             # 使用增强的导出功能
-            success, exported_file = export_to_csv(auto_open_excel=False)
+            success, exported_file = export_to_csv(auto_open_excel=False, results_file=self.results_file)
 
             if success and exported_file:
                 # 如果导出成功，重命名文件到指定位置
@@ -1261,6 +1428,8 @@ def main():
             if app.is_scanning:
                 if messagebox.askokcancel("退出", "扫描正在进行中，确定要退出吗？"):
                     app.is_scanning = False
+                    if app.scanner is not None and SCANNER_AVAILABLE:
+                        app.scanner.cancel()
                     root.destroy()
             else:
                 root.destroy()
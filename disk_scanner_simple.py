@@ -7,41 +7,822 @@
 
 import os
 import sys
+import json
 import time
+import heapq
+import bisect
+import itertools
+from operator import itemgetter
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from datetime import datetime
 
+from directory_tree import DirectoryTree
+from duplicate_finder import DuplicateFinder
+from mount_table import PSEUDO_FS_TYPES, pruned_mount_points
+from path_filter import PathFilter
+from age_analysis import AGE_BUCKET_COUNT, AGE_BUCKET_NAMES, COLD_DAYS, age_boundaries, cold_cutoff, cold_bytes
+from column_stats import NUMPY_AVAILABLE, ScanColumns, size_histogram, size_percentiles
+from sorted_runs import SortedRuns
+from file_records import FileRecordStore
+from memory_estimate import DICT_ENTRY_BYTES, INT_BYTES, LIST_BYTES, POINTER_BYTES, tuple_bytes
+
+# Windows上的stat结果没有st_blocks，此时占用空间按文件大小计算
+HAS_ST_BLOCKS = hasattr(os.stat_result, 'st_blocks')
+
+# 扫描历史文件的读取-修改-写入在进程内的各个扫描器之间互斥
+_history_lock = threading.Lock()
+
+# 内存预算估算用的每条缓存记录除字符串以外的占用（字节），由当前解释器的对象大小算出，
+# 路径和文件名另按sys.getsizeof逐个计算；写入归并段前排序用的元组也计入。
+# 目录统计 {目录: [总大小, 文件数, 最大文件名, 最大文件大小, [各年龄分段大小]]}
+DIR_RECORD_BYTES = (DICT_ENTRY_BYTES + sys.getsizeof([None] * 5) + sys.getsizeof([0] * AGE_BUCKET_COUNT)
+                    + (3 + AGE_BUCKET_COUNT) * INT_BYTES + tuple_bytes(2) + POINTER_BYTES)
+# 重复文件候选 {大小: [路径, ...]}：每个路径一项，每个大小分组另有字典项、列表和预留的空位
+SIZE_RECORD_BYTES = POINTER_BYTES + POINTER_BYTES // 8 + tuple_bytes(2) + POINTER_BYTES
+SIZE_GROUP_BYTES = DICT_ENTRY_BYTES + LIST_BYTES + 6 * POINTER_BYTES + INT_BYTES
+# 待去重的硬链接 {(st_dev, st_ino): (路径, 大小, 占用空间, 类型, 最后使用时间)}
+HARDLINK_RECORD_BYTES = DICT_ENTRY_BYTES + tuple_bytes(2) + tuple_bytes(5) + 5 * INT_BYTES
+# 扫描器按前两层子目录累计的文件数 {相对路径: 文件数}
+SUBTREE_RECORD_BYTES = DICT_ENTRY_BYTES + INT_BYTES
+
+
+def format_size(size_bytes):
+    """格式化文件大小"""
+    if size_bytes == 0:
+        return "0 B"
+
+    size_names = ["B", "KB", "MB", "GB", "TB"]
+    i = 0
+    size = float(size_bytes)
+
+    while size >= 1024.0 and i < len(size_names) - 1:
+        size /= 1024.0
+        i += 1
+
+    return f"{size:.1f} {size_names[i]}"
+
+
+class ProgressEstimator:
+    """单遍扫描的进度估算器
+
+    不再预先遍历整棵目录树计数，而是使用廉价的估算值作为进度分母：
+    上次扫描同一目录的文件数、挂载点的已用inode数，
+    或者根据已遍历目录的平均文件数对剩余目录进行外推。
+    """
+
+    def __init__(self, fixed_total=0):
+        self.fixed_total = fixed_total
+        self.files_seen = 0
+        self.dirs_done = 0
+        self.dirs_found = 1  # 根目录本身
+
+    def add_directory(self, file_count, subdir_count):
+        """记录一个已列出的目录"""
+        self.dirs_done += 1
+        self.dirs_found += subdir_count
+        self.files_seen += file_count
+
+    def add_subtree(self, file_count, dirs_done, dirs_found):
+        """记录一个在其他进程中扫描完成的子树"""
+        self.dirs_done += dirs_done
+        self.dirs_found += max(dirs_found - 1, 0)  # 子树根目录在列出父目录时已计入
+        self.files_seen += file_count
+
+    def extrapolated_total(self):
+        """按已遍历目录的平均文件数外推总文件数"""
+        if self.dirs_done == 0:
+            return 0
+        pending_dirs = max(self.dirs_found - self.dirs_done, 0)
+        avg_files = self.files_seen / self.dirs_done
+        return int(self.files_seen + pending_dirs * avg_files)
+
+    @property
+    def total(self):
+        """当前的总文件数估算值"""
+        if self.fixed_total > self.files_seen:
+            return self.fixed_total
+        return max(self.extrapolated_total(), self.files_seen)
+
+    def progress(self, files_done):
+        """返回进度百分比，扫描结束前最多为99%"""
+        total = self.total
+        if total <= 0:
+            return 0
+        return min(files_done / total * 100, 99.0)
+
+
+class CancellationToken:
+    """扫描取消令牌
+
+    由调用方（例如GUI线程）持有并调用cancel()，扫描器在处理每个目录前检查。
+    event可以传入multiprocessing.Event，使工作进程也能看到取消请求。
+    """
+
+    def __init__(self, event=None):
+        self._event = event if event is not None else threading.Event()
+
+    def cancel(self):
+        """请求取消扫描"""
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        """是否已请求取消"""
+        return self._event.is_set()
+
+
+class FileClassifier:
+    """预编译的文件分类器
+
+    把文件类型映射编译成一张 扩展名 -> 分类 的字典，过滤器和类型统计共用。
+    分类名经过sys.intern驻留，统计字典的键都是同一批字符串对象。
+    每个文件的分类只需一次字典查找。
+    """
+
+    OTHER = sys.intern("其他文件")
+
+    def __init__(self, type_mapping):
+        self.categories = [sys.intern(name) for name in type_mapping] + [self.OTHER]
+        self.ext_to_category = {}
+        for name, extensions in type_mapping.items():
+            category = sys.intern(name)
+            for ext in extensions:
+                self.ext_to_category.setdefault(ext, category)
+
+    @staticmethod
+    def suffix_of(name):
+        """取小写扩展名，规则与Path.suffix一致（以点开头的文件名没有扩展名）"""
+        i = name.rfind('.')
+        if i <= 0:
+            return ''
+        return name[i:].lower()
+
+    def classify_name(self, name):
+        """返回文件名对应的分类"""
+        return self.ext_to_category.get(self.suffix_of(name), self.OTHER)
+
+    def compile_filter(self, selected_types):
+        """按选中的类型生成过滤查找表
+        Args:
+            selected_types: 选中的类型名列表，None或包含"全部文件"表示不过滤
+        Returns:
+            tuple: (扩展名 -> 分类 字典, 未知扩展名对应的分类)
+                   不在字典中且未知扩展名分类为None的文件应被跳过
+        """
+        if selected_types is None or "全部文件" in selected_types:
+            return self.ext_to_category, self.OTHER
+
+        selected = set(selected_types)
+        lookup = {ext: category for ext, category in self.ext_to_category.items()
+                  if category in selected}
+        # 已知但未选中的扩展名显式映射为None，避免落入"其他文件"
+        for ext in self.ext_to_category:
+            lookup.setdefault(ext, None)
+        other = self.OTHER if self.OTHER in selected else None
+        return lookup, other
+
+    def lookup_name(self, name, lookup, other):
+        """用过滤查找表分类，返回None表示文件被过滤"""
+        return lookup.get(self.suffix_of(name), other)
+
+
+# 扫描得到的文件记录：路径、大小、实际占用、修改时间（纳秒）、最后使用时间（纳秒，
+# 修改时间和访问时间中较晚的一个）、文件类型、硬链接键（(st_dev, st_ino)，只有一个链接时为None）
+FileRecord = namedtuple('FileRecord', ['path', 'size', 'allocated', 'mtime_ns', 'last_used',
+                                       'category', 'link_key'])
+
+
+def _new_type_stats():
+    """创建一个文件类型的统计项"""
+    return {'count': 0, 'size': 0, 'allocated': 0, 'ages': [0] * AGE_BUCKET_COUNT}
+
+
+def _push_top(heap, limit, item):
+    """把item放入容量为limit的最小堆（只保留最大的limit项）
+    Returns:
+        堆满后为堆顶项的大小，未满时为-1；limit为0时为无穷大
+    """
+    if limit <= 0:
+        return float('inf')
+    if len(heap) < limit:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+    return heap[0][0] if len(heap) >= limit else -1
+
+
+class ScanAggregate:
+    """扫描统计结果
+
+    单线程扫描时只有一个实例；并行扫描时每个工作线程各自维护一个局部实例，
+    最后按固定顺序合并，避免在热路径中加锁。
+
+    最大文件用容量为max_files的最小堆维护，内存占用为O(max_files)，
+    不再收集所有符合条件的文件再排序。堆顶是当前入选文件中最小的一个，
+    size_floor记录它的大小，比它小的文件只需一次整数比较即可排除。
+
+    有多个硬链接（st_nlink > 1）的文件不立即统计，而是按 (st_dev, st_ino)
+    记录下来，全部合并后由resolve_hardlinks()每个inode只统计一次。
+    普通文件不进入这张表，因此它的大小只与硬链接文件的数量有关。
+
+    文件的最后使用时间取修改时间和访问时间中较晚的一个，按年龄分段累计大小，
+    超过COLD_DAYS天未使用的文件另外维护一个最大冷文件堆。
+
+    启用列式结果时，每个符合条件的文件另外在columns（ScanColumns）中记录一行；
+    保存快照时，每个被扫描的文件在snapshot（SnapshotWriter）中记录路径和大小。
+
+    设置内存预算（memory_budget，字节）时，每处理完一个目录估算一次所有随扫描增长的结构
+    （目录统计、重复文件候选、快照缓存、列式结果、待去重的硬链接，以及extra_memory
+    报告的调用方的结构）的占用，超出预算后把其中可以写出的部分（目录统计、重复文件候选、
+    快照记录）排序写入临时归并段，扫描结束后由iter_dir_stats()和duplicate_candidates()
+    与内存中的部分流式归并。
+    """
+
+    def __init__(self, max_files=100, collect_sizes=False, now_ns=None, collect_columns=False,
+                 snapshot=None, memory_budget=0, spill_dir=None):
+        self.scanned_files = 0
+        self.total_files = 0
+        self.total_size = 0
+        self.total_allocated = 0
+        self.file_types = {}
+        # 每个目录直接包含的文件: {目录: [总大小, 文件数, 最大文件名, 最大文件大小, 各年龄分段大小]}
+        self.dir_stats = {}
+        # 查找重复文件时按大小收集符合条件的文件: {大小: [路径, ...]}，不查找时为None
+        self.size_groups = {} if collect_sizes else None
+        # 待去重的硬链接文件: {(st_dev, st_ino): (路径, 大小, 占用空间, 类型, 最后使用时间)}，
+        # 保留路径最小的一个
+        self.hardlinks = {}
+        self.hardlink_paths = 0
+        self.hardlinks_skipped = 0
+        self.max_files = max_files
+        self.largest = []      # 最小堆: [(size, path, allocated), ...]
+        # 堆满后为堆顶文件大小，未满时为-1；max_files为0时不保留任何文件
+        self.size_floor = -1 if max_files > 0 else float('inf')
+        self.cold = []         # 最大冷文件的最小堆: [(size, path, allocated, last_used), ...]
+        self.cold_floor = self.size_floor
+        # 列式结果（ScanColumns），不收集时为None
+        self.columns = ScanColumns() if collect_columns else None
+        # 快照记录（SnapshotWriter），不保存快照时为None
+        self.snapshot = snapshot
+
+        # 内存预算（0表示不限制）和写入临时文件的目录统计/重复文件候选
+        self.memory_budget = memory_budget
+        # 目录统计、重复文件候选和待去重的硬链接的估计占用（字节），见memory_used()
+        self.dir_stats_bytes = 0
+        self.size_group_bytes = 0
+        self.hardlink_bytes = 0
+        # 调用方其他随扫描增长的结构的估计占用（无参数的函数），不随进程间传递和检查点保存
+        self.extra_memory = None
+        self.spill_dir = spill_dir
+        self.dir_runs = None
+        self.size_runs = None
+        if memory_budget:
+            self.enable_spill()
+        # 保存检查点时记录上次保存之后写入hardlinks的项 [(键, 记录), ...]，不保存检查点时为None
+        self.hardlink_log = None
+        self._columns_marks = None
+
+        # 所有工作线程/进程使用同一个当前时间，保证分段结果一致
+        if now_ns is None:
+            now_ns = int(time.time() * 1e9)
+        self.age_boundaries = age_boundaries(now_ns)
+        self.cold_cutoff = cold_cutoff(now_ns)
+
+    def offer(self, path, size, allocated):
+        """尝试把一个文件加入最大文件列表
+
+        大小相同时按路径比较，保证串行和并行扫描的结果完全一致。
+        """
+        if size >= self.size_floor:
+            self.size_floor = _push_top(self.largest, self.max_files, (size, path, allocated))
+
+    def offer_cold(self, path, size, allocated, last_used):
+        """尝试把一个冷文件加入最大冷文件列表"""
+        if size >= self.cold_floor:
+            self.cold_floor = _push_top(self.cold, self.max_files, (size, path, allocated, last_used))
+
+    def add_directory(self, directory, records, min_file_size):
+        """统计一个目录中的文件记录（扫描热路径）
+        Args:
+            directory: 目录路径
+            records: 该目录中通过过滤的FileRecord列表
+            min_file_size: 最小文件大小（字节），目录占用统计不受此限制
+        """
+        file_types = self.file_types
+        size_groups = self.size_groups
+        columns = self.columns
+        snapshot = self.snapshot
+        dir_id = None
+        snapshot_dir = None
+        boundaries = self.age_boundaries
+        cold_before = self.cold_cutoff
+        total_files = 0
+        total_size = 0
+        total_allocated = 0
+        dir_bytes = 0
+        dir_count = 0
+        dir_ages = [0] * AGE_BUCKET_COUNT
+        largest_path = None
+        largest_size = -1
+        size_bytes = 0
+        for path, file_size, allocated, _, last_used, file_type, link_key in records:
+            if link_key is not None:
+                # 硬链接文件扫描结束后按inode去重
+                self.defer_hardlink(link_key, path, file_size, allocated, file_type, last_used)
+                continue
+
+            bucket = bisect.bisect(boundaries, last_used)
+            if snapshot is not None:
+                if snapshot_dir is None:
+                    snapshot_dir = snapshot.directory_id(directory)
+                    name_start = len(os.path.join(directory, ''))
+                snapshot.append(snapshot_dir, path[name_start:], file_size, allocated)
+
+            # 只统计大于指定大小的文件
+            if file_size >= min_file_size:
+                # 小于堆顶的文件不构造元组，直接排除
+                if file_size >= self.size_floor:
+                    self.offer(path, file_size, allocated)
+                if last_used < cold_before and file_size >= self.cold_floor:
+                    self.offer_cold(path, file_size, allocated, last_used)
+                if size_groups is not None:
+                    group = size_groups.get(file_size)
+                    if group is None:
+                        size_groups[file_size] = [path]
+                        size_bytes += SIZE_GROUP_BYTES
+                    else:
+                        group.append(path)
+                    size_bytes += SIZE_RECORD_BYTES + sys.getsizeof(path)
+                if columns is not None:
+                    if dir_id is None:
+                        dir_id = columns.directory_id(os.path.dirname(path))
+                    columns.append(file_size, last_used, columns.category_id(file_type), dir_id)
+
+                # 按类型统计
+                stats = file_types.get(file_type)
+                if stats is None:
+                    stats = file_types[file_type] = _new_type_stats()
+                stats['count'] += 1
+                stats['size'] += file_size
+                stats['allocated'] += allocated
+                stats['ages'][bucket] += file_size
+
+                total_files += 1
+                total_size += file_size
+                total_allocated += allocated
+
+            # 目录占用统计包含所有被扫描的文件（不受最小文件大小限制）
+            dir_bytes += file_size
+            dir_count += 1
+            dir_ages[bucket] += file_size
+            if file_size > largest_size:
+                largest_path = path
+                largest_size = file_size
+
+        self.scanned_files += len(records)
+        self.total_files += total_files
+        self.total_size += total_size
+        self.total_allocated += total_allocated
+        self.size_group_bytes += size_bytes
+        if dir_count:
+            self.store_dir_stats(directory, [dir_bytes, dir_count, os.path.basename(largest_path),
+                                             largest_size, dir_ages])
+        if self.memory_budget:
+            self.check_memory()
+
+    def store_dir_stats(self, directory, stats):
+        """记录一个目录直接包含的文件的统计（该目录尚无记录时）"""
+        self.dir_stats[directory] = stats
+        self.dir_stats_bytes += DIR_RECORD_BYTES + sys.getsizeof(directory) + sys.getsizeof(stats[2])
+
+    def add_file(self, path, size, allocated, file_type, last_used):
+        """统计一个符合条件的文件（add_directory中内联了相同的逻辑）"""
+        self.offer(path, size, allocated)
+        if last_used < self.cold_cutoff:
+            self.offer_cold(path, size, allocated, last_used)
+        if self.size_groups is not None:
+            group = self.size_groups.get(size)
+            if group is None:
+                group = self.size_groups[size] = []
+                self.size_group_bytes += SIZE_GROUP_BYTES
+            group.append(path)
+            self.size_group_bytes += SIZE_RECORD_BYTES + sys.getsizeof(path)
+        if self.columns is not None:
+            columns = self.columns
+            columns.append(size, last_used, columns.category_id(file_type),
+                           columns.directory_id(os.path.dirname(path)))
+        stats = self.file_types.get(file_type)
+        if stats is None:
+            stats = self.file_types[file_type] = _new_type_stats()
+        stats['count'] += 1
+        stats['size'] += size
+        stats['allocated'] += allocated
+        stats['ages'][bisect.bisect(self.age_boundaries, last_used)] += size
+        self.total_files += 1
+        self.total_size += size
+        self.total_allocated += allocated
+
+    def defer_hardlink(self, key, path, size, allocated, file_type, last_used):
+        """记录一个有多个硬链接的文件，同一inode只保留路径最小的一个"""
+        self.hardlink_paths += 1
+        record = self.hardlinks.get(key)
+        if record is None:
+            self.hardlink_bytes += HARDLINK_RECORD_BYTES + sys.getsizeof(path)
+        if record is None or path < record[0]:
+            record = self.hardlinks[key] = (path, size, allocated, file_type, last_used)
+            if self.hardlink_log is not None:
+                self.hardlink_log.append((key, record))
+
+    def resolve_hardlinks(self, min_file_size):
+        """所有结果合并后，每个硬链接inode按保留的路径统计一次"""
+        dir_stats = self.dir_stats
+        for path, size, allocated, file_type, last_used in sorted(self.hardlinks.values()):
+            directory, name = os.path.split(path)
+            stats = dir_stats.get(directory)
+            if stats is None:
+                stats = [0, 0, name, -1, [0] * AGE_BUCKET_COUNT]
+                self.store_dir_stats(directory, stats)
+            stats[0] += size
+            stats[1] += 1
+            if size > stats[3]:
+                stats[2] = name
+                stats[3] = size
+            stats[4][bisect.bisect(self.age_boundaries, last_used)] += size
+            if self.snapshot is not None:
+                self.snapshot.add(path, size, allocated)
+            if size >= min_file_size:
+                self.add_file(path, size, allocated, file_type, last_used)
+        self.hardlinks_skipped += self.hardlink_paths - len(self.hardlinks)
+        self.hardlink_paths = 0
+        self.hardlinks = {}
+        self.hardlink_bytes = 0
+        if self.memory_budget:
+            self.check_memory()
+
+    def merge(self, other):
+        """合并另一个局部统计结果"""
+        self.scanned_files += other.scanned_files
+        self.total_files += other.total_files
+        self.total_size += other.total_size
+        self.total_allocated += other.total_allocated
+        for file_type, stats in other.file_types.items():
+            merged = self.file_types.get(file_type)
+            if merged is None:
+                merged = self.file_types[file_type] = _new_type_stats()
+            merged['count'] += stats['count']
+            merged['size'] += stats['size']
+            merged['allocated'] += stats['allocated']
+            merged['ages'] = [a + b for a, b in zip(merged['ages'], stats['ages'])]
+        for size, path, allocated in other.largest:
+            self.offer(path, size, allocated)
+        for size, path, allocated, last_used in other.cold:
+            self.offer_cold(path, size, allocated, last_used)
+        # 不同线程/分片处理的目录互不重叠
+        self.dir_stats.update(other.dir_stats)
+        self.dir_stats_bytes += other.dir_stats_bytes
+        if self.size_groups is not None and other.size_groups:
+            for size, paths in other.size_groups.items():
+                group = self.size_groups.get(size)
+                if group is None:
+                    self.size_groups[size] = list(paths)
+                else:
+                    group.extend(paths)
+            self.size_group_bytes += other.size_group_bytes
+        if self.dir_runs is not None and other.dir_runs is not None:
+            self.dir_runs.extend(other.dir_runs)
+        if self.size_runs is not None and other.size_runs is not None:
+            self.size_runs.extend(other.size_runs)
+        if self.columns is not None and other.columns is not None:
+            self.columns.extend(other.columns)
+        if self.snapshot is not None and other.snapshot is not None:
+            self.snapshot.absorb(other.snapshot)
+        # 同一inode的硬链接可能分布在不同的线程/分片中
+        self.hardlink_paths += other.hardlink_paths
+        self.hardlinks_skipped += other.hardlinks_skipped
+        for key, record in other.hardlinks.items():
+            current = self.hardlinks.get(key)
+            if current is None:
+                self.hardlink_bytes += HARDLINK_RECORD_BYTES + sys.getsizeof(record[0])
+            if current is None or record[0] < current[0]:
+                self.hardlinks[key] = record
+        if self.memory_budget:
+            self.check_memory()
+
+    def enable_spill(self):
+        """准备写入临时归并段的目录统计和重复文件候选（设置内存预算或保存检查点时）"""
+        if self.dir_runs is None:
+            self.dir_runs = SortedRuns(self.spill_dir, "dirs_", key=itemgetter(0))
+        if self.size_runs is None and self.size_groups is not None:
+            self.size_runs = SortedRuns(self.spill_dir, "sizes_")
+
+    def __getstate__(self):
+        # 调用方的回调函数不随进程间传递和检查点保存
+        state = self.__dict__.copy()
+        state['extra_memory'] = None
+        return state
+
+    def checkpoint_state(self):
+        """保存检查点用的状态（在两个目录之间调用，需先调用enable_spill()并设置hardlink_log）
+
+        目录统计、重复文件候选和快照记录先写入临时归并段，状态中只引用归并段的路径；
+        只追加的硬链接记录和列式结果不放入状态，只返回上次保存之后新增的部分，
+        由ScanCheckpoint追加到增量文件。每次保存的数据量只与两次保存之间的扫描量有关。
+        除写出缓存记录外不改变统计结果，保存成功后需调用checkpoint_saved()，
+        保存失败时下次保存的增量仍包含这次的部分。
+        Returns:
+            tuple: (状态字典, 增量)
+        """
+        self.spill()
+        state = self.__getstate__()
+        state['hardlinks'] = {}
+        state['hardlink_log'] = []
+        columns_delta = None
+        if self.columns is not None:
+            state['columns'] = ScanColumns()
+            state['_columns_marks'], columns_delta = self.columns.checkpoint_delta(self._columns_marks)
+        return state, {'hardlinks': self.hardlink_log, 'columns': columns_delta}
+
+    def checkpoint_saved(self, state):
+        """checkpoint_state()返回的状态保存成功后调用，之后的增量从这次保存开始计算"""
+        self.hardlink_log = []
+        self._columns_marks = state['_columns_marks']
+
+    @classmethod
+    def from_checkpoint(cls, state, deltas):
+        """由checkpoint_state()保存的状态和按保存顺序排列的全部增量恢复统计结果"""
+        agg = cls.__new__(cls)
+        # 以属性字典恢复，与扫描器以何种方式运行（脚本/模块）无关
+        agg.__dict__.update(state)
+        for delta in deltas:
+            for key, record in delta['hardlinks']:
+                agg.hardlinks[key] = record
+        agg.hardlink_bytes = sum(HARDLINK_RECORD_BYTES + sys.getsizeof(record[0])
+                                 for record in agg.hardlinks.values())
+        if agg.columns is not None:
+            agg.columns = ScanColumns.from_checkpoint_deltas([delta['columns'] for delta in deltas])
+        return agg
+
+    def run_files(self):
+        """所有临时归并段的路径"""
+        paths = []
+        for runs in (self.dir_runs, self.size_runs, self.snapshot):
+            if runs is not None:
+                paths.extend(runs.runs)
+        return paths
+
+    def spillable_bytes(self):
+        """可以写入临时归并段的缓存记录的估计占用（字节）"""
+        used = self.dir_stats_bytes + self.size_group_bytes
+        if self.snapshot is not None:
+            used += self.snapshot.memory_used()
+        return used
+
+    def memory_used(self):
+        """估算所有随扫描增长的结构当前占用的内存（字节）"""
+        used = self.spillable_bytes() + self.hardlink_bytes
+        if self.columns is not None:
+            used += self.columns.memory_used()
+        if self.extra_memory is not None:
+            used += self.extra_memory()
+        return used
+
+    def check_memory(self):
+        """超出内存预算时把缓存记录写入临时归并段（在两个目录之间调用）
+
+        列式结果、硬链接等不能写出的结构本身接近预算时，缓存记录至少积累到预算的1/16
+        才写出一次，避免每个目录都产生一个很小的归并段。
+        """
+        if self.memory_used() > self.memory_budget and self.spillable_bytes() * 16 >= self.memory_budget:
+            self.spill()
+
+    def spill(self):
+        """把内存中的目录统计、重复文件候选和快照记录排序后写入临时文件"""
+        if self.dir_stats:
+            self.dir_runs.spill(self.dir_stats.items())
+            self.dir_stats = {}
+            self.dir_stats_bytes = 0
+        if self.size_runs is not None and self.size_groups:
+            self.size_runs.spill((size, path) for size, paths in self.size_groups.items() for path in paths)
+            self.size_groups = {}
+            self.size_group_bytes = 0
+        if self.snapshot is not None:
+            self.snapshot.spill()
+
+    def iter_dir_stats(self):
+        """按路径顺序返回全部目录统计 (目录, 统计)，包括已写入临时文件的部分
+
+        目录统计写入临时文件后，硬链接又计入该目录时同一目录会出现两次，
+        按写入先后排列，由DirectoryTree.build依次累加。
+        """
+        if self.dir_runs is None:
+            return iter(sorted(self.dir_stats.items()))
+        return self.dir_runs.merged(self.dir_stats.items())
+
+    def duplicate_candidates(self):
+        """逐个返回至少有两个文件的大小分组 (大小, [路径, ...])，包括已写入临时文件的部分
+
+        有临时归并段时按大小顺序与内存中的部分流式归并，同一时间只有一个分组在内存中，
+        组内路径已排序。
+        """
+        if self.size_runs is None:
+            return ((size, paths) for size, paths in self.size_groups.items() if len(paths) > 1)
+        records = self.size_runs.merged((size, path) for size, paths in self.size_groups.items()
+                                        for path in paths)
+        return self._group_sizes(records)
+
+    @staticmethod
+    def _group_sizes(records):
+        for size, group in itertools.groupby(records, key=itemgetter(0)):
+            paths = [path for _, path in group]
+            if len(paths) > 1:
+                yield size, paths
+
+    def discard_spill(self, keep=()):
+        """删除临时归并段（包括快照的归并段）
+        Args:
+            keep: 保留的归并段路径（扫描取消时检查点引用的部分）
+        """
+        for runs in (self.dir_runs, self.size_runs, self.snapshot):
+            if runs is not None:
+                runs.discard(keep)
+
+    def largest_sorted(self):
+        """按大小从大到小返回最大文件列表 [(path, size, allocated), ...]"""
+        return [(path, size, allocated) for size, path, allocated in sorted(self.largest, reverse=True)]
+
+    def cold_sorted(self):
+        """按大小从大到小返回最大冷文件列表 [(path, size, allocated, last_used), ...]"""
+        return [(path, size, allocated, last_used)
+                for size, path, allocated, last_used in sorted(self.cold, reverse=True)]
+
+
 class DiskScanner:
     def __init__(self):
         self.total_files = 0
         self.total_size = 0
-        self.largest_files = []
-        self.file_types = defaultdict(lambda: {'count': 0, 'size': 0})
+        self.total_allocated = 0
+        self.hardlinks_skipped = 0
+        self.largest_files = FileRecordStore()
+        self.file_types = defaultdict(_new_type_stats)
         self.scanned_files = 0
         self.start_time = 0
+        self.scan_elapsed = None
+        self.directory_tree = None
+        self.size_groups = {}
+        self.duplicate_groups = []
+        self.cold_files = FileRecordStore()
+        self.age_sizes = [0] * AGE_BUCKET_COUNT
+        self.columns = None
+        self.snapshot_diff = None
 
         # 文件类型过滤器
         self.file_type_filter = None
         self.file_type_mapping = self._create_file_type_mapping()
+        self.classifier = FileClassifier(self.file_type_mapping)
+        self._category_lookup, self._other_category = self.classifier.compile_filter(None)
 
-        # 进度回调函数
+        # 进度回调函数；进度最多每progress_interval秒报告一次
         self.progress_callback = None
+        self.progress_interval = 0.1
+        self._last_report_time = 0.0
+
+        # 安静模式：不在控制台输出扫描过程信息（错误信息除外）
+        self.quiet = False
+
+        # 进度估算方式："auto" 单遍扫描+估算，"prewalk" 预先遍历计数
+        self.estimate_mode = "auto"
+        self.history_file = "scan_history.json"
+        self.estimate_source = ""
+
+        # 遍历引擎："scandir"（默认）或 "walk"（旧版，保留用于基准对比）
+        self.walker_engine = "scandir"
+
+        # 并行遍历的工作线程数，1表示单线程
+        self.worker_threads = 1
+        self.parallel_mode = "threads"
+
+        # 持久化扫描索引（ScanIndex），None表示不使用
+        self.scan_index = None
+
+        # 重复文件查找及其哈希线程数
+        self.find_duplicates = False
+        self.duplicate_workers = 4
+
+        # 持久化文件内容哈希缓存（HashCache），None表示不使用
+        self.hash_cache = None
+
+        # 是否收集列式结果（每个符合条件的文件一行），用于大小分布等统计
+        self.collect_columns = False
+
+        # 扫描快照文件路径，None表示不保存快照
+        self.snapshot_path = None
+        self.snapshot_run_size = 500000
+
+        # 缓存记录的内存预算（字节，0表示不限制）和临时归并段目录（None为系统临时目录）
+        self.memory_budget = 0
+        self.spill_dir = None
+
+        # 扫描检查点（ScanCheckpoint），None表示不保存检查点
+        self.checkpoint = None
+        self._checkpoint_params = None
+        self._checkpoint_runs = set()
+
+        # 文件系统边界：只扫描根目录所在的文件系统；跳过的文件系统类型（默认伪文件系统）
+        self.one_filesystem = False
+        self.skip_fs_types = PSEUDO_FS_TYPES
+        self._pruned_dirs = set()
+        self._root_device = None
+        self._prune_enabled = False
+
+        # 用户提供的排除/包含模式（PathFilter），None表示不过滤路径
+        self.path_filter = None
+
+        # 取消令牌；scan_complete为False表示结果是取消扫描时的部分结果
+        self.cancel_token = CancellationToken()
+        self.scan_complete = True
+        self._progress_lock = threading.Lock()
+        self._progress_enabled = True
+        self._subtree_counts = {}
+        self._subtree_bytes = 0
+        self._now_ns = None
+
+    def _reset_results(self):
+        """清空上一次扫描的结果，同一个扫描器可以重复使用"""
+        self.total_files = 0
+        self.total_size = 0
+        self.total_allocated = 0
+        self.hardlinks_skipped = 0
+        self.largest_files = FileRecordStore()
+        self.file_types = defaultdict(_new_type_stats)
+        self.scanned_files = 0
+        self.scan_elapsed = None
+        self.directory_tree = None
+        self.size_groups = {}
+        self.duplicate_groups = []
+        self.cold_files = FileRecordStore()
+        self.age_sizes = [0] * AGE_BUCKET_COUNT
+        self.columns = None
+        self.snapshot_diff = None
 
     def format_size(self, size_bytes):
         """格式化文件大小"""
-        if size_bytes == 0:
-            return "0 B"
+        return format_size(size_bytes)
 
-        size_names = ["B", "KB", "MB", "GB", "TB"]
-        i = 0
-        size = float(size_bytes)
+    def scan_time(self):
+        """扫描耗时（秒）；载入的结果为保存时记录的耗时"""
+        if self.scan_elapsed is not None:
+            return self.scan_elapsed
+        return time.time() - self.start_time
 
-        while size >= 1024.0 and i < len(size_names) - 1:
-            size /= 1024.0
-            i += 1
+    def save_results_file(self, file_path, scan_path, min_file_size_kb, max_files, include_hidden):
+        """把扫描结果保存为二进制结果文件（列式、可用mmap直接载入）
+        Returns:
+            bool: 是否保存成功
+        """
+        from scan_results_file import save_results_file
+        settings = {'min_file_size_kb': min_file_size_kb, 'max_files': max_files, 'include_hidden': include_hidden}
+        try:
+            size = save_results_file(self, file_path, scan_path, settings)
+        except OSError as e:
+            print(f"[错误] 保存结果文件时出错: {e}")
+            return False
+        self._log(f"[信息] 结果文件已保存: {file_path} ({self.format_size(size)})")
+        return True
+
+    def load_results(self, file_path):
+        """载入save_results_file()保存的结果，无需重新扫描
 
-        return f"{size:.1f} {size_names[i]}"
+        各列直接映射文件内容，载入耗时与文件数无关；载入的结果只读。
+        与上次快照的对比结果不保存在结果文件中。
+        Returns:
+            dict: 保存时的扫描路径、扫描设置等信息
+        Raises:
+            ValueError: 文件不是结果文件或版本不支持
+        """
+        from scan_results_file import ScanResultsFile
+        results = ScanResultsFile(file_path)
+        meta = results.meta
+        self._reset_results()
+        self.scan_complete = meta['scan_complete']
+        self.scan_elapsed = meta['scan_time']
+        self.scanned_files = meta['scanned_files']
+        self.total_files = meta['total_files']
+        self.total_size = meta['total_size']
+        self.total_allocated = meta['total_allocated']
+        self.hardlinks_skipped = meta['hardlinks_skipped']
+        self.age_sizes = meta['age_sizes']
+        self.file_types.update(meta['file_types'])
+        self.largest_files = results.largest_files()
+        self.cold_files = results.cold_files()
+        self.directory_tree = results.directory_tree()
+        self.columns = results.columns()
+        self.duplicate_groups = results.duplicate_groups()
+        return meta
 
     def _create_file_type_mapping(self):
         """创建文件类型映射"""
@@ -65,6 +846,7 @@ class DiskScanner:
             selected_types: list of selected type names, or None for all files
         """
         self.file_type_filter = selected_types
+        self._category_lookup, self._other_category = self.classifier.compile_filter(selected_types)
 
     def set_progress_callback(self, callback):
         """设置进度回调函数
@@ -73,68 +855,937 @@ class DiskScanner:
         """
         self.progress_callback = callback
 
-    def should_scan_file(self, file_path):
-        """判断文件是否应该被扫描
+    def set_progress_interval(self, seconds):
+        """设置进度报告的最小时间间隔
         Args:
-            file_path: Path object of the file
+            seconds: 间隔秒数，0表示每个目录都报告
+        """
+        self.progress_interval = max(0.0, float(seconds))
+
+    def set_quiet(self, quiet=True):
+        """设置安静模式，不在控制台输出扫描进度和配置信息"""
+        self.quiet = quiet
+
+    def set_estimate_mode(self, mode):
+        """设置进度估算方式
+        Args:
+            mode: "auto" 单遍扫描，使用历史记录/inode数/外推估算总数；
+                  "prewalk" 先完整遍历一次计数（旧行为，扫描时间加倍）
+        """
+        if mode not in ("auto", "prewalk"):
+            raise ValueError(f"未知的进度估算方式: {mode}")
+        self.estimate_mode = mode
+
+    def set_walker_engine(self, engine):
+        """设置目录遍历引擎
+        Args:
+            engine: "scandir" 基于os.scandir，复用DirEntry的stat数据；
+                    "walk" 旧版os.walk + pathlib.Path实现
+        """
+        if engine not in ("scandir", "walk"):
+            raise ValueError(f"未知的遍历引擎: {engine}")
+        self.walker_engine = engine
+
+    def set_parallel_workers(self, workers, mode="threads"):
+        """设置并行遍历的工作线程/进程数
+        Args:
+            workers: 工作线程或进程数，1为单线程遍历；仅对scandir引擎有效
+            mode: "threads" 线程池共享目录队列；
+                  "processes" 进程池按子目录分片扫描，绕开GIL对统计逻辑的限制
+        """
+        if mode not in ("threads", "processes"):
+            raise ValueError(f"未知的并行方式: {mode}")
+        self.worker_threads = max(1, int(workers))
+        self.parallel_mode = mode
+
+    def set_cancel_token(self, token):
+        """设置取消令牌，每次扫描前设置一个新的令牌
+        Args:
+            token: CancellationToken，None表示使用新的默认令牌
+        """
+        self.cancel_token = token if token is not None else CancellationToken()
+
+    def cancel(self):
+        """请求取消当前扫描，扫描器在处理下一个目录前停止"""
+        self.cancel_token.cancel()
+
+    def set_scan_index(self, index_path, verify_files=False):
+        """设置持久化扫描索引，重复扫描时跳过未变化的目录
+        Args:
+            index_path: SQLite索引文件路径，None表示不使用索引
+            verify_files: True时未变化的目录仍然stat其中的文件，
+                          能发现就地修改的文件大小，但速度较慢
+        """
+        if self.scan_index is not None:
+            self.scan_index.close()
+            self.scan_index = None
+        if index_path:
+            from scan_index import ScanIndex
+            self.scan_index = ScanIndex(index_path, verify_files)
+
+    def set_duplicate_detection(self, enabled=True, workers=4):
+        """设置扫描后是否查找重复文件
+        Args:
+            enabled: True时扫描过程中按大小收集文件，扫描结束后查找内容相同的文件
+            workers: 计算哈希的线程数
+        """
+        self.find_duplicates = enabled
+        self.duplicate_workers = max(1, int(workers))
+
+    def set_hash_cache(self, cache_path, max_entries=1000000):
+        """设置持久化哈希缓存，重复查找重复文件时不再读取未变化文件的内容
+        Args:
+            cache_path: SQLite缓存文件路径，None表示不使用缓存
+            max_entries: 缓存的最大条目数，超出时淘汰最久未使用的条目
+        """
+        if self.hash_cache is not None:
+            self.hash_cache.close()
+            self.hash_cache = None
+        if cache_path:
+            from hash_cache import HashCache
+            self.hash_cache = HashCache(cache_path, max_entries)
+
+    def set_columnar_results(self, enabled=True):
+        """设置是否收集列式扫描结果
+        Args:
+            enabled: True时每个符合条件的文件在self.columns（ScanColumns）中记录一行
+                     （大小、最后使用时间、类型编号、目录编号），报告中增加大小分布和分位数；
+                     安装了NumPy时统计为向量化运算
+        """
+        self.collect_columns = enabled
+
+    def set_snapshot(self, snapshot_path, run_size=500000):
+        """设置扫描快照文件，扫描完成后保存所有被扫描文件的路径和大小
+        Args:
+            snapshot_path: 快照文件路径（.gz结尾时用gzip压缩），None表示不保存；
+                           文件已存在时先与上次的快照对比，结果保存在self.snapshot_diff
+            run_size: 内存中最多缓存的记录数，超出后排序写入临时文件
+        """
+        self.snapshot_path = snapshot_path
+        self.snapshot_run_size = max(1, int(run_size))
+
+    def _new_snapshot_writer(self):
+        """创建快照记录器，临时归并段放在快照文件所在的目录"""
+        if not self.snapshot_path:
+            return None
+        from scan_snapshot import SnapshotWriter
+        return SnapshotWriter(self._root_prefix_len, self.snapshot_run_size,
+                              os.path.dirname(os.path.abspath(self.snapshot_path)))
+
+    def _save_snapshot(self, agg, scan_root):
+        """写出本次扫描的快照，已有旧快照时先对比"""
+        from scan_snapshot import diff_snapshots, read_snapshot_header
+        new_path = self.snapshot_path + ".new"
+        count = agg.snapshot.finish(new_path, scan_root, self.snapshot_path.endswith(".gz"))
+        if os.path.exists(self.snapshot_path):
+            try:
+                if read_snapshot_header(self.snapshot_path)["root"] == os.path.abspath(scan_root):
+                    self.snapshot_diff = diff_snapshots(self.snapshot_path, new_path)
+                else:
+                    self._log(f"[信息] 旧快照的扫描根目录不同，不做对比: {self.snapshot_path}")
+            except (OSError, ValueError) as e:
+                print(f"[警告] 无法读取旧快照 {self.snapshot_path}: {e}")
+        os.replace(new_path, self.snapshot_path)
+        self._log(f"[信息] 快照已保存: {self.snapshot_path} ({count:,} 个文件)")
+
+    def set_memory_budget(self, max_bytes, spill_dir=None):
+        """设置扫描的内存预算
+        Args:
+            max_bytes: 扫描时随文件和目录数增长的各个结构（目录统计、重复文件候选、快照记录、
+                       列式结果、硬链接等）的估计占用上限（字节），0表示不限制；超出后把可以写出的
+                       部分排序写入临时文件，扫描结束后流式归并、分批查找重复文件，结果与不限制时相同。
+                       扫描结束后留在内存中的结果（目录树、重复文件组、列式结果）也在预算之内，
+                       预算应大于结果本身的大小
+            spill_dir: 临时文件目录，None表示系统临时目录
+        """
+        self.memory_budget = max(0, int(max_bytes))
+        self.spill_dir = spill_dir
+
+    def set_checkpoint(self, checkpoint_path, interval=60.0):
+        """设置扫描检查点，长时间扫描中断后可以继续
+        Args:
+            checkpoint_path: 检查点文件路径，None表示不使用；
+                             文件中有参数相同的未完成扫描时，从检查点继续扫描
+            interval: 保存检查点的间隔（秒），扫描被取消时也会保存
+        使用检查点时按绝对路径扫描（与当前工作目录无关），保存时缓存的记录写入临时归并段，
+        检查点只引用归并段的路径；归并段放在set_memory_budget()的spill_dir中，
+        扫描取消后保留，扫描完成后删除
+        """
+        if checkpoint_path:
+            from scan_checkpoint import ScanCheckpoint
+            self.checkpoint = ScanCheckpoint(checkpoint_path, interval)
+        else:
+            self.checkpoint = None
+
+    def _scan_params(self, directory_path, min_file_size, max_files, include_hidden):
+        """影响扫描结果的全部参数，检查点只在参数完全相同时恢复"""
+        path_filter = self.path_filter
+        return {
+            'root': os.path.abspath(directory_path),
+            'min_file_size': min_file_size,
+            'max_files': max_files,
+            'include_hidden': include_hidden,
+            'file_type_filter': sorted(self.file_type_filter) if self.file_type_filter else None,
+            'exclude': path_filter.exclude if path_filter is not None else [],
+            'include': path_filter.include if path_filter is not None else [],
+            'one_filesystem': self.one_filesystem,
+            'skip_fs_types': sorted(self.skip_fs_types),
+            'find_duplicates': self.find_duplicates,
+            'collect_columns': self.collect_columns,
+            'snapshot_path': self.snapshot_path,
+            'scan_index': self.scan_index is not None,
+        }
+
+    def _load_checkpoint(self):
+        """读取检查点并恢复扫描状态
         Returns:
-            bool: True if file should be scanned
+            tuple: (待扫描目录栈, ScanAggregate)；没有可用的检查点时返回None
         """
-        # 如果没有设置过滤器，扫描所有文件
-        if self.file_type_filter is None or "全部文件" in self.file_type_filter:
-            return True
+        loaded = self.checkpoint.load(self._checkpoint_params)
+        if loaded is None:
+            return None
+        state, deltas = loaded
+        # 统计结果和进度估算器以属性字典保存，与扫描器以何种方式运行（脚本/模块）无关
+        agg = ScanAggregate.from_checkpoint(state['aggregate'], deltas)
+        missing = [path for path in agg.run_files() if not os.path.exists(path)]
+        if missing:
+            print(f"[警告] 检查点引用的临时文件已不存在，重新开始扫描: {missing[0]}")
+            self.checkpoint.clear()
+            return None
+        if agg.memory_budget:
+            agg.extra_memory = self._subtree_memory
+        self._estimator.__dict__.update(state['estimator'])
+        self._now_ns = state['now_ns']
+        self._progress_scanned = state['progress_scanned']
+        self._subtree_counts = state['subtree_counts']
+        self._subtree_bytes = sum(SUBTREE_RECORD_BYTES + sys.getsizeof(rel) for rel in self._subtree_counts)
+        self._log(f"[信息] 从检查点继续扫描: 已扫描 {agg.scanned_files:,} 个文件, "
+                  f"剩余 {len(state['pending_dirs']):,} 个待扫描目录")
+        return state['pending_dirs'], agg
+
+    def _save_checkpoint(self, pending_dirs, agg):
+        """保存检查点（在两个目录之间调用，此时统计结果与目录栈一致）"""
+        aggregate, delta = agg.checkpoint_state()
+        state = {
+            'pending_dirs': pending_dirs,
+            'aggregate': aggregate,
+            'estimator': self._estimator.__dict__,
+            'now_ns': self._now_ns,
+            'progress_scanned': self._progress_scanned,
+            'subtree_counts': self._subtree_counts,
+        }
+        try:
+            self.checkpoint.save(self._checkpoint_params, state, delta)
+        except OSError as e:
+            print(f"[警告] 保存检查点失败: {e}")
+            return
+        agg.checkpoint_saved(aggregate)
+        # 扫描取消时只保留最近一次保存的检查点引用的归并段
+        self._checkpoint_runs = set(agg.run_files())
+
+    def set_one_filesystem(self, enabled=True):
+        """设置是否只扫描根目录所在的文件系统（类似du -x）
+        Args:
+            enabled: True时跳过设备号（st_dev）与根目录不同的子目录
+        """
+        self.one_filesystem = enabled
+
+    def set_skip_filesystem_types(self, fs_types):
+        """设置跳过的文件系统类型，挂载点从/proc/self/mountinfo读取（仅Linux）
+        Args:
+            fs_types: 文件系统类型集合，如mount_table.PSEUDO_FS_TYPES | NETWORK_FS_TYPES；
+                      None或空集合表示不按类型跳过
+        """
+        self.skip_fs_types = frozenset(fs_types or ())
+
+    def _prepare_pruning(self, scan_root):
+        """扫描前计算需要整体跳过的挂载点，子树在列出之前就被剪除"""
+        self._root_device = os.stat(scan_root).st_dev if self.one_filesystem else None
+        if self.skip_fs_types or self._root_device is not None:
+            self._pruned_dirs = pruned_mount_points(scan_root, self.skip_fs_types, self._root_device)
+        else:
+            self._pruned_dirs = set()
+        self._prune_enabled = bool(self._pruned_dirs) or self._root_device is not None
+        if self._pruned_dirs:
+            self._log(f"[信息] 跳过 {len(self._pruned_dirs)} 个挂载点: "
+                      f"{', '.join(sorted(self._pruned_dirs)[:5])}"
+                      f"{' ...' if len(self._pruned_dirs) > 5 else ''}")
+
+    def _prune_subdirs(self, subdirs, check_device=True):
+        """去掉需要跳过的子目录
+
+        先按挂载表过滤（不需要系统调用，失效的网络挂载不会被访问），
+        只扫描一个文件系统时再比较每个子目录的设备号。
+        Args:
+            check_device: False表示列目录时已用DirEntry的stat比较过设备号
+        """
+        pruned = self._pruned_dirs
+        root_device = self._root_device if check_device else None
+        kept = []
+        for path in subdirs:
+            if path in pruned:
+                continue
+            if root_device is not None:
+                try:
+                    if os.lstat(path).st_dev != root_device:
+                        continue
+                except OSError:
+                    continue
+            kept.append(path)
+        return kept
 
-        file_ext = file_path.suffix.lower()
+    def set_path_patterns(self, exclude=None, include=None):
+        """设置排除/包含的glob模式，扫描前一次性编译
+        Args:
+            exclude: 排除模式列表，如 [".git", "node_modules", "*.tmp", "build/cache"]；
+                     匹配的目录在列出之前就被跳过
+            include: 包含模式列表，设置后只统计匹配的文件
+        """
+        if exclude or include:
+            self.path_filter = PathFilter(exclude, include)
+        else:
+            self.path_filter = None
+
+    def _filter_subdirs(self, subdirs, include_hidden):
+        """去掉隐藏目录（不包含隐藏文件时）和匹配排除模式的目录"""
+        path_filter = self.path_filter
+        prefix_len = self._root_prefix_len
+        kept = []
+        for path in subdirs:
+            name = path[path.rfind(os.sep) + 1:]
+            if not include_hidden and name.startswith('.'):
+                continue
+            if path_filter is not None and path_filter.is_excluded(name, path[prefix_len:]):
+                continue
+            kept.append(path)
+        return kept
+
+    def _new_aggregate(self, max_files):
+        """创建局部统计结果"""
+        # 并行扫描时每个工作线程/进程各有一份局部结果，平分内存预算
+        budget = max(1, self.memory_budget // self.worker_threads) if self.memory_budget else 0
+        agg = ScanAggregate(max_files, self.find_duplicates, self._now_ns, self.collect_columns,
+                            self._new_snapshot_writer(), budget, self.spill_dir)
+        if budget:
+            agg.extra_memory = self._subtree_memory
+        return agg
+
+    def _load_history(self):
+        """读取扫描历史记录"""
+        try:
+            with open(self.history_file, 'r', encoding='utf-8', errors='surrogateescape') as f:
+                history = json.load(f)
+            return history if isinstance(history, dict) else {}
+        except (OSError, ValueError):
+            return {}
 
-        # 检查是否属于选中的文件类型
-        for type_name, extensions in self.file_type_mapping.items():
-            if type_name in self.file_type_filter:
-                if file_ext in extensions:
-                    return True
+    def _save_history(self, directory_path, file_count):
+        """保存本次扫描的文件总数和主要子目录的文件数，供下次估算进度和分片使用
 
-        # 如果选择了"其他文件"类型，处理未知扩展名
-        if "其他文件" in self.file_type_filter:
-            known_extensions = set()
-            for extensions in self.file_type_mapping.values():
-                known_extensions.update(extensions)
-            if file_ext not in known_extensions:
-                return True
+        同一进程中的多个扫描器（如异步扫描同时进行的各次扫描）可能共用一个历史文件，
+        读取、修改和写入在锁中进行，先写临时文件再替换，读取时不会遇到写了一半的文件。
+        """
+        # 只记录文件数占比超过0.1%的子目录，避免历史文件过大
+        min_count = max(file_count // 1000, 1)
+        subtrees = {rel: count for rel, count in self._subtree_counts.items() if count >= min_count}
+        with _history_lock:
+            history = self._load_history()
+            history[os.path.abspath(directory_path)] = {
+                'files': file_count,
+                'subtrees': subtrees,
+                'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+            # 无法解码的文件名（surrogateescape）按原始字节写出，读取时还原
+            temp_path = self.history_file + ".tmp"
+            try:
+                with open(temp_path, 'w', encoding='utf-8', errors='surrogateescape') as f:
+                    json.dump(history, f, ensure_ascii=False, indent=2)
+                os.replace(temp_path, self.history_file)
+            except (OSError, ValueError):
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
 
-        return False
+    def _estimate_total_files(self, directory_path):
+        """不遍历目录树，廉价地估算文件总数
+        Returns:
+            tuple: (估算的文件数, 估算来源)，无法估算时为 (0, "外推")
+        """
+        # 1. 上次扫描同一目录的文件数
+        record = self._load_history().get(os.path.abspath(directory_path))
+        if record and record.get('files', 0) > 0:
+            return record['files'], "上次扫描"
+
+        # 2. 扫描整个挂载点时，已用inode数是很好的上限估计
+        if hasattr(os, 'statvfs') and os.path.ismount(directory_path):
+            try:
+                st = os.statvfs(directory_path)
+                used_inodes = st.f_files - st.f_ffree
+                if used_inodes > 0:
+                    return used_inodes, "inode"
+            except OSError:
+                pass
+
+        # 3. 扫描过程中按已遍历目录外推
+        return 0, "外推"
+
+    def _log(self, message):
+        """输出扫描过程信息，安静模式下不输出"""
+        if not self.quiet:
+            print(message)
+
+    def _report_progress(self, progress, total, scanned_files=None):
+        """输出进度并调用GUI进度回调"""
+        if scanned_files is None:
+            scanned_files = self.scanned_files
+        self._log(f"[进度] {progress:.1f}% ({scanned_files:,}/{total:,})")
+
+        if self.progress_callback:
+            try:
+                self.progress_callback(progress, scanned_files, total)
+            except:
+                pass  # 忽略回调错误，不影响扫描
+
+    def should_scan_file(self, file_path):
+        """判断文件是否应该被扫描
+        Args:
+            file_path: Path object of the file
+        Returns:
+            bool: True if file should be scanned
+        """
+        return self.classifier.lookup_name(file_path.name, self._category_lookup,
+                                           self._other_category) is not None
 
     def get_available_file_types(self):
         """获取所有可用的文件类型"""
         return ["全部文件"] + list(self.file_type_mapping.keys()) + ["其他文件"]
 
     def get_file_type(self, file_path):
-        """获取文件类型"""
-        suffix = file_path.suffix.lower()
-        if not suffix:
-            return "无扩展名"
-
-        type_mapping = {
-            '.txt': '文本文件', '.doc': 'Word文档', '.docx': 'Word文档',
-            '.pdf': 'PDF文档', '.jpg': '图片', '.jpeg': '图片', '.png': '图片',
-            '.gif': '图片', '.bmp': '图片', '.mp4': '视频', '.avi': '视频',
-            '.mkv': '视频', '.mov': '视频', '.mp3': '音频', '.wav': '音频',
-            '.flac': '音频', '.zip': '压缩文件', '.rar': '压缩文件', '.7z': '压缩文件',
-            '.exe': '程序文件', '.dll': '程序文件', '.msi': '安装包',
-            '.py': '代码文件', '.js': '代码文件', '.html': '网页文件',
-            '.css': '样式文件', '.iso': '光盘镜像', '.torrent': '种子文件'
+        """获取文件类型（与过滤器使用同一套分类）"""
+        return self.classifier.classify_name(file_path.name)
+
+    def _update_progress(self, files_done):
+        """每遍历一个条目后检查是否需要报告进度（按时间间隔节流）"""
+        # 每64个文件才读一次时钟
+        if files_done & 63:
+            return
+        now = time.monotonic()
+        if now - self._last_report_time >= self.progress_interval:
+            self._last_report_time = now
+            self._report_progress(self._estimator.progress(files_done), self._estimator.total)
+
+    def _scan_with_walk(self, directory_path, min_file_size, max_files, include_hidden):
+        """旧版遍历引擎：os.walk + pathlib.Path（保留用于基准对比）
+        Returns:
+            ScanAggregate: 扫描统计结果
+        """
+        estimator = self._estimator
+        agg = self._new_aggregate(max_files)
+        files_done = 0
+
+        token = self.cancel_token
+        for root, dirs, files in os.walk(directory_path):
+            if token.cancelled:
+                break
+            if self._prune_enabled or self.path_filter is not None or not include_hidden:
+                kept = [os.path.join(root, d) for d in dirs]
+                if self._prune_enabled:
+                    kept = self._prune_subdirs(kept)
+                kept = set(self._filter_subdirs(kept, include_hidden))
+                dirs[:] = [d for d in dirs if os.path.join(root, d) in kept]
+            estimator.add_directory(len(files), len(dirs))
+            dir_stats = [0, 0, None, -1, [0] * AGE_BUCKET_COUNT]
+
+            for file in files:
+                # 每个遍历到的条目都计入节流计数，被过滤掉的文件很多时进度也不会停滞
+                files_done += 1
+                self._update_progress(files_done)
+                try:
+                    file_path = Path(root) / file
+                    full_path = os.path.join(root, file)
+
+                    # 检查隐藏文件
+                    if not include_hidden and file.startswith('.'):
+                        continue
+
+                    # 检查排除/包含模式
+                    if self.path_filter is not None and not self.path_filter.match_file(
+                            file, full_path[self._root_prefix_len:]):
+                        continue
+
+                    # 检查文件类型过滤器
+                    if not self.should_scan_file(file_path):
+                        continue
+
+                    if file_path.is_file():
+                        st = file_path.stat()
+                        file_size = st.st_size
+                        allocated = st.st_blocks * 512 if HAS_ST_BLOCKS else file_size
+                        last_used = max(st.st_mtime_ns, st.st_atime_ns)
+
+                        if st.st_nlink > 1:
+                            # 硬链接文件扫描结束后按inode去重
+                            agg.defer_hardlink((st.st_dev, st.st_ino), full_path, file_size,
+                                               allocated, self.get_file_type(file_path), last_used)
+                            agg.scanned_files += 1
+                            self.scanned_files = agg.scanned_files
+                            continue
+
+                        # 只统计大于指定大小的文件
+                        if file_size >= min_file_size:
+                            agg.add_file(full_path, file_size, allocated,
+                                         self.get_file_type(file_path), last_used)
+
+                        if agg.snapshot is not None:
+                            agg.snapshot.add(full_path, file_size, allocated)
+
+                        # 目录占用统计
+                        dir_stats[0] += file_size
+                        dir_stats[1] += 1
+                        dir_stats[4][bisect.bisect(agg.age_boundaries, last_used)] += file_size
+                        if file_size > dir_stats[3]:
+                            dir_stats[2] = file
+                            dir_stats[3] = file_size
+
+                        agg.scanned_files += 1
+                        self.scanned_files = agg.scanned_files
+
+                except (OSError, PermissionError) as e:
+                    continue
+                except Exception as e:
+                    continue
+
+            if dir_stats[1]:
+                agg.store_dir_stats(root, dir_stats)
+            if agg.memory_budget:
+                agg.check_memory()
+
+        return agg
+
+    def _count_subtree_files(self, current_dir, file_count):
+        """累计前两层子目录的文件数（调用方需持有进度锁）"""
+        rel = current_dir[self._root_prefix_len:]
+        if not rel or not file_count:
+            return
+        parts = rel.split(os.sep, 2)
+        self._add_subtree_files(parts[0], file_count)
+        if len(parts) > 1:
+            self._add_subtree_files(parts[0] + os.sep + parts[1], file_count)
+
+    def _add_subtree_files(self, rel, file_count):
+        """累计一个子目录的文件数（调用方需持有进度锁）"""
+        count = self._subtree_counts.get(rel)
+        if count is None:
+            count = 0
+            self._subtree_bytes += SUBTREE_RECORD_BYTES + sys.getsizeof(rel)
+        self._subtree_counts[rel] = count + file_count
+
+    def _subtree_memory(self):
+        """按子目录累计的文件数的估计占用（字节），并行扫描时由各工作线程的局部结果平分"""
+        return self._subtree_bytes // self.worker_threads
+
+    def _directory_done(self, current_dir, file_count, subdir_count, scanned_count):
+        """每列出并处理完一个目录后更新进度（多线程安全）"""
+        with self._progress_lock:
+            estimator = self._estimator
+            estimator.add_directory(file_count, subdir_count)
+            self._count_subtree_files(current_dir, file_count)
+            self._progress_scanned += scanned_count
+            if not self._progress_enabled:
+                return
+
+            # 按时间间隔节流，期间的多次更新合并为最新的一次
+            now = time.monotonic()
+            if now - self._last_report_time >= self.progress_interval:
+                self._last_report_time = now
+                self._report_progress(estimator.progress(estimator.files_seen),
+                                      estimator.total, self._progress_scanned)
+
+    def _list_directory(self, current_dir):
+        """列出目录中的子目录和普通文件（符号链接不跟随）
+        Returns:
+            tuple: (子目录路径列表, 文件DirEntry列表)；目录无法访问时返回None
+        """
+        if self.scan_index is not None:
+            return self.scan_index.list_directory(current_dir)
+
+        try:
+            with os.scandir(current_dir) as it:
+                entries = list(it)
+        except OSError:
+            return None
+
+        # 只扫描一个文件系统时直接用DirEntry的stat比较子目录的设备号，不再单独lstat
+        root_device = self._root_device
+        subdirs = []
+        file_entries = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if root_device is not None and entry.stat(follow_symlinks=False).st_dev != root_device:
+                        continue
+                    subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    file_entries.append(entry)
+            except OSError:
+                continue
+        return subdirs, file_entries
+
+    def _read_directory(self, current_dir, include_hidden):
+        """os.scandir遍历引擎：列出单个目录，为通过过滤的文件生成记录
+
+        直接使用DirEntry自带的类型信息和stat结果（Windows上列目录时已取得，
+        无需额外系统调用），热路径中只使用字符串，不创建Path对象。
+        Args:
+            current_dir: 目录路径字符串
+        Returns:
+            tuple: (需要继续遍历的子目录路径列表, 目录中的文件数, FileRecord列表)；
+                   目录无法访问时返回None
+        """
+        listing = self._list_directory(current_dir)
+        if listing is None:
+            return None
+        subdirs, file_entries = listing
+        if self._prune_enabled:
+            # 使用扫描索引时子目录只有路径，需要lstat比较设备号
+            subdirs = self._prune_subdirs(subdirs, check_device=self.scan_index is not None)
+        if self.path_filter is not None or not include_hidden:
+            subdirs = self._filter_subdirs(subdirs, include_hidden)
+
+        path_filter = self.path_filter
+        prefix_len = self._root_prefix_len
+        category_lookup = self._category_lookup
+        other_category = self._other_category
+        records = []
+        append = records.append
+        # 直接调用tuple.__new__，省去namedtuple构造函数的Python层调用
+        new_record = tuple.__new__
+        for entry in file_entries:
+            name = entry.name
+            try:
+                # 检查隐藏文件
+                if not include_hidden and name.startswith('.'):
+                    continue
+
+                # 检查排除/包含模式
+                if path_filter is not None and not path_filter.match_file(name, entry.path[prefix_len:]):
+                    continue
+
+                # 检查文件类型过滤器，同时得到文件分类
+                i = name.rfind('.')
+                file_type = category_lookup.get(name[i:].lower() if i > 0 else '', other_category)
+                if file_type is None:
+                    continue
+
+                st = entry.stat(follow_symlinks=False)
+                file_size = st.st_size
+                mtime = st.st_mtime_ns
+                # 最后使用时间：修改时间和访问时间中较晚的一个（同一个stat结果，无额外系统调用）
+                last_used = st.st_atime_ns if st.st_atime_ns > mtime else mtime
+                # 有多个硬链接的文件记录inode（Windows上DirEntry的st_nlink为0）
+                link_key = (st.st_dev, st.st_ino) if st.st_nlink > 1 else None
+                append(new_record(FileRecord, (entry.path, file_size,
+                                               st.st_blocks * 512 if HAS_ST_BLOCKS else file_size,
+                                               mtime, last_used, file_type, link_key)))
+            except OSError:
+                continue
+        return subdirs, len(file_entries), records
+
+    def _scan_one_directory(self, current_dir, agg, min_file_size, include_hidden):
+        """列出并统计单个目录
+        Args:
+            current_dir: 目录路径字符串
+            agg: 接收统计结果的ScanAggregate
+        Returns:
+            list: 需要继续遍历的子目录路径
+        """
+        listing = self._read_directory(current_dir, include_hidden)
+        if listing is None:
+            return []
+        subdirs, file_count, records = listing
+        agg.add_directory(current_dir, records, min_file_size)
+        self._directory_done(current_dir, file_count, len(subdirs), len(records))
+        return subdirs
+
+    def iter_entries(self, directory_path, min_file_size_kb=0, include_hidden=False):
+        """流式扫描：边遍历边逐个返回文件记录
+
+        与scan_directory使用同一个逐目录的记录生成器，但不汇总、不修改扫描结果属性，
+        内存占用只与单个目录的文件数和待扫描的目录数有关，导出等处理可以在遍历的
+        同时进行。文件类型过滤、排除/包含模式、文件系统边界和扫描索引的设置同样生效，
+        取消令牌被取消后在下一个目录处停止。
+        有多个硬链接的文件每个路径都会返回，link_key相同的记录是同一个文件。
+        Args:
+            directory_path: 扫描根目录
+            min_file_size_kb: 只返回不小于该大小（KB）的文件
+            include_hidden: 是否包含隐藏文件和目录
+        Yields:
+            FileRecord: 文件记录
+        """
+        min_file_size = min_file_size_kb * 1024
+        root = os.path.abspath(directory_path) if self.scan_index is not None else os.fspath(directory_path)
+        self._root_prefix_len = len(os.path.join(root, ''))
+        self._prepare_pruning(root)
+        pending_dirs = [root]
+        token = self.cancel_token
+        while pending_dirs and not token.cancelled:
+            listing = self._read_directory(pending_dirs.pop(), include_hidden)
+            if listing is None:
+                continue
+            subdirs, _, records = listing
+            pending_dirs.extend(subdirs)
+            for record in records:
+                if record.size >= min_file_size:
+                    yield record
+        if self.scan_index is not None:
+            self.scan_index.commit()
+
+    def _scan_with_scandir(self, directory_path, min_file_size, max_files, include_hidden, resume=None):
+        """单线程scandir遍历
+        Args:
+            resume: 从检查点恢复的 (待扫描目录栈, ScanAggregate)，None表示从头开始
+        Returns:
+            ScanAggregate: 扫描统计结果
+        """
+        checkpoint = self.checkpoint if self._checkpoint_params is not None else None
+        if resume is not None:
+            pending_dirs, agg = resume
+        else:
+            agg = self._new_aggregate(max_files)
+            pending_dirs = [os.fspath(directory_path)]
+            if checkpoint is not None:
+                agg.enable_spill()
+                agg.hardlink_log = []
+        token = self.cancel_token
+
+        while pending_dirs and not token.cancelled:
+            current_dir = pending_dirs.pop()
+            pending_dirs.extend(self._scan_one_directory(current_dir, agg, min_file_size, include_hidden))
+            if checkpoint is not None and checkpoint.due():
+                self._save_checkpoint(pending_dirs, agg)
+
+        if checkpoint is not None and token.cancelled:
+            # 取消时保存检查点，下次使用相同参数扫描时继续
+            self._save_checkpoint(pending_dirs, agg)
+        return agg
+
+    def _scan_with_threads(self, directory_path, min_file_size, max_files, include_hidden):
+        """多线程并行遍历
+
+        目录放入工作队列，由线程池中的工作线程取出并列出，新发现的子目录
+        再放回队列。os.scandir和stat在系统调用期间会释放GIL，因此在高延迟的
+        存储（NVMe、NFS）上可以同时进行多个元数据请求。
+        每个工作线程维护自己的局部统计结果，全部完成后再合并。
+        Returns:
+            ScanAggregate: 合并后的扫描统计结果
+        """
+        work_queue = queue.Queue()
+        work_queue.put(os.fspath(directory_path))
+        aggregates = [self._new_aggregate(max_files) for _ in range(self.worker_threads)]
+        token = self.cancel_token
+
+        def worker(agg):
+            while True:
+                current_dir = work_queue.get()
+                try:
+                    if current_dir is None:
+                        return
+                    if token.cancelled:
+                        continue  # 取消后只清空队列，不再列目录
+                    for subdir in self._scan_one_directory(current_dir, agg, min_file_size, include_hidden):
+                        work_queue.put(subdir)
+                except Exception:
+                    pass  # 单个目录的意外错误不影响整体扫描
+                finally:
+                    work_queue.task_done()
+
+        threads = [threading.Thread(target=worker, args=(agg,), daemon=True) for agg in aggregates]
+        for thread in threads:
+            thread.start()
+
+        # 队列中所有目录（包括处理过程中新加入的）都处理完后结束工作线程
+        work_queue.join()
+        for _ in threads:
+            work_queue.put(None)
+        for thread in threads:
+            thread.join()
+
+        result = self._new_aggregate(max_files)
+        for agg in aggregates:
+            result.merge(agg)
+        return result
+
+    def _plan_shards(self, directory_path, subdirs, agg, min_file_size, include_hidden):
+        """把子目录划分为分片，并按预计文件数从大到小排列
+
+        有上次扫描的子目录文件数时，远大于平均值的子目录会在主进程中展开一层，
+        拆成它的各个子目录，避免一个巨大的子树让其他CPU核心空闲。
+        Returns:
+            list: [(子目录路径, 预计文件数), ...]
+        """
+        record = self._load_history().get(os.path.abspath(directory_path)) or {}
+        weights = record.get('subtrees', {})
+
+        def weight_of(path):
+            return weights.get(path[self._root_prefix_len:], 0)
+
+        shards = [(path, weight_of(path)) for path in subdirs]
+        total_weight = sum(weight for _, weight in shards)
+        if total_weight:
+            # 只在前两层有记录时展开，最多展开一层
+            limit = total_weight / (self.worker_threads * 2)
+            expanded = []
+            for path, weight in shards:
+                rel = path[self._root_prefix_len:]
+                if weight > limit and os.sep not in rel:
+                    children = self._scan_one_directory(path, agg, min_file_size, include_hidden)
+                    expanded.extend((child, weight_of(child)) for child in children)
+                else:
+                    expanded.append((path, weight))
+            shards = expanded
+
+            # 没有历史记录的新目录按平均值估计
+            known = [weight for _, weight in shards if weight]
+            average = sum(known) // len(known) if known else 0
+            shards = [(path, weight or average) for path, weight in shards]
+
+        # 大的分片先提交，进程池动态调度时负载更均衡
+        shards.sort(key=lambda shard: shard[1], reverse=True)
+        return shards
+
+    def _scan_with_processes(self, directory_path, min_file_size, max_files, include_hidden):
+        """多进程分片扫描
+
+        根目录的文件在主进程中处理，每个子目录树作为一个分片交给进程池扫描，
+        工作进程只返回紧凑的局部结果（计数、大小、局部top-N），由主进程合并。
+        Returns:
+            ScanAggregate: 合并后的扫描统计结果
+        """
+        root = os.fspath(directory_path)
+        result = self._new_aggregate(max_files)
+        subdirs = self._scan_one_directory(root, result, min_file_size, include_hidden)
+        shards = self._plan_shards(root, subdirs, result, min_file_size, include_hidden)
+
+        config = {
+            'root': root,
+            'file_type_filter': self.file_type_filter,
+            'min_file_size': min_file_size,
+            'max_files': max_files,
+            'include_hidden': include_hidden,
+            'find_duplicates': self.find_duplicates,
+            'pruned_dirs': self._pruned_dirs,
+            'root_device': self._root_device,
+            'path_filter': self.path_filter,
+            'now_ns': self._now_ns,
+            'collect_columns': self.collect_columns,
+            'snapshot_path': self.snapshot_path,
+            'snapshot_run_size': self.snapshot_run_size,
+            'memory_budget': max(1, self.memory_budget // self.worker_threads) if self.memory_budget else 0,
+            'spill_dir': self.spill_dir,
         }
 
-        return type_mapping.get(suffix, f'其他文件({suffix})')
+        # 取消请求通过进程间共享的Event传给工作进程
+        cancel_event = multiprocessing.Event()
+        token = self.cancel_token
+
+        with ProcessPoolExecutor(max_workers=self.worker_threads, initializer=_init_shard_worker,
+                                 initargs=(cancel_event,)) as executor:
+            pending = {executor.submit(_scan_shard, config, path) for path, _ in shards}
+            while pending:
+                done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+
+                if token.cancelled and not cancel_event.is_set():
+                    # 未开始的分片直接取消，正在运行的分片在下一个目录处停止并返回部分结果
+                    cancel_event.set()
+                    for future in pending:
+                        future.cancel()
+
+                for future in done:
+                    if future.cancelled():
+                        continue
+                    shard_agg, listing, subtree_counts = future.result()
+                    result.merge(shard_agg)
+
+                    with self._progress_lock:
+                        self._estimator.add_subtree(*listing)
+                        for rel, count in subtree_counts.items():
+                            self._add_subtree_files(rel, count)
+                        self._progress_scanned += shard_agg.scanned_files
+                        now = time.monotonic()
+                        if now - self._last_report_time >= self.progress_interval:
+                            self._last_report_time = now
+                            self._report_progress(self._estimator.progress(self._estimator.files_seen),
+                                                  self._estimator.total, self._progress_scanned)
+
+        return result
+
+    def _find_duplicate_files(self, size_groups):
+        """在按大小分组的候选文件中查找内容相同的文件
+        Args:
+            size_groups: 至少有两个文件的大小分组 (大小, [路径, ...])，见ScanAggregate.duplicate_candidates()
+
+        设置了内存预算时候选文件不保存在size_groups中，按预算的1/4分批查找。
+        """
+        if self.memory_budget:
+            self.size_groups = {}
+            batch_bytes = self.memory_budget // 4
+        else:
+            size_groups = self.size_groups = {size: sorted(paths) for size, paths in size_groups}
+            batch_bytes = 0
+        if self.cancel_token.cancelled:
+            return
+
+        finder = DuplicateFinder(self.duplicate_workers, cancel_token=self.cancel_token,
+                                 hash_cache=self.hash_cache)
+        self._log("[*] 查找重复文件...")
+        self.duplicate_groups = finder.find(size_groups, batch_bytes)
+        self._log(f"[信息] 重复文件: 候选 {finder.candidates:,} 个, 部分哈希 {finder.partial_hashed:,} 个, "
+                  f"完整哈希 {finder.full_hashed:,} 个, 读取 {self.format_size(finder.bytes_read)}")
+        if self.hash_cache is not None:
+            self._log(f"[信息] 哈希缓存: 命中 {self.hash_cache.hits:,} 次, 未命中 {self.hash_cache.misses:,} 次")
+
+    def _apply_aggregate(self, agg):
+        """将扫描统计结果写入扫描器属性"""
+        self.scanned_files = agg.scanned_files
+        self.total_files = agg.total_files
+        self.total_size = agg.total_size
+        self.total_allocated = agg.total_allocated
+        self.hardlinks_skipped = agg.hardlinks_skipped
+        # 按类型名排序，保证不同遍历方式得到相同的结果顺序
+        for file_type in sorted(agg.file_types):
+            stats = dict(agg.file_types[file_type])
+            stats['ages'] = list(stats['ages'])
+            self.file_types[file_type] = stats
+            self.age_sizes = [a + b for a, b in zip(self.age_sizes, stats['ages'])]
 
     def scan_directory(self, directory_path, min_file_size_kb=1, max_files=100, include_hidden=False):
         """扫描目录"""
+        self._reset_results()
+        self.scan_complete = True
         self.start_time = time.time()
+        self._now_ns = int(self.start_time * 1e9)
         min_file_size = min_file_size_kb * 1024
 
-        print(f"[*] 开始扫描目录: {directory_path}")
-        print(f"[配置] 最小文件大小: {min_file_size_kb} KB")
-        print(f"[配置] 最大显示文件数: {max_files}")
-        print(f"[配置] 包含隐藏文件: {'是' if include_hidden else '否'}")
-        print("-" * 60)
+        self._log(f"[*] 开始扫描目录: {directory_path}")
+        self._log(f"[配置] 最小文件大小: {min_file_size_kb} KB")
+        self._log(f"[配置] 最大显示文件数: {max_files}")
+        self._log(f"[配置] 包含隐藏文件: {'是' if include_hidden else '否'}")
+        parallel_info = ""
+        if self.walker_engine == "scandir" and self.worker_threads > 1:
+            unit = "进程" if self.parallel_mode == "processes" else "线程"
+            parallel_info = f" ({self.worker_threads}{unit})"
+        self._log(f"[配置] 遍历引擎: {self.walker_engine}{parallel_info}")
+        if self.path_filter is not None:
+            if self.path_filter.exclude:
+                self._log(f"[配置] 排除模式: {', '.join(self.path_filter.exclude)}")
+            if self.path_filter.include:
+                self._log(f"[配置] 包含模式: {', '.join(self.path_filter.include)}")
+        if self.collect_columns:
+            self._log(f"[配置] 列式结果: 是 ({'NumPy' if NUMPY_AVAILABLE else '纯Python'}统计)")
+        if self.memory_budget:
+            self._log(f"[配置] 内存预算: {self.format_size(self.memory_budget)}")
+        self._log("-" * 60)
 
         try:
             path = Path(directory_path)
@@ -142,76 +1793,116 @@ class DiskScanner:
                 print(f"[错误] 目录不存在或无效 - {directory_path}")
                 return False
 
-            # 首先计算总文件数（用于进度显示）
-            total_files_estimate = 0
-            for root, dirs, files in os.walk(directory_path):
-                total_files_estimate += len(files)
-
-            print(f"[信息] 预估文件总数: {total_files_estimate:,}")
-            print("-" * 60)
+            if self.estimate_mode == "prewalk":
+                # 预先遍历计数（扫描时间加倍，仅用于对比）
+                total_files_estimate = 0
+                for root, dirs, files in os.walk(directory_path):
+                    total_files_estimate += len(files)
+                self.estimate_source = "预遍历"
+            else:
+                total_files_estimate, self.estimate_source = self._estimate_total_files(directory_path)
+
+            estimator = ProgressEstimator(total_files_estimate)
+            if total_files_estimate:
+                self._log(f"[信息] 预估文件总数: {total_files_estimate:,} (来源: {self.estimate_source})")
+            else:
+                self._log(f"[信息] 预估文件总数: 扫描中动态估算")
+            self._log("-" * 60)
 
             # 开始扫描
-            file_sizes = []
-
-            for root, dirs, files in os.walk(directory_path):
-                for file in files:
-                    try:
-                        file_path = Path(root) / file
-
-                        # 检查隐藏文件
-                        if not include_hidden and file.startswith('.'):
-                            continue
-
-                        # 检查文件类型过滤器
-                        if not self.should_scan_file(file_path):
-                            continue
-
-                        if file_path.is_file():
-                            file_size = file_path.stat().st_size
-
-                            # 只统计大于指定大小的文件
-                            if file_size >= min_file_size:
-                                file_sizes.append((file_path, file_size))
-
-                                # 按类型统计
-                                file_type = self.get_file_type(file_path)
-                                self.file_types[file_type]['count'] += 1
-                                self.file_types[file_type]['size'] += file_size
-
-                                self.total_files += 1
-                                self.total_size += file_size
-
-                            # 显示进度
-                            self.scanned_files += 1
-
-                            # 更频繁地更新进度（每10个文件或每1%进度）
-                            current_progress = (self.scanned_files / total_files_estimate * 100) if total_files_estimate > 0 else 0
-
-                            # 更新条件：每10个文件 或 进度变化达到1%
-                            if (self.scanned_files % 10 == 0) or (current_progress >= int(self.scanned_files / total_files_estimate * 100 + 1) if total_files_estimate > 0 else 0):
-                                progress = min(current_progress, 100)  # 确保不超过100%
-                                print(f"[进度] {progress:.1f}% ({self.scanned_files:,}/{total_files_estimate:,})")
-
-                                # 调用GUI进度回调
-                                if self.progress_callback:
-                                    try:
-                                        self.progress_callback(progress, self.scanned_files, total_files_estimate)
-                                    except:
-                                        pass  # 忽略回调错误，不影响扫描
+            self._estimator = estimator
+            self._last_report_time = time.monotonic()
+            self._progress_scanned = 0
+            self._subtree_counts = {}
+            self._subtree_bytes = 0
+            # 索引和检查点按绝对路径记录目录，与当前工作目录无关
+            if self.scan_index is not None or self.checkpoint is not None:
+                scan_root = os.path.abspath(directory_path)
+            else:
+                scan_root = os.fspath(directory_path)
+            self._root_prefix_len = len(os.path.join(scan_root, ''))
+            self._prepare_pruning(scan_root)
+
+            resume = None
+            self._checkpoint_params = None
+            self._checkpoint_runs = set()
+            if self.checkpoint is not None:
+                self._checkpoint_params = self._scan_params(directory_path, min_file_size,
+                                                            max_files, include_hidden)
+                resume = self._load_checkpoint()
+
+            if self.scan_index is not None:
+                # 索引按绝对路径记录目录，且只支持单线程遍历
+                if self.walker_engine != "scandir" or self.worker_threads > 1:
+                    self._log("[信息] 使用扫描索引时采用单线程scandir遍历")
+                agg = self._scan_with_scandir(scan_root, min_file_size, max_files, include_hidden, resume)
+                self.scan_index.commit()
+                self._log(f"[信息] 扫描索引: {self.scan_index.hits:,} 个目录未变化, "
+                          f"{self.scan_index.misses:,} 个目录重新列出")
+            elif self.checkpoint is not None:
+                # 检查点保存的是单线程遍历的待扫描目录栈
+                if self.walker_engine != "scandir" or self.worker_threads > 1:
+                    self._log("[信息] 使用检查点时采用单线程scandir遍历")
+                agg = self._scan_with_scandir(scan_root, min_file_size, max_files, include_hidden, resume)
+            elif self.walker_engine == "walk":
+                agg = self._scan_with_walk(directory_path, min_file_size, max_files, include_hidden)
+            elif self.worker_threads > 1 and self.parallel_mode == "processes":
+                agg = self._scan_with_processes(directory_path, min_file_size, max_files, include_hidden)
+            elif self.worker_threads > 1:
+                agg = self._scan_with_threads(directory_path, min_file_size, max_files, include_hidden)
+            else:
+                agg = self._scan_with_scandir(directory_path, min_file_size, max_files, include_hidden)
+            agg.resolve_hardlinks(min_file_size)
+            if self.memory_budget and self._checkpoint_params is None:
+                # 剩余的缓存记录也写出，建树、查找重复文件和保存快照时内存中只有结果和归并缓冲
+                agg.spill()
+            self._apply_aggregate(agg)
+
+            # 最大的文件和超过COLD_DAYS天未使用的最大文件，按列紧凑保存
+            for file_path, file_size, allocated in agg.largest_sorted():
+                self.largest_files.append(file_path, file_size, allocated)
+            for file_path, file_size, allocated, last_used in agg.cold_sorted():
+                self.cold_files.append(file_path, file_size, allocated, last_used)
+            self.columns = agg.columns
+            # 结果中的路径表只保留各列，查询字典在按路径查询时才重建
+            self.largest_files.directories.drop_index()
+            self.cold_files.directories.drop_index()
+            if self.columns is not None:
+                self.columns.directories.drop_index()
+
+            # 汇总目录占用，之后可按任意深度查询最大的目录
+            self.directory_tree = DirectoryTree.build(scan_root, agg.iter_dir_stats())
+
+            if self.find_duplicates:
+                self._find_duplicate_files(agg.duplicate_candidates())
+
+            if agg.snapshot is not None:
+                if self.cancel_token.cancelled:
+                    self._log("[信息] 扫描已取消，不保存快照")
+                else:
+                    self._save_snapshot(agg, scan_root)
+            if self._checkpoint_params is not None and self.cancel_token.cancelled:
+                # 保留检查点引用的临时归并段，继续扫描时使用
+                agg.discard_spill(keep=self._checkpoint_runs)
+            else:
+                agg.discard_spill()
+
+            if self.cancel_token.cancelled:
+                # 取消时保留已收集的部分结果，并标记为不完整
+                self.scan_complete = False
+                self._log(f"[信息] 扫描已取消，已扫描 {self.scanned_files:,} 个文件，结果不完整")
+                return True
 
-                    except (OSError, PermissionError) as e:
-                        continue
-                    except Exception as e:
-                        continue
+            if self._checkpoint_params is not None:
+                self.checkpoint.clear()
 
-            # 排序并获取最大的文件
-            file_sizes.sort(key=lambda x: x[1], reverse=True)
-            self.largest_files = file_sizes[:max_files]
+            # 记录本次的文件总数，下次扫描同一目录时用作进度分母
+            self._save_history(directory_path, estimator.files_seen)
 
             # 确保最终进度是100%
             if self.progress_callback:
                 try:
-                    self.progress_callback(100, self.scanned_files, total_files_estimate)
+                    self.progress_callback(100, self.scanned_files, self.scanned_files)
                 except:
                     pass
 
@@ -223,10 +1914,10 @@ class DiskScanner:
 
     def display_results(self, scan_path, min_file_size_kb, max_files, include_hidden):
         """显示扫描结果"""
-        scan_time = time.time() - self.start_time
+        scan_time = self.scan_time()
 
         print("\n" + "=" * 70)
-        print("扫描完成！")
+        print("扫描完成！" if self.scan_complete else "扫描已取消！以下为部分结果")
         print("=" * 70)
 
         # 基本信息
@@ -235,13 +1926,16 @@ class DiskScanner:
         print(f"   扫描文件数: {self.scanned_files:,}")
         print(f"   符合条件文件: {self.total_files:,}")
         print(f"   总大小: {self.format_size(self.total_size)}")
+        print(f"   实际占用: {self.format_size(self.total_allocated)}")
+        if self.hardlinks_skipped:
+            print(f"   硬链接: {self.hardlinks_skipped:,} 个重复路径未重复计算")
         print(f"   扫描耗时: {scan_time:.2f} 秒")
 
         # 文件类型统计
         if self.file_types:
             print(f"\n[类型] 文件类型分布 (按大小排序):")
             print("-" * 70)
-            print(f"{'类型':<15} {'数量':<8} {'大小':<12} {'占比':<8}")
+            print(f"{'类型':<15} {'数量':<8} {'大小':<12} {'实际占用':<12} {'占比':<8}")
             print("-" * 70)
 
             # 按大小排序
@@ -249,25 +1943,118 @@ class DiskScanner:
 
             for file_type, stats in sorted_types[:10]:  # 显示前10种类型
                 percentage = (stats['size'] / self.total_size * 100) if self.total_size > 0 else 0
-                print(f"{file_type:<15} {stats['count']:<8} {self.format_size(stats['size']):<12} {percentage:>5.1f}%")
+                print(f"{file_type:<15} {stats['count']:<8} {self.format_size(stats['size']):<12} "
+                      f"{self.format_size(stats['allocated']):<12} {percentage:>5.1f}%")
 
         # 最大的文件
         if self.largest_files:
             print(f"\n[排行] 最大的文件 (前{min(len(self.largest_files), max_files)}个):")
             print("-" * 100)
-            print(f"{'排名':<4} {'文件名':<40} {'大小':<12} {'路径':<43}")
+            print(f"{'排名':<4} {'文件名':<40} {'大小':<12} {'实际占用':<12} {'路径':<43}")
+            print("-" * 100)
+
+            for i, entry in enumerate(self.largest_files, 1):
+                name = entry.name
+                if len(name) > 38:
+                    name = name[:35] + "..."
+
+                path = entry.parent
+                if len(path) > 40:
+                    path = "..." + path[-40:]
+
+                print(f"{i:<4} {name:<40} {self.format_size(entry.size):<12} "
+                      f"{self.format_size(entry.allocated):<12} {path}")
+
+        # 占用空间最大的目录
+        if self.directory_tree is not None and len(self.directory_tree) > 1:
+            top_dirs = self.directory_tree.top_directories(10, depth=1)
+            print(f"\n[目录] 占用空间最大的目录 (第一层, 前{len(top_dirs)}个):")
+            print("-" * 100)
+            print(f"{'排名':<4} {'目录':<50} {'大小':<12} {'文件数':<10} {'最大子项'}")
+            print("-" * 100)
+
+            for i, (dir_path, dir_size, dir_files, child_name, child_size) in enumerate(top_dirs, 1):
+                path = dir_path if len(dir_path) <= 48 else "..." + dir_path[-45:]
+                child = f"{child_name} ({self.format_size(child_size)})" if child_name else ""
+                print(f"{i:<4} {path:<50} {self.format_size(dir_size):<12} {dir_files:<10,} {child}")
+
+        # 文件大小分布（列式结果）
+        if self.columns is not None and len(self.columns):
+            percentiles = size_percentiles(self.columns)
+            print(f"\n[分布] 文件大小分布 (对数刻度):")
+            print("-" * 70)
+            for low, high, count, total in size_histogram(self.columns, bits_per_bin=3):
+                span = f"{self.format_size(low)} - {self.format_size(high)}"
+                percentage = (total / self.total_size * 100) if self.total_size > 0 else 0
+                print(f"   {span:<24} {count:>10,} 个  {self.format_size(total):<12} {percentage:>5.1f}%")
+            print("   分位数: " + ", ".join(f"P{p:g} {self.format_size(size)}" for p, size in percentiles))
+
+        # 文件年龄分布和冷数据
+        if self.total_size > 0:
+            print(f"\n[年龄] 文件年龄分布 (按最后修改/访问时间):")
+            print("-" * 70)
+            for name, age_size in zip(AGE_BUCKET_NAMES, self.age_sizes):
+                percentage = age_size / self.total_size * 100
+                print(f"   {name:<12} {self.format_size(age_size):<12} {percentage:>5.1f}%")
+
+            cold_total = cold_bytes(self.age_sizes)
+            print(f"   超过{COLD_DAYS}天未使用: {self.format_size(cold_total)} "
+                  f"({cold_total / self.total_size * 100:.1f}%)")
+            cold_types = sorted(((cold_bytes(stats['ages']), file_type)
+                                 for file_type, stats in self.file_types.items()), reverse=True)
+            cold_types = [(size, file_type) for size, file_type in cold_types[:5] if size > 0]
+            if cold_types:
+                print("   冷数据最多的类型: " + ", ".join(
+                    f"{file_type} {self.format_size(size)}" for size, file_type in cold_types))
+
+        if self.cold_files:
+            print(f"\n[冷数据] 超过{COLD_DAYS}天未使用的最大文件 (前{min(len(self.cold_files), 10)}个):")
+            print("-" * 100)
+            print(f"{'排名':<4} {'文件名':<40} {'大小':<12} {'最后使用':<12} {'路径':<43}")
             print("-" * 100)
 
-            for i, (file_path, file_size) in enumerate(self.largest_files, 1):
-                name = file_path.name
+            for i, entry in enumerate(self.cold_files[:10], 1):
+                name = entry.name
                 if len(name) > 38:
                     name = name[:35] + "..."
 
-                path = str(file_path.parent)
+                path = entry.parent
                 if len(path) > 40:
                     path = "..." + path[-40:]
 
-                print(f"{i:<4} {name:<40} {self.format_size(file_size):<12} {path}")
+                last_date = datetime.fromtimestamp(entry.last_used / 1e9).strftime('%Y-%m-%d')
+                print(f"{i:<4} {name:<40} {self.format_size(entry.size):<12} {last_date:<12} {path}")
+
+        if self.directory_tree is not None and len(self.directory_tree) > 1:
+            cold_dirs = self.directory_tree.top_cold_directories(10, depth=1)
+            if cold_dirs:
+                print(f"\n[冷数据] 冷数据最多的目录 (第一层, 前{len(cold_dirs)}个):")
+                print("-" * 100)
+                for i, (dir_path, cold_size, dir_size) in enumerate(cold_dirs, 1):
+                    path = dir_path if len(dir_path) <= 48 else "..." + dir_path[-45:]
+                    percentage = (cold_size / dir_size * 100) if dir_size > 0 else 0
+                    print(f"{i:<4} {path:<50} {self.format_size(cold_size):<12} {percentage:>5.1f}%")
+
+        # 与上次快照的对比
+        if self.snapshot_diff is not None:
+            from scan_snapshot import format_diff
+            print(f"\n[变化] 与上次快照相比:")
+            print("-" * 100)
+            for line in format_diff(self.snapshot_diff, self.format_size, limit=10):
+                print(f"   {line}")
+
+        # 重复文件
+        if self.duplicate_groups:
+            reclaimable = sum(group.reclaimable for group in self.duplicate_groups)
+            print(f"\n[重复] 重复文件: {len(self.duplicate_groups):,} 组, "
+                  f"可释放 {self.format_size(reclaimable)} (前{min(len(self.duplicate_groups), 10)}组):")
+            print("-" * 100)
+
+            for i, group in enumerate(self.duplicate_groups[:10], 1):
+                print(f"{i:<4} {len(group.paths)}个副本 x {self.format_size(group.size)}, "
+                      f"可释放 {self.format_size(group.reclaimable)}")
+                for path in group.paths:
+                    print(f"       {path}")
 
         # 清理建议
         print(f"\n[建议] 清理建议:")
@@ -284,8 +2071,8 @@ class DiskScanner:
     def save_results(self, scan_path, min_file_size_kb, max_files, include_hidden):
         """保存结果到文件"""
         try:
-            with open('scan_results.txt', 'w', encoding='utf-8') as f:
-                scan_time = time.time() - self.start_time
+            with open('scan_results.txt', 'w', encoding='utf-8', errors='surrogateescape') as f:
+                scan_time = self.scan_time()
 
                 f.write("磁盘空间分析报告\n")
                 f.write("=" * 50 + "\n")
@@ -293,8 +2080,14 @@ class DiskScanner:
                 f.write(f"扫描路径: {scan_path}\n")
                 f.write(f"扫描设置: 最小{min_file_size_kb}KB, 最多{max_files}个文件, 包含隐藏文件{'是' if include_hidden else '否'}\n")
                 f.write(f"扫描耗时: {scan_time:.2f} 秒\n")
+                if not self.scan_complete:
+                    f.write("扫描状态: 已取消（部分结果）\n")
                 f.write(f"符合条件的文件数: {self.total_files:,}\n")
-                f.write(f"总大小: {self.format_size(self.total_size)}\n\n")
+                f.write(f"总大小: {self.format_size(self.total_size)}\n")
+                f.write(f"实际占用: {self.format_size(self.total_allocated)}\n")
+                if self.hardlinks_skipped:
+                    f.write(f"硬链接重复路径: {self.hardlinks_skipped:,}（未重复计算）\n")
+                f.write("\n")
 
                 if self.file_types:
                     f.write("文件类型统计:\n")
@@ -309,9 +2102,74 @@ class DiskScanner:
                     f.write(f"\n最大的文件 (前{len(self.largest_files)}个):\n")
                     f.write("-" * 60 + "\n")
 
-                    for i, (file_path, file_size) in enumerate(self.largest_files, 1):
-                        f.write(f"{i}. {file_path.name} - {self.format_size(file_size)}\n")
-                        f.write(f"   路径: {file_path}\n\n")
+                    for i, entry in enumerate(self.largest_files, 1):
+                        f.write(f"{i}. {entry.name} - {self.format_size(entry.size)}\n")
+                        f.write(f"   实际占用: {self.format_size(entry.allocated)}\n")
+                        f.write(f"   路径: {entry.path}\n\n")
+
+                if self.directory_tree is not None and len(self.directory_tree) > 1:
+                    f.write("=" * 50 + "\n")
+                    f.write("目录占用统计 (第一层):\n")
+                    f.write("-" * 60 + "\n")
+                    root_size = self.directory_tree.total_bytes[0]
+                    for dir_path, dir_size, dir_files, child_name, child_size in \
+                            self.directory_tree.top_directories(20, depth=1):
+                        percentage = (dir_size / root_size * 100) if root_size > 0 else 0
+                        f.write(f"{dir_path} | {dir_files}个文件 | {self.format_size(dir_size)} ({percentage:.1f}%)\n")
+
+                if self.columns is not None and len(self.columns):
+                    f.write("=" * 50 + "\n")
+                    f.write("文件大小分布:\n")
+                    f.write("-" * 60 + "\n")
+                    for low, high, count, total in size_histogram(self.columns, bits_per_bin=3):
+                        f.write(f"{self.format_size(low)} - {self.format_size(high)}: "
+                                f"{count}个文件, {self.format_size(total)}\n")
+                    f.write("分位数: " + ", ".join(f"P{p:g} {self.format_size(size)}"
+                                                for p, size in size_percentiles(self.columns)) + "\n")
+
+                if self.total_size > 0:
+                    f.write("=" * 50 + "\n")
+                    f.write("文件年龄分布:\n")
+                    f.write("-" * 60 + "\n")
+                    for name, age_size in zip(AGE_BUCKET_NAMES, self.age_sizes):
+                        percentage = age_size / self.total_size * 100
+                        f.write(f"{name}: {self.format_size(age_size)} ({percentage:.1f}%)\n")
+                    f.write(f"超过{COLD_DAYS}天未使用: {self.format_size(cold_bytes(self.age_sizes))}\n")
+
+                if self.cold_files:
+                    f.write("=" * 50 + "\n")
+                    f.write(f"超过{COLD_DAYS}天未使用的最大文件 (前{len(self.cold_files)}个):\n")
+                    f.write("-" * 60 + "\n")
+                    for i, entry in enumerate(self.cold_files, 1):
+                        last_date = datetime.fromtimestamp(entry.last_used / 1e9).strftime('%Y-%m-%d')
+                        f.write(f"{i}. {entry.name} - {self.format_size(entry.size)} | 最后使用 {last_date}\n")
+                        f.write(f"   路径: {entry.path}\n")
+
+                if self.snapshot_diff is not None:
+                    from scan_snapshot import format_diff
+                    f.write("=" * 50 + "\n")
+                    f.write("与上次快照的对比:\n")
+                    f.write("-" * 60 + "\n")
+                    for line in format_diff(self.snapshot_diff, self.format_size, limit=20):
+                        f.write(line + "\n")
+
+                if self.duplicate_groups:
+                    reclaimable = sum(group.reclaimable for group in self.duplicate_groups)
+                    f.write("=" * 50 + "\n")
+                    f.write(f"重复文件 ({len(self.duplicate_groups)}组, 可释放 {self.format_size(reclaimable)}):\n")
+                    f.write("-" * 60 + "\n")
+                    for i, group in enumerate(self.duplicate_groups, 1):
+                        f.write(f"第{i}组 | {len(group.paths)}个副本 | 每个 {self.format_size(group.size)} | "
+                                f"可释放 {self.format_size(group.reclaimable)}\n")
+                        for path in group.paths:
+                            f.write(f"   路径: {path}\n")
+
+            # 完整的目录树另存为JSON，导出工具可按任意深度查询
+            if self.directory_tree is not None:
+                self.directory_tree.save('scan_directories.json')
+
+            # 二进制结果文件供导出工具和再次打开时直接载入
+            self.save_results_file('scan_results.bin', scan_path, min_file_size_kb, max_files, include_hidden)
 
             print(f"[成功] 结果已保存到: scan_results.txt")
             return True
@@ -320,20 +2178,117 @@ class DiskScanner:
             print(f"[错误] 保存结果时出错: {e}")
             return False
 
+_shard_cancel_event = None
+
+
+def _init_shard_worker(cancel_event):
+    """工作进程初始化：保存进程间共享的取消事件"""
+    global _shard_cancel_event
+    _shard_cancel_event = cancel_event
+
+
+def _scan_shard(config, shard_path):
+    """在工作进程中扫描一个子目录树分片
+    Args:
+        config: 扫描参数字典
+        shard_path: 分片根目录
+    Returns:
+        tuple: (局部ScanAggregate（含局部top-N）, (文件数, 已列出目录数, 发现目录数), 子目录文件数)
+    """
+    scanner = DiskScanner()
+    scanner.set_file_type_filter(config['file_type_filter'])
+    scanner.find_duplicates = config['find_duplicates']
+    scanner._pruned_dirs = config['pruned_dirs']
+    scanner._root_device = config['root_device']
+    scanner.path_filter = config['path_filter']
+    scanner._now_ns = config['now_ns']
+    scanner.collect_columns = config['collect_columns']
+    scanner.snapshot_path = config['snapshot_path']
+    scanner.snapshot_run_size = config['snapshot_run_size']
+    scanner.memory_budget = config['memory_budget']
+    scanner.spill_dir = config['spill_dir']
+    scanner._prune_enabled = bool(scanner._pruned_dirs) or scanner._root_device is not None
+    if _shard_cancel_event is not None:
+        scanner.set_cancel_token(CancellationToken(_shard_cancel_event))
+    scanner._progress_enabled = False
+    scanner._estimator = ProgressEstimator()
+    scanner._progress_scanned = 0
+    scanner._root_prefix_len = len(os.path.join(config['root'], ''))
+
+    agg = scanner._scan_with_scandir(shard_path, config['min_file_size'],
+                                     config['max_files'], config['include_hidden'])
+    if agg.snapshot is not None:
+        # 快照记录写入临时归并段，只把文件名传回主进程
+        agg.snapshot.spill()
+    if agg.memory_budget:
+        agg.spill()
+    estimator = scanner._estimator
+    listing = (estimator.files_seen, estimator.dirs_done, estimator.dirs_found)
+    return agg, listing, scanner._subtree_counts
+
+
 def main():
     """主函数"""
-    if len(sys.argv) < 2:
+    # 选项参数：--quiet 不输出扫描进度，--duplicates 查找重复文件，
+    # --hash-cache 查找重复文件时使用持久化哈希缓存（hash_cache.db），
+    # --one-filesystem 只扫描根目录所在的文件系统，
+    # --exclude=模式 / --include=模式 排除/只包含匹配的路径（可重复），
+    # --columns 收集列式结果并报告文件大小分布，
+    # --snapshot=文件 保存扫描快照，文件已存在时报告与上次快照相比的变化，
+    # --checkpoint=文件 定期保存检查点，中断后用相同参数再次运行时继续扫描，
+    # --memory-budget=MB 缓存记录超过该内存预算时写入临时文件，
+    # --load=结果文件 不扫描，直接打开保存的二进制结果文件（scan_results.bin）并显示
+    options = {"--quiet", "--duplicates", "--hash-cache", "--one-filesystem", "--columns"}
+    quiet = "--quiet" in sys.argv
+    find_duplicates = "--duplicates" in sys.argv or "--hash-cache" in sys.argv
+    exclude = [arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--exclude=")]
+    include = [arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--include=")]
+    snapshot = [arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--snapshot=")]
+    checkpoint = [arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--checkpoint=")]
+    memory_budget = [arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--memory-budget=")]
+    load = [arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--load=")]
+    args = [arg for arg in sys.argv if arg not in options
+            and not arg.startswith(("--exclude=", "--include=", "--snapshot=", "--checkpoint=",
+                                    "--memory-budget=", "--load="))]
+
+    if load:
+        scanner = DiskScanner()
+        try:
+            meta = scanner.load_results(load[-1])
+        except (OSError, ValueError) as e:
+            print(f"[错误] 无法打开结果文件: {e}")
+            return
+        settings = meta['settings']
+        print(f"[信息] 已载入结果文件: {load[-1]} (保存于 {meta['created']})")
+        scanner.display_results(meta['scan_path'], settings.get('min_file_size_kb', 1),
+                                settings.get('max_files', 100), settings.get('include_hidden', False))
+        return
+
+    if len(args) < 2:
         print("[错误] 请提供扫描路径")
         return
 
     # 解析命令行参数
-    scan_path = sys.argv[1]
-    min_file_size_kb = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2].isdigit() else 1
-    max_files = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3].isdigit() else 100
-    include_hidden = sys.argv[4].lower() == 'y' if len(sys.argv) > 4 else False
+    scan_path = args[1]
+    min_file_size_kb = int(args[2]) if len(args) > 2 and args[2].isdigit() else 1
+    max_files = int(args[3]) if len(args) > 3 and args[3].isdigit() else 100
+    include_hidden = args[4].lower() == 'y' if len(args) > 4 else False
 
     # 创建扫描器并开始扫描
     scanner = DiskScanner()
+    scanner.set_quiet(quiet)
+    scanner.set_duplicate_detection(find_duplicates)
+    scanner.set_one_filesystem("--one-filesystem" in sys.argv)
+    scanner.set_path_patterns(exclude, include)
+    scanner.set_columnar_results("--columns" in sys.argv)
+    if snapshot:
+        scanner.set_snapshot(snapshot[-1])
+    if checkpoint:
+        scanner.set_checkpoint(checkpoint[-1])
+    if memory_budget and memory_budget[-1].isdigit():
+        scanner.set_memory_budget(int(memory_budget[-1]) * 1024 * 1024)
+    if "--hash-cache" in sys.argv:
+        scanner.set_hash_cache("hash_cache.db")
 
     if scanner.scan_directory(scan_path, min_file_size_kb, max_files, include_hidden):
         scanner.display_results(scan_path, min_file_size_kb, max_files, include_hidden)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重复文件查找
+在扫描结果的基础上分阶段过滤：先按文件大小分组，再比较首尾部分内容的哈希，
+只有仍然相同的文件才读取全部内容计算完整哈希，避免读取磁盘上的每个字节
+"""
+
+import os
+import sys
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from memory_estimate import DICT_ENTRY_BYTES, POINTER_BYTES, tuple_bytes
+
+# 分批查找时每个候选文件除路径以外的估计占用（字节）：(路径, 大小) 元组、哈希值和重新分组的字典项
+CANDIDATE_BYTES = 2 * tuple_bytes(2) + 3 * POINTER_BYTES + sys.getsizeof(bytes(16)) + DICT_ENTRY_BYTES
+
+
+class DuplicateGroup(namedtuple('DuplicateGroup', ['size', 'digest', 'paths'])):
+    """一组内容完全相同的文件"""
+
+    __slots__ = ()
+
+    @property
+    def reclaimable(self):
+        """只保留一份时可以释放的空间（字节）"""
+        return self.size * (len(self.paths) - 1)
+
+
+class DuplicateFinder:
+    """分阶段的重复文件查找器
+
+    1. 按大小分组：大小唯一的文件不可能重复，不读取任何内容；
+    2. 部分哈希：读取文件开头和结尾各sample_bytes字节，
+       不超过2*sample_bytes的小文件此时已读完整个文件，哈希即为最终结果；
+    3. 完整哈希：只对部分哈希仍然相同的文件读取全部内容。
+
+    哈希计算在线程池中进行（hashlib处理大块数据和文件读取时都会释放GIL）。
+    文件按批提交给线程池，百万级候选文件也不会创建百万个Future对象。
+    提供hash_cache（HashCache）时，未变化文件的哈希直接从缓存读取，不读取内容。
+    """
+
+    def __init__(self, workers=4, sample_bytes=4096, chunk_size=1024 * 1024,
+                 batch_size=256, cancel_token=None, hash_cache=None):
+        self.workers = max(1, int(workers))
+        self.sample_bytes = sample_bytes
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.cancel_token = cancel_token
+        self.hash_cache = hash_cache
+        if hash_cache is not None:
+            hash_cache.use_scheme(f"blake2b-128/{sample_bytes}")
+
+        # 统计信息
+        self.candidates = 0
+        self.partial_hashed = 0
+        self.full_hashed = 0
+        self.bytes_read = 0
+
+    def _cancelled(self):
+        return self.cancel_token is not None and self.cancel_token.cancelled
+
+    def _partial_hash(self, path, size):
+        """计算文件开头和结尾部分的哈希
+        Returns:
+            tuple: (哈希值, 读取字节数)；无法读取时哈希值为None
+        """
+        sample = self.sample_bytes
+        try:
+            with open(path, 'rb') as f:
+                if size <= sample * 2:
+                    data = f.read()
+                else:
+                    data = f.read(sample)
+                    f.seek(size - sample)
+                    data += f.read(sample)
+        except OSError:
+            return None, 0
+        if len(data) != min(size, sample * 2):
+            return None, len(data)  # 扫描后文件大小发生了变化
+        return hashlib.blake2b(data, digest_size=16).digest(), len(data)
+
+    def _full_hash(self, path, size):
+        """计算文件完整内容的哈希
+        Returns:
+            tuple: (哈希值, 读取字节数)；无法读取时哈希值为None
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        read = 0
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    read += len(chunk)
+        except OSError:
+            return None, read
+        if read != size:
+            return None, read
+        return digest.digest(), read
+
+    def _cached_hash(self, kind, hash_func, path, size):
+        """先查询哈希缓存，未命中时计算哈希并写入缓存"""
+        cache = self.hash_cache
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None, 0
+        if st.st_size != size:
+            return None, 0  # 扫描后文件大小发生了变化
+
+        key = cache.key_of(st)
+        digest = cache.get(key, kind)
+        if digest is not None:
+            return digest, 0
+        digest, read = hash_func(path, size)
+        if digest is not None:
+            cache.put(key, kind, digest)
+        return digest, read
+
+    def _hash_batch(self, kind, batch):
+        """在工作线程中计算一批文件的哈希
+        Args:
+            kind: "partial" 部分哈希，"full" 完整哈希
+            batch: [(path, size), ...]
+        Returns:
+            list: [(哈希值, 读取字节数), ...]，取消后剩余文件的哈希值为None
+        """
+        results = []
+        hash_func = self._partial_hash if kind == 'partial' else self._full_hash
+        for path, size in batch:
+            if self._cancelled():
+                results.append((None, 0))
+            elif self.hash_cache is not None:
+                results.append(self._cached_hash(kind, hash_func, path, size))
+            else:
+                results.append(hash_func(path, size))
+        return results
+
+    def _hash_all(self, executor, kind, files):
+        """用线程池计算一组文件的哈希
+        Args:
+            files: [(path, size), ...]
+        Returns:
+            list: 与files一一对应的哈希值
+        """
+        batch_size = self.batch_size
+        batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+        digests = []
+        for results in executor.map(lambda batch: self._hash_batch(kind, batch), batches):
+            for digest, read in results:
+                digests.append(digest)
+                self.bytes_read += read
+        return digests
+
+    @staticmethod
+    def _regroup(files, digests):
+        """按(大小, 哈希值)重新分组，只保留仍有多个文件的组"""
+        groups = {}
+        for (path, size), digest in zip(files, digests):
+            if digest is not None:
+                groups.setdefault((size, digest), []).append(path)
+        return {key: paths for key, paths in groups.items() if len(paths) > 1}
+
+    def find(self, size_groups, max_batch_bytes=0):
+        """查找重复文件
+        Args:
+            size_groups: {文件大小: [路径, ...]}（通常来自DiskScanner.size_groups），
+                         或逐个产生 (文件大小, [路径, ...]) 的序列
+            max_batch_bytes: 大于0时按大小分组分批查找，候选文件的估计占用达到该值即查找一批，
+                             同一时间只有一批候选文件及其哈希值在内存中；0表示一次查找全部
+        Returns:
+            list: [DuplicateGroup, ...]，按可释放空间从大到小排列
+        """
+        if isinstance(size_groups, dict):
+            size_groups = size_groups.items()
+        groups = []
+        batch = []
+        batch_bytes = 0
+        for size, paths in size_groups:
+            # 第一阶段：大小唯一的文件和空文件直接排除
+            if size <= 0 or len(paths) < 2:
+                continue
+            batch.append((size, paths))
+            if max_batch_bytes:
+                batch_bytes += sum(map(sys.getsizeof, paths)) + len(paths) * CANDIDATE_BYTES
+                if batch_bytes >= max_batch_bytes:
+                    groups.extend(self._find_batch(batch))
+                    batch = []
+                    batch_bytes = 0
+                    if self._cancelled():
+                        break
+        if batch:
+            groups.extend(self._find_batch(batch))
+
+        groups.sort(key=lambda group: (-group.reclaimable, group.paths))
+        return groups
+
+    def _find_batch(self, batch):
+        """在一批大小分组 [(文件大小, [路径, ...]), ...] 中查找重复文件，返回未排序的DuplicateGroup列表
+        这一批计算出的哈希随即写入哈希缓存，中途取消或出错时已计算的哈希不会丢失
+        """
+        files = [(path, size) for size, paths in batch for path in paths]
+        self.candidates += len(files)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                # 第二阶段：首尾部分内容的哈希
+                partial = self._regroup(files, self._hash_all(executor, 'partial', files))
+                self.partial_hashed += len(files)
+
+                final = {}
+                files = []
+                for (size, digest), paths in partial.items():
+                    if size <= self.sample_bytes * 2:
+                        final[(size, digest)] = paths  # 已读取全部内容
+                    else:
+                        files.extend((path, size) for path in paths)
+
+                # 第三阶段：仍然相同的文件计算完整哈希
+                if files and not self._cancelled():
+                    final.update(self._regroup(files, self._hash_all(executor, 'full', files)))
+                    self.full_hashed += len(files)
+        finally:
+            if self.hash_cache is not None:
+                self.hash_cache.commit()
+
+        return [DuplicateGroup(size, digest.hex(), sorted(paths)) for (size, digest), paths in final.items()]
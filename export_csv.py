@@ -64,33 +64,17 @@ def try_open_excel_with_csv(csv_file):
         return False
 
 
-def export_to_csv(auto_open_excel=True):
+def export_to_csv(auto_open_excel=True, results_file=None):
     """
     导出扫描结果为CSV
     :param auto_open_excel: 是否自动用Excel打开CSV文件
+    :param results_file: 要导出的二进制结果文件（如界面中打开的结果文件），None表示当前目录的扫描结果
     :return: tuple (是否成功, CSV文件路径)
     """
     try:
-        # 读取扫描结果
-        with open('scan_results.txt', 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # 解析扫描结果
-        lines = content.split('\n')
-        scan_path = ""
-        scan_time = ""
-        total_files = 0
-        total_size = ""
-
-        for line in lines:
-            if "扫描路径:" in line:
-                scan_path = line.split(":", 1)[1].strip()
-            elif "扫描耗时:" in line:
-                scan_time = line.split(":", 1)[1].strip()
-            elif "符合条件的文件数:" in line:
-                total_files = line.split(":", 1)[1].strip().replace(",", "")
-            elif "总大小:" in line:
-                total_size = line.split(":", 1)[1].strip()
+        # 读取扫描结果（优先使用二进制结果文件）
+        from export_excel import DIRECTORY_HEADERS, load_report
+        report = load_report(results_file=results_file)
 
         # 创建CSV文件
         csv_filename = f"磁盘分析报告_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
@@ -101,75 +85,35 @@ def export_to_csv(auto_open_excel=True):
             # 写入标题和基本信息
             writer.writerow(['磁盘空间分析报告'])
             writer.writerow([f'生成时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'])
-            writer.writerow([f'扫描路径: {scan_path}'])
-            writer.writerow([f'扫描耗时: {scan_time}'])
-            writer.writerow([f'总文件数: {total_files}'])
-            writer.writerow([f'总大小: {total_size}'])
+            writer.writerow([f'扫描路径: {report["scan_path"]}'])
+            writer.writerow([f'扫描耗时: {report["scan_time"]}'])
+            writer.writerow([f'总文件数: {report["total_files"]}'])
+            writer.writerow([f'总大小: {report["total_size"]}'])
+            writer.writerow([f'实际占用: {report["allocated_size"]}'])
             writer.writerow([])  # 空行
 
             # 写入文件类型统计
             writer.writerow(['文件类型统计'])
             writer.writerow(['文件类型', '文件数量', '占用大小', '占比'])
-
-            # 简单解析文件类型信息
-            in_type_section = False
-            for line in lines:
-                if "文件类型统计:" in line:
-                    in_type_section = True
-                    continue
-                elif "最大的文件" in line:
-                    in_type_section = False
-                    continue
-
-                if in_type_section and line.strip() and ":" in line:
-                    try:
-                        parts = line.split(":")
-                        if len(parts) >= 2:
-                            file_type = parts[0].strip()
-                            details = parts[1].strip()
-                            if "个文件" in details:
-                                count_part = details.split("个文件")[0].strip()
-                                size_part = details.split("个文件")[1].strip()
-                                size = size_part.split("(")[0].strip()
-                                percentage = size_part.split("(")[1].replace(")", "").strip() if "(" in size_part else ""
-
-                                writer.writerow([file_type, count_part, size, percentage])
-                    except:
-                        continue
+            for file_type_data in report['file_types']:
+                writer.writerow(file_type_data)
 
             writer.writerow([])  # 空行
 
             # 写入最大文件列表
             writer.writerow(['最大文件列表'])
             writer.writerow(['排名', '文件名', '大小', '路径'])
-
-            in_file_section = False
-            file_rank = 1
-            for line in lines:
-                if "最大的文件" in line:
-                    in_file_section = True
-                    continue
-                elif "=" in line and in_file_section:
-                    in_file_section = False
-                    continue
-
-                if in_file_section and line.strip() and (line.strip().endswith(".txt") or
-                    line.strip().endswith(".exe") or line.strip().endswith(".mp4") or
-                    line.strip().endswith(".zip") or line.strip().endswith(".pdf") or
-                    "." in line.strip()):
-                    try:
-                        # 尝试解析文件信息行
-                        if ". " in line and " - " in line:
-                            parts = line.split(". ", 1)
-                            if len(parts) == 2:
-                                file_info = parts[1].split(" - ")
-                                if len(file_info) == 2:
-                                    filename = file_info[0].strip()
-                                    filesize = file_info[1].strip()
-                                    writer.writerow([file_rank, filename, filesize, ""])
-                                    file_rank += 1
-                    except:
-                        continue
+            for file_data in report['largest_files']:
+                writer.writerow(file_data)
+
+            # 写入目录占用统计（读取扫描时保存的目录树）
+            top_directories = report['top_directories']
+            if top_directories:
+                writer.writerow([])  # 空行
+                writer.writerow(['目录占用统计'])
+                writer.writerow(DIRECTORY_HEADERS)
+                for dir_data in top_directories:
+                    writer.writerow(dir_data)
 
         print(f"[SUCCESS] CSV文件已导出: {csv_filename}")
 
@@ -188,5 +132,33 @@ def export_to_csv(auto_open_excel=True):
         print(f"[ERROR] 导出CSV失败: {e}")
         return False, ""
 
+def export_file_list_csv(scanner, scan_path, csv_filename=None, min_file_size_kb=0, include_hidden=False):
+    """
+    边扫描边导出文件清单（每个文件一行），使用DiskScanner.iter_entries，
+    不需要等待扫描完成，内存占用与文件总数无关
+    :param scanner: 已设置好过滤条件的DiskScanner
+    :param scan_path: 扫描路径
+    :param csv_filename: 输出文件名，None表示按时间生成
+    :return: tuple (是否成功, CSV文件路径, 导出的文件数)
+    """
+    if csv_filename is None:
+        csv_filename = f"文件清单_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    count = 0
+    try:
+        with open(csv_filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['路径', '大小(字节)', '实际占用(字节)', '修改时间', '文件类型'])
+            for record in scanner.iter_entries(scan_path, min_file_size_kb, include_hidden):
+                modified = datetime.fromtimestamp(record.mtime_ns / 1e9).strftime("%Y-%m-%d %H:%M:%S")
+                writer.writerow([record.path, record.size, record.allocated, modified, record.category])
+                count += 1
+
+        print(f"[SUCCESS] 文件清单已导出: {csv_filename} ({count:,} 个文件)")
+        return True, csv_filename, count
+
+    except Exception as e:
+        print(f"[ERROR] 导出文件清单失败: {e}")
+        return False, "", count
+
 if __name__ == "__main__":
     export_to_csv()
\ No newline at end of file
@@ -16,26 +16,27 @@ except ImportError:
     OPENPYXL_AVAILABLE = False
     print("[WARNING] openpyxl未安装，将使用制表符分隔的Excel兼容格式")
 
-def create_excel_format():
-    """创建Excel格式的文件"""
+def create_excel_format(results_file=None):
+    """创建Excel格式的文件
+    :param results_file: 要导出的二进制结果文件（如界面中打开的结果文件），None表示当前目录的扫描结果
+    """
     try:
         # 读取扫描结果
-        with open('scan_results.txt', 'r', encoding='utf-8') as f:
-            content = f.read()
+        report = load_report(results_file=results_file)
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         excel_file = f"磁盘分析报告_{timestamp}.xlsx"
 
         if OPENPYXL_AVAILABLE:
-            return create_proper_excel(excel_file, content)
+            return create_proper_excel(excel_file, report)
         else:
-            return create_tab_delimited_excel(excel_file, content)
+            return create_tab_delimited_excel(excel_file, report)
 
     except Exception as e:
         print(f"[ERROR] 创建Excel文件失败: {e}")
         return False, ""
 
-def create_proper_excel(excel_file, content):
+def create_proper_excel(excel_file, report):
     """使用openpyxl创建真正的Excel文件"""
     try:
         wb = openpyxl.Workbook()
@@ -70,10 +71,11 @@ def create_proper_excel(excel_file, content):
         # 基本信息
         info_data = [
             ["生成时间", datetime.now().strftime("%Y-%m-%d %H:%M:%S")],
-            ["扫描路径", extract_scan_path(content)],
-            ["扫描耗时", extract_scan_time(content)],
-            ["总文件数", extract_total_files(content)],
-            ["总大小", extract_total_size(content)]
+            ["扫描路径", report['scan_path']],
+            ["扫描耗时", report['scan_time']],
+            ["总文件数", report['total_files']],
+            ["总大小", report['total_size']],
+            ["实际占用", report['allocated_size']]
         ]
 
         row = 3
@@ -106,7 +108,7 @@ def create_proper_excel(excel_file, content):
         row += 1
 
         # 数据行
-        file_types = extract_file_types(content)
+        file_types = report['file_types']
         for file_type_data in file_types:
             for col, value in enumerate(file_type_data, 1):
                 cell = ws.cell(row=row, column=col, value=value)
@@ -136,7 +138,7 @@ def create_proper_excel(excel_file, content):
         row += 1
 
         # 数据行
-        largest_files = extract_largest_files(content)
+        largest_files = report['largest_files']
         for file_data in largest_files:
             for col, value in enumerate(file_data, 1):
                 cell = ws.cell(row=row, column=col, value=value)
@@ -144,8 +146,34 @@ def create_proper_excel(excel_file, content):
                 cell.border = thin_border
             row += 1
 
+        # 目录占用统计
+        top_directories = report['top_directories']
+        if top_directories:
+            row += 2
+            ws[f'A{row}'] = "目录占用统计"
+            ws[f'A{row}'].font = header_font
+            ws[f'A{row}'].fill = header_fill
+            ws[f'A{row}'].alignment = center_alignment
+            ws.merge_cells(f'A{row}:E{row}')
+            row += 1
+
+            for col, header in enumerate(DIRECTORY_HEADERS, 1):
+                cell = ws.cell(row=row, column=col, value=header)
+                cell.font = header_font
+                cell.fill = header_fill
+                cell.alignment = center_alignment
+                cell.border = thin_border
+            row += 1
+
+            for dir_data in top_directories:
+                for col, value in enumerate(dir_data, 1):
+                    cell = ws.cell(row=row, column=col, value=value)
+                    cell.font = data_font
+                    cell.border = thin_border
+                row += 1
+
         # 调整列宽
-        column_widths = [15, 20, 15, 50]
+        column_widths = [15, 20, 15, 50, 25]
         for i, width in enumerate(column_widths, 1):
             ws.column_dimensions[get_column_letter(i)].width = width
 
@@ -157,7 +185,7 @@ def create_proper_excel(excel_file, content):
         print(f"[ERROR] 创建Excel文件失败: {e}")
         return False, ""
 
-def create_tab_delimited_excel(excel_file, content):
+def create_tab_delimited_excel(excel_file, report):
     """创建制表符分隔的Excel兼容文件"""
     try:
         # 使用txt扩展名但格式为Excel兼容的制表符分隔
@@ -174,17 +202,18 @@ def create_tab_delimited_excel(excel_file, content):
             f.write("基本信息\n")
             f.write("-" * 20 + "\n")
             f.write(f"生成时间\t{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"扫描路径\t{extract_scan_path(content)}\n")
-            f.write(f"扫描耗时\t{extract_scan_time(content)}\n")
-            f.write(f"总文件数\t{extract_total_files(content)}\n")
-            f.write(f"总大小\t{extract_total_size(content)}\n\n")
+            f.write(f"扫描路径\t{report['scan_path']}\n")
+            f.write(f"扫描耗时\t{report['scan_time']}\n")
+            f.write(f"总文件数\t{report['total_files']}\n")
+            f.write(f"总大小\t{report['total_size']}\n")
+            f.write(f"实际占用\t{report['allocated_size']}\n\n")
 
             # 文件类型统计
             f.write("文件类型统计\n")
             f.write("-" * 20 + "\n")
             f.write("文件类型\t文件数量\t占用大小\t占比\n")
 
-            file_types = extract_file_types(content)
+            file_types = report['file_types']
             for file_type_data in file_types:
                 f.write("\t".join(file_type_data) + "\n")
 
@@ -195,10 +224,19 @@ def create_tab_delimited_excel(excel_file, content):
             f.write("-" * 20 + "\n")
             f.write("排名\t文件名\t大小\t路径\n")
 
-            largest_files = extract_largest_files(content)
+            largest_files = report['largest_files']
             for file_data in largest_files:
                 f.write("\t".join(file_data) + "\n")
 
+            # 目录占用统计
+            top_directories = report['top_directories']
+            if top_directories:
+                f.write("\n目录占用统计\n")
+                f.write("-" * 20 + "\n")
+                f.write("\t".join(DIRECTORY_HEADERS) + "\n")
+                for dir_data in top_directories:
+                    f.write("\t".join(dir_data) + "\n")
+
         # 重命名为.csv以便Excel识别
         csv_file = txt_file.replace('_Excel兼容.txt', '.csv')
         os.rename(txt_file, csv_file)
@@ -209,6 +247,67 @@ def create_tab_delimited_excel(excel_file, content):
         print(f"[ERROR] 创建Excel兼容文件失败: {e}")
         return False, ""
 
+def load_report(text_file='scan_results.txt', results_file=None):
+    """读取导出所需的扫描结果
+
+    指定了二进制结果文件时直接读取它；否则当前目录的scan_results.bin存在且不比文本结果旧时
+    映射读取，不解析文本，再否则解析文本结果（和目录树JSON）。
+    :param results_file: 要导出的二进制结果文件，None表示当前目录的扫描结果
+    :return: dict，scan_path/scan_time/total_files/total_size/allocated_size为字符串，
+             file_types/largest_files/top_directories为表格行
+    """
+    if results_file is not None:
+        return load_results_report(results_file)
+
+    results_file = 'scan_results.bin'
+    if os.path.exists(results_file) and (not os.path.exists(text_file) or
+                                         os.path.getmtime(results_file) >= os.path.getmtime(text_file)):
+        try:
+            return load_results_report(results_file)
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] 读取二进制结果文件失败，改为解析文本结果: {e}")
+
+    with open(text_file, 'r', encoding='utf-8', errors='surrogateescape') as f:
+        content = f.read()
+    return {
+        'scan_path': extract_scan_path(content),
+        'scan_time': extract_scan_time(content),
+        'total_files': extract_total_files(content),
+        'total_size': extract_total_size(content),
+        'allocated_size': extract_allocated_size(content),
+        'file_types': extract_file_types(content),
+        'largest_files': extract_largest_files(content),
+        'top_directories': extract_top_directories(),
+    }
+
+def load_results_report(results_file='scan_results.bin', k=20, depth=1):
+    """从二进制结果文件生成导出用的表格行（只读取用到的列）"""
+    from scan_results_file import ScanResultsFile
+    from disk_scanner_simple import format_size
+    results = ScanResultsFile(results_file)
+    meta = results.meta
+    total_size = meta['total_size']
+
+    file_types = []
+    for file_type, stats in sorted(meta['file_types'].items(), key=lambda x: x[1]['size'], reverse=True):
+        percentage = (stats['size'] / total_size * 100) if total_size > 0 else 0
+        file_types.append([file_type, str(stats['count']), format_size(stats['size']), f"{percentage:.1f}%"])
+
+    largest_files = [[str(rank), entry.name, format_size(entry.size), entry.path]
+                     for rank, entry in enumerate(results.largest_files(), 1)]
+
+    tree = results.directory_tree()
+    return {
+        'scan_path': meta['scan_path'],
+        'scan_time': f"{meta['scan_time']:.2f} 秒",
+        'total_files': f"{meta['total_files']:,}",
+        'total_size': format_size(total_size),
+        'allocated_size': format_size(meta['total_allocated']),
+        'file_types': file_types,
+        'largest_files': largest_files,
+        'top_directories': directory_rows(tree, k, depth) if tree is not None else [],
+    }
+
 # 数据提取函数
 def extract_scan_path(content):
     """提取扫描路径"""
@@ -242,6 +341,14 @@ def extract_total_size(content):
             return line.split(":", 1)[1].strip()
     return "0 B"
 
+def extract_allocated_size(content):
+    """提取实际占用空间（按磁盘块计算，硬链接只计算一次）"""
+    lines = content.split('\n')
+    for line in lines:
+        if "实际占用:" in line:
+            return line.split(":", 1)[1].strip()
+    return "未知"
+
 def extract_file_types(content):
     """提取文件类型统计"""
     file_types = []
@@ -308,6 +415,30 @@ def extract_largest_files(content):
 
     return largest_files
 
+DIRECTORY_HEADERS = ["排名", "目录", "大小", "文件数", "最大子项"]
+
+def extract_top_directories(k=20, depth=1, tree_file='scan_directories.json'):
+    """从扫描保存的目录树中提取占用空间最大的目录（无需重新扫描）"""
+    if not os.path.exists(tree_file):
+        return []
+    try:
+        from directory_tree import DirectoryTree
+        tree = DirectoryTree.load(tree_file)
+    except Exception as e:
+        print(f"[WARNING] 读取目录占用统计失败: {e}")
+        return []
+    return directory_rows(tree, k, depth)
+
+def directory_rows(tree, k=20, depth=1):
+    """目录树中占用空间最大的目录，每个目录一行"""
+    from disk_scanner_simple import format_size
+    top_directories = []
+    for rank, (dir_path, dir_size, dir_files, child_name, child_size) in \
+            enumerate(tree.top_directories(k, depth), 1):
+        child = f"{child_name} ({format_size(child_size)})" if child_name else ""
+        top_directories.append([str(rank), dir_path, format_size(dir_size), str(dir_files), child])
+    return top_directories
+
 def try_open_excel_with_file(file_path):
     """尝试用Excel打开文件"""
     try:
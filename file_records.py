@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑的文件记录存储
+大量文件记录（最大文件列表、完整文件清单）按列保存在array中：目录保存在前缀压缩的路径表中，
+文件名按文件系统编码连续存放在一个bytearray中，逐行访问时使用__slots__视图对象，
+不再为每个文件保留Path对象和元组
+"""
+
+import os
+import sys
+from array import array
+
+from path_table import PathTable
+
+FS_ENCODING = sys.getfilesystemencoding()
+FS_ERRORS = sys.getfilesystemencodeerrors()
+
+
+class FileEntry:
+    """记录存储中一行的只读视图，访问属性时才从各列取值"""
+
+    __slots__ = ('store', 'row')
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    @property
+    def name(self):
+        """文件名"""
+        return self.store.name(self.row)
+
+    @property
+    def parent(self):
+        """所在目录路径"""
+        store = self.store
+        return store.directories.path(store.directory[self.row])
+
+    @property
+    def path(self):
+        """完整路径"""
+        return os.path.join(self.parent, self.name)
+
+    @property
+    def size(self):
+        return self.store.size[self.row]
+
+    @property
+    def allocated(self):
+        """实际占用空间"""
+        return self.store.allocated[self.row]
+
+    @property
+    def last_used(self):
+        """最后使用时间（纳秒，与FileRecord.last_used相同），未记录时为0"""
+        return self.store.last_used[self.row]
+
+    def __repr__(self):
+        return f"FileEntry({self.path!r}, {self.size})"
+
+
+class FileRecordStore:
+    """列式存储的文件记录
+
+    每行保存大小、实际占用、最后使用时间（纳秒）和目录编号四个8字节整数，
+    再加上文件名的编码字节和结束位置，除文件名外每行约40字节。
+    目录在路径表directories（PathTable）中只保存一次（父目录编号和最后一级名称），
+    读取时才重建完整路径。
+    行按追加的顺序排列，支持len()、下标、切片和迭代（得到FileEntry）。
+    """
+
+    def __init__(self):
+        self.size = array('q')
+        self.allocated = array('q')
+        self.last_used = array('q')
+        self.directory = array('q')
+        self.directories = PathTable()
+        self._names = bytearray()
+        self._name_ends = array('q')
+
+    @classmethod
+    def from_columns(cls, size, allocated, last_used, directory, directories, names, name_ends):
+        """由已有的列（如结果文件中的memoryview）构造，不复制数据；构造出的存储只读
+        Args:
+            directories: 目录的PathTable
+            names: 按文件系统编码连续存放的文件名字节
+            name_ends: 每个文件名的结束位置
+        """
+        store = cls()
+        store.size = size
+        store.allocated = allocated
+        store.last_used = last_used
+        store.directory = directory
+        store.directories = directories
+        store._names = names
+        store._name_ends = name_ends
+        return store
+
+    def __len__(self):
+        return len(self.size)
+
+    def __iter__(self):
+        for row in range(len(self.size)):
+            yield FileEntry(self, row)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [FileEntry(self, row) for row in range(*index.indices(len(self.size)))]
+        if index < 0:
+            index += len(self.size)
+        if not 0 <= index < len(self.size):
+            raise IndexError("记录下标超出范围")
+        return FileEntry(self, index)
+
+    def directory_id(self, path):
+        """返回目录的编号，必要时分配新编号"""
+        return self.directories.intern(path)
+
+    def append(self, path, size, allocated, last_used=0):
+        """追加一行
+        Args:
+            path: 文件完整路径
+            last_used: 最后使用时间（纳秒）
+        """
+        parent, name = os.path.split(path)
+        self.size.append(size)
+        self.allocated.append(allocated)
+        self.last_used.append(last_used)
+        self.directory.append(self.directory_id(parent))
+        self._names += name.encode(FS_ENCODING, FS_ERRORS)
+        self._name_ends.append(len(self._names))
+
+    def extend_records(self, records):
+        """追加一批FileRecord（如DiskScanner.iter_entries的结果）"""
+        for record in records:
+            self.append(record.path, record.size, record.allocated, record.last_used)
+
+    def name(self, row):
+        """第row行的文件名"""
+        start = self._name_ends[row - 1] if row else 0
+        return str(self._names[start:self._name_ends[row]], FS_ENCODING, FS_ERRORS)
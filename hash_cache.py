@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化文件内容哈希缓存（SQLite）
+以 (st_dev, st_ino, st_size, st_mtime_ns) 为键保存文件内容的哈希，
+重复分析基本未变化的目录树时不再读取文件内容
+"""
+
+import sqlite3
+import threading
+import time
+
+# 文件修改时间距离哈希时刻小于该值时不写入缓存（时间戳精度不足时的竞态）
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+# 同一文件可以缓存的哈希种类：部分哈希（首尾内容）和完整哈希
+HASH_KINDS = ('partial', 'full')
+
+# 内存中尚未写入的条目（新哈希或使用时间更新）达到该数量时立即写入数据库
+PENDING_LIMIT = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    partial BLOB,
+    full BLOB,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (dev, ino, size, mtime_ns)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_hashes_last_used ON hashes(last_used);
+"""
+
+
+class HashCache:
+    """基于SQLite的文件内容哈希缓存
+
+    键为 (设备号, inode号, 文件大小, 修改时间ns)，哈希以二进制保存在无rowid的
+    表中。条目数超过max_entries时按最近使用时间淘汰最旧的条目（LRU）。
+    可以在多个线程中使用：读写都在内部锁中进行，新写入和使用时间的更新
+    先保存在内存中，commit()时或累积达到PENDING_LIMIT条时批量写入。
+    """
+
+    def __init__(self, cache_path, max_entries=1000000):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending = {}     # 尚未写入的哈希: {键: {种类: 哈希值}}
+        self._touched = set()  # 本次使用过的已有条目
+        self._now = int(time.time())
+
+    def close(self):
+        """写入缓存并关闭"""
+        if self.conn is not None:
+            self.commit()
+            self.conn.close()
+            self.conn = None
+
+    def use_scheme(self, scheme):
+        """设置哈希算法标识，与缓存中记录的不同时清空缓存
+        Args:
+            scheme: 描述哈希算法和参数的字符串，参数变化后旧的哈希不能再使用
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'scheme'").fetchone()
+            if row is not None and row[0] == scheme:
+                return
+            self.conn.execute("DELETE FROM hashes")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('scheme', ?)", (scheme,))
+            self.conn.commit()
+            self._pending.clear()
+            self._touched.clear()
+
+    @staticmethod
+    def key_of(st):
+        """由stat结果得到缓存键"""
+        return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def get(self, key, kind):
+        """查询缓存的哈希
+        Args:
+            key: key_of()返回的缓存键
+            kind: "partial" 或 "full"
+        Returns:
+            bytes: 哈希值；未缓存时返回None
+        """
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None and kind in pending:
+                self.hits += 1
+                return pending[kind]
+
+            row = self.conn.execute(
+                f"SELECT {kind} FROM hashes WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?",
+                key).fetchone()
+            if row is None or row[0] is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched.add(key)
+            if len(self._touched) >= PENDING_LIMIT:
+                self._flush()
+            return bytes(row[0])
+
+    def put(self, key, kind, digest):
+        """记录一个文件的哈希，刚修改过的文件不缓存"""
+        if kind not in HASH_KINDS:
+            raise ValueError(f"未知的哈希种类: {kind}")
+        if int(time.time() * 1e9) - key[3] < RACY_WINDOW_NS:
+            return
+        with self._lock:
+            self._pending.setdefault(key, {})[kind] = digest
+            if len(self._pending) >= PENDING_LIMIT:
+                self._flush()
+
+    def commit(self):
+        """批量写入新的哈希和使用时间，并淘汰超出容量的旧条目"""
+        with self._lock:
+            self._flush()
+            self._now = int(time.time())
+
+    def _flush(self):
+        """把内存中的新哈希和使用时间写入数据库并提交（调用方需持有锁）"""
+        conn = self.conn
+        now = self._now
+        conn.executemany(
+            "UPDATE hashes SET last_used = ? WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?",
+            [(now,) + key for key in self._touched])
+        for kind in HASH_KINDS:
+            rows = [(digests[kind], now) + key for key, digests in self._pending.items()
+                    if kind in digests]
+            conn.executemany(
+                f"UPDATE hashes SET {kind} = ?, last_used = ? "
+                f"WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?", rows)
+            conn.executemany(
+                f"INSERT OR IGNORE INTO hashes ({kind}, last_used, dev, ino, size, mtime_ns) "
+                f"VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self._pending.clear()
+        self._touched.clear()
+        self._evict()
+        conn.commit()
+
+    def _evict(self):
+        """按最近使用时间淘汰条目，使总数不超过max_entries（调用方需持有锁）"""
+        count = self.conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        self.conn.execute(
+            "DELETE FROM hashes WHERE (dev, ino, size, mtime_ns) IN "
+            "(SELECT dev, ino, size, mtime_ns FROM hashes ORDER BY last_used LIMIT ?)", (excess,))
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存占用估算
+内存预算按缓存结构中各个对象的实际大小估算：字符串用sys.getsizeof逐个计算，
+列表项、字典项、整数和元组的大小在导入时由当前解释器测得，不使用固定的经验值
+"""
+
+import sys
+
+# 列表中每一项（一个指针）的大小
+POINTER_BYTES = sys.getsizeof([None] * 2) - sys.getsizeof([None])
+
+# 一个不能共享的整数（文件大小、时间戳等）
+INT_BYTES = sys.getsizeof(1 << 40)
+
+# 空列表
+LIST_BYTES = sys.getsizeof([])
+
+
+def _dict_entry_bytes():
+    """字典每一项的占用：字典按2的幂扩容，取刚扩容后（最稀疏）时平均每项的占用作为上界"""
+    table = {}
+    worst = 0.0
+    for i in range(1, 4097):
+        table[i] = None
+        if i >= 256:
+            worst = max(worst, sys.getsizeof(table) / i)
+    return int(worst) + 1
+
+
+DICT_ENTRY_BYTES = _dict_entry_bytes()
+
+
+def tuple_bytes(length):
+    """长度为length的元组本身的大小（不含各项引用的对象）"""
+    return sys.getsizeof((None,) * length)
+
+
+def array_bytes(*columns):
+    """array各列数据的总大小"""
+    return sum(len(column) * column.itemsize for column in columns)
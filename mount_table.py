@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+挂载点信息
+从 /proc/self/mountinfo 读取挂载点、文件系统类型和设备号，
+扫描前据此剪除 /proc、/sys 等伪文件系统以及其他文件系统上的子树
+"""
+
+import os
+
+# 不包含真实文件数据的伪文件系统，默认不扫描
+PSEUDO_FS_TYPES = frozenset([
+    "proc", "sysfs", "devtmpfs", "devpts", "cgroup", "cgroup2", "securityfs",
+    "debugfs", "tracefs", "pstore", "bpf", "configfs", "fusectl", "mqueue",
+    "hugetlbfs", "autofs", "binfmt_misc", "rpc_pipefs", "nsfs", "efivarfs",
+    "selinuxfs", "fuse.gvfsd-fuse", "fuse.portal",
+])
+
+# 网络文件系统，可以加入跳过列表避免扫描远程存储或卡在失效的挂载上
+NETWORK_FS_TYPES = frozenset([
+    "nfs", "nfs4", "cifs", "smb3", "smbfs", "afs", "ceph", "glusterfs",
+    "lustre", "9p", "fuse.sshfs", "fuse.rclone", "davfs",
+])
+
+MOUNTINFO_PATH = "/proc/self/mountinfo"
+
+
+def _unescape(field):
+    """还原mountinfo中转义的空格、制表符等字符（\\040形式的八进制）"""
+    if "\\" not in field:
+        return field
+    result = []
+    i = 0
+    while i < len(field):
+        if field[i] == "\\" and field[i + 1:i + 4].isdigit():
+            result.append(chr(int(field[i + 1:i + 4], 8)))
+            i += 4
+        else:
+            result.append(field[i])
+            i += 1
+    return "".join(result)
+
+
+def read_mount_table(mountinfo_path=MOUNTINFO_PATH):
+    """读取挂载表
+    Returns:
+        list: [(挂载点, 文件系统类型, 设备号), ...]；非Linux系统或无法读取时返回空列表
+    """
+    try:
+        with open(mountinfo_path, "r", encoding="utf-8", errors="surrogateescape") as f:
+            lines = f.readlines()
+    except OSError:
+        return []
+
+    mounts = []
+    for line in lines:
+        # 格式: ID 父ID 主:次 根 挂载点 选项 [可选字段...] - 类型 来源 超级块选项
+        fields = line.split()
+        try:
+            separator = fields.index("-", 6)
+            major, minor = fields[2].split(":")
+            mounts.append((_unescape(fields[4]), fields[separator + 1],
+                           os.makedev(int(major), int(minor))))
+        except (ValueError, IndexError):
+            continue
+    return mounts
+
+
+def pruned_mount_points(root, skip_fs_types, root_device=None, mounts=None):
+    """找出扫描根目录之下需要整体跳过的挂载点
+    Args:
+        root: 扫描根目录（与扫描时使用的路径形式相同，可以是相对路径）
+        skip_fs_types: 跳过的文件系统类型集合
+        root_device: 只扫描一个文件系统时为根目录的设备号，其他设备上的挂载点都跳过
+        mounts: read_mount_table()的结果，None表示现在读取
+    Returns:
+        set: 以root为前缀的挂载点路径，可以直接与遍历中的子目录路径比较
+    """
+    if mounts is None:
+        mounts = read_mount_table()
+    abs_root = os.path.abspath(root)
+    prefix = os.path.join(abs_root, "")
+
+    pruned = set()
+    for mount_point, fs_type, device in mounts:
+        if not mount_point.startswith(prefix):
+            continue  # 根目录本身或根目录之外的挂载点
+        if fs_type in skip_fs_types or (root_device is not None and device != root_device):
+            pruned.add(os.path.join(root, mount_point[len(prefix):]))
+
+    # 已跳过的挂载点下面嵌套的挂载点不会被访问到，不再保留
+    outermost = set()
+    for path in sorted(pruned):
+        if not any(path.startswith(os.path.join(parent, "")) for parent in outermost):
+            outermost.add(path)
+    return outermost
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+排除/包含路径模式
+用户提供的glob模式在扫描前一次性编译为一个匹配器，
+被排除的目录在列出之前就从遍历中剪除
+"""
+
+import os
+import re
+import fnmatch
+
+GLOB_CHARS = frozenset("*?[")
+
+
+def _compile(patterns):
+    """把多个glob模式合并编译为一个正则表达式，没有模式时返回None"""
+    if not patterns:
+        return None
+    flags = re.IGNORECASE if os.name == "nt" else 0
+    return re.compile("|".join(f"(?:{fnmatch.translate(pattern)})" for pattern in patterns), flags)
+
+
+class PathFilter:
+    """编译后的排除/包含模式
+
+    模式使用glob语法（fnmatch规则）：
+    - 不含"/"的模式匹配文件或目录名，如 ".git"、"node_modules"、"*.tmp"；
+    - 含"/"的模式匹配相对扫描根目录的路径，如 "build/cache"、"*/logs/*"（"*"也匹配"/"）。
+
+    排除模式同时作用于目录和文件，匹配的目录连同整个子树一起跳过；
+    包含模式只作用于文件，设置后只统计匹配的文件，目录照常遍历。
+    不含通配符的名称模式放在集合中直接查找，其余模式合并为一个正则表达式，
+    每个名称只需一次集合查找和一次正则匹配。
+    """
+
+    def __init__(self, exclude=None, include=None):
+        self.exclude = list(exclude or [])
+        self.include = list(include or [])
+
+        name_patterns = [p for p in self.exclude if "/" not in p]
+        path_patterns = [p.strip("/") for p in self.exclude if "/" in p]
+
+        self._case_fold = os.name == "nt"
+        literal = [p for p in name_patterns if not GLOB_CHARS.intersection(p)]
+        self._exclude_names = frozenset(p.lower() if self._case_fold else p for p in literal)
+        self._exclude_name_regex = _compile([p for p in name_patterns if GLOB_CHARS.intersection(p)])
+        self._exclude_path_regex = _compile(path_patterns)
+
+        self._include_name_regex = _compile([p for p in self.include if "/" not in p])
+        self._include_path_regex = _compile([p.strip("/") for p in self.include if "/" in p])
+        self.has_include = bool(self.include)
+
+    @staticmethod
+    def _relative(rel_path):
+        """相对路径统一使用"/"分隔，与模式的写法一致"""
+        return rel_path.replace(os.sep, "/") if os.sep != "/" else rel_path
+
+    def is_excluded(self, name, rel_path):
+        """名称或相对路径是否匹配排除模式
+        Args:
+            name: 文件或目录名
+            rel_path: 相对扫描根目录的路径（使用系统路径分隔符）
+        """
+        if (name.lower() if self._case_fold else name) in self._exclude_names:
+            return True
+        regex = self._exclude_name_regex
+        if regex is not None and regex.match(name):
+            return True
+        regex = self._exclude_path_regex
+        return regex is not None and regex.match(self._relative(rel_path)) is not None
+
+    def is_included(self, name, rel_path):
+        """文件是否匹配包含模式（没有包含模式时总是True）"""
+        if not self.has_include:
+            return True
+        regex = self._include_name_regex
+        if regex is not None and regex.match(name):
+            return True
+        regex = self._include_path_regex
+        return regex is not None and regex.match(self._relative(rel_path)) is not None
+
+    def match_file(self, name, rel_path):
+        """文件是否需要统计"""
+        return not self.is_excluded(name, rel_path) and self.is_included(name, rel_path)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+前缀压缩的路径表
+每个目录只保存一次：父目录编号和最后一级名称的编号，文件只需保存 (目录编号, 文件名)，
+完整路径在显示或导出时沿父目录链接重建；同名目录（如src、node_modules）的名称只保存一份
+"""
+
+import os
+import sys
+from array import array
+
+from memory_estimate import DICT_ENTRY_BYTES, INT_BYTES, POINTER_BYTES, array_bytes
+
+# 路径到编号的查询缓存和上级目录前缀缓存的大小，超出后清空（遍历时同一目录及其上级目录总是集中出现）
+CACHE_SIZE = 4096
+
+# 子目录查询键为 (父编号+1) << NAME_BITS | 名称编号，用一个整数代替元组
+NAME_BITS = 32
+
+
+def _split_child(path):
+    """把路径拆分为 (上级路径, 名称)，二者用os.path.join拼接不能还原为原路径时返回None"""
+    if os.altsep is None:
+        # 常见情况（上级路径不以分隔符结尾）直接按最后一个分隔符拆分，不调用os.path.split
+        head, sep, tail = path.rpartition(os.sep)
+        if head and tail and not head.endswith(sep):
+            return head, tail
+    head, tail = os.path.split(path)
+    if not tail or os.path.join(head, tail) != path:
+        return None
+    return head, tail
+
+
+class PathTable:
+    """目录路径表
+
+    编号按加入的顺序从0开始分配，上级目录总是先于子目录加入。顶层条目（父编号为-1）
+    保存完整的前缀（如扫描根目录或文件系统根目录），其余条目只保存最后一级名称，
+    与上级目录的路径用os.path.join拼接即为原路径，重建的路径与加入时的字符串完全相同。
+    每个目录占用父编号和名称编号两个8字节整数，不同的名称在names中各保存一次。
+    按路径查询和加入目录时另需子目录字典（每个目录约120字节），建立完成后由drop_index()
+    释放，只保留各列（每个目录约20字节），下次查询时再由各列重建。
+    查询未命中缓存时只需拆分出最后一级名称，上级目录通常在两代查询缓存中；
+    重建路径时上级目录的前缀（带结尾分隔符的路径）也有缓存，只需拼接一次字符串。
+    """
+
+    def __init__(self):
+        self.parent = array('q')
+        self.name_id = array('q')
+        self.names = []
+        self._name_ids = {}
+        self._children = {}
+        # 顶层条目名称的最大长度，更长的路径不可能是顶层条目
+        self._top_length = 0
+        # 路径到编号的查询缓存（当前一代和上一代）和上级目录前缀缓存
+        self._cache = {}
+        self._old_cache = {}
+        self._prefixes = {}
+        # 名称和各个缓存中字符串的总大小，供memory_used()使用
+        self._name_bytes = 0
+        self._cache_bytes = 0
+        self._old_cache_bytes = 0
+        self._prefix_bytes = 0
+
+    def __len__(self):
+        return len(self.parent)
+
+    def _key(self, parent, name):
+        """子目录查询键，名称从未出现过时返回None"""
+        nid = self._name_ids.get(name)
+        if nid is None:
+            return None
+        return (parent + 1) << NAME_BITS | nid
+
+    def add(self, parent, name, path=None):
+        """加入一个目录（不检查是否已存在）
+        Args:
+            parent: 上级目录编号，-1表示顶层条目
+            name: 最后一级名称；顶层条目为完整路径
+            path: 完整路径，提供时加入查询缓存
+        Returns:
+            int: 新目录的编号
+        """
+        if self._children is None:
+            self._build_index()
+        did = len(self.parent)
+        nid = self._name_ids.get(name)
+        if nid is None:
+            nid = self._name_ids[name] = len(self.names)
+            self.names.append(name)
+            if self._name_bytes is not None:
+                self._name_bytes += sys.getsizeof(name)
+        self.parent.append(parent)
+        self.name_id.append(nid)
+        self._children[(parent + 1) << NAME_BITS | nid] = did
+        if parent < 0 and len(name) > self._top_length:
+            self._top_length = len(name)
+        if path is not None:
+            self._remember(path, did)
+        return did
+
+    def _remember(self, path, did):
+        """把路径加入查询缓存：缓存满后整体转为上一代，再满时丢弃上一代"""
+        cache = self._cache
+        if len(cache) >= CACHE_SIZE:
+            self._old_cache = cache
+            self._old_cache_bytes = self._cache_bytes
+            cache = self._cache = {}
+            self._cache_bytes = 0
+        cache[path] = did
+        self._cache_bytes += sys.getsizeof(path)
+
+    def _cached(self, path):
+        """在两代查询缓存中查找路径，上一代命中时移入当前一代"""
+        did = self._cache.get(path)
+        if did is None:
+            did = self._old_cache.get(path)
+            if did is not None:
+                self._remember(path, did)
+        return did
+
+    def _resolve(self, path, create):
+        """查找（create为True时必要时加入）目录的编号"""
+        did = self._cache.get(path)
+        if did is not None:
+            return did
+        if self._children is None:
+            self._build_index()
+        did = self._old_cache.get(path)
+        if did is not None:
+            self._remember(path, did)
+            return did
+        children = self._children
+        name_ids = self._name_ids
+
+        # 常见情况：上级目录在缓存中，只需查询（或加入）最后一级
+        if len(path) > self._top_length:
+            split = _split_child(path)
+            if split is not None:
+                head, name = split
+                parent = self._cache.get(head)
+                if parent is None:
+                    parent = self._old_cache.get(head)
+                if parent is not None:
+                    nid = name_ids.get(name)
+                    did = None if nid is None else children.get((parent + 1) << NAME_BITS | nid)
+                    if did is None:
+                        if not create:
+                            return None
+                        did = self.add(parent, name)
+                    self._remember(path, did)
+                    return did
+
+        # 自下而上找到已加入的上级目录，再自上而下逐级查找或加入
+        top_length = self._top_length
+        pending = []
+        current = path
+        while True:
+            # 顶层条目的查询键就是名称编号，比所有顶层条目都长的路径不必查询
+            if len(current) <= top_length:
+                nid = name_ids.get(current)
+                if nid is not None:
+                    did = children.get(nid)
+                    if did is not None:
+                        break
+            split = _split_child(current)
+            if split is None:
+                # 根目录或不能由上级目录拼接还原的路径（如含多余的分隔符）作为顶层条目
+                if not create:
+                    return None
+                did = self.add(-1, current)
+                break
+            pending.append((current, split[1]))
+            current = split[0]
+            did = self._cached(current)
+            if did is not None:
+                break
+
+        remember = self._remember
+        for current, name in reversed(pending):
+            nid = name_ids.get(name)
+            child = None if nid is None else children.get((did + 1) << NAME_BITS | nid)
+            if child is None:
+                if not create:
+                    return None
+                child = self.add(did, name)
+            did = child
+            remember(current, did)
+        if not pending:
+            remember(path, did)
+        return did
+
+    def lookup(self, path):
+        """查询目录的编号，不存在时返回None"""
+        return self._resolve(path, False)
+
+    def intern(self, path):
+        """返回目录的编号，必要时加入它和所有尚未加入的上级目录"""
+        return self._resolve(path, True)
+
+    def child(self, parent, name):
+        """查询直接子目录的编号，不存在时返回None"""
+        if self._children is None:
+            self._build_index()
+        return self._children.get(self._key(parent, name))
+
+    def name(self, did):
+        """目录的最后一级名称（顶层条目为完整路径）"""
+        return self.names[self.name_id[did]]
+
+    def _prefix(self, did):
+        """目录路径加上结尾的分隔符，子目录的路径就是前缀加名称
+
+        前缀缓存在_prefixes中，按路径顺序访问时上级目录的前缀总是已经缓存，
+        重建一个路径只需拼接一次字符串。
+        """
+        prefixes = self._prefixes
+        prefix = prefixes.get(did)
+        if prefix is not None:
+            return prefix
+        # 向上找到已缓存前缀的上级目录，或者顶层条目
+        chain = []
+        while prefix is None and did >= 0:
+            chain.append(did)
+            did = self.parent[did]
+            prefix = prefixes.get(did)
+        if len(prefixes) + len(chain) > CACHE_SIZE:
+            prefixes.clear()
+            self._prefix_bytes = 0
+        names = self.names
+        name_id = self.name_id
+        added = 0
+        if prefix is None:
+            did = chain.pop()
+            prefix = prefixes[did] = os.path.join(names[name_id[did]], '')
+            added += sys.getsizeof(prefix)
+        for did in reversed(chain):
+            prefix = prefixes[did] = prefix + names[name_id[did]] + os.sep
+            added += sys.getsizeof(prefix)
+        self._prefix_bytes += added
+        return prefix
+
+    def join(self, parent, name):
+        """上级目录的路径与名称拼接得到的路径（与os.path.join的结果相同）"""
+        return self._prefix(parent) + name
+
+    def path(self, did):
+        """重建目录的完整路径"""
+        parent = self.parent[did]
+        name = self.names[self.name_id[did]]
+        return name if parent < 0 else self._prefix(parent) + name
+
+    def memory_used(self):
+        """估计占用的内存（字节）：各列、名称、查询字典和各个缓存"""
+        if self._name_bytes is None:
+            self._name_bytes = sum(map(sys.getsizeof, self.names))
+        used = array_bytes(self.parent, self.name_id) + self._name_bytes + len(self.names) * POINTER_BYTES
+        if self._children is not None:
+            used += len(self._children) * (DICT_ENTRY_BYTES + 2 * INT_BYTES)
+            used += len(self._name_ids) * DICT_ENTRY_BYTES
+        used += (len(self._cache) + len(self._old_cache) + len(self._prefixes)) * DICT_ENTRY_BYTES
+        return used + self._cache_bytes + self._old_cache_bytes + self._prefix_bytes
+
+    def drop_index(self):
+        """释放名称编号、子目录字典和缓存（如目录树建立完成后），下次查询时由各列重建"""
+        self._name_ids = None
+        self._children = None
+        self._cache = {}
+        self._old_cache = {}
+        self._prefixes = {}
+        self._cache_bytes = 0
+        self._old_cache_bytes = 0
+        self._prefix_bytes = 0
+
+    def _build_index(self):
+        """由各列建立名称编号和子目录字典（载入后第一次查询时才建立）"""
+        self._name_ids = {name: nid for nid, name in enumerate(self.names)}
+        self._children = {(parent + 1) << NAME_BITS | nid: did
+                          for did, (parent, nid) in enumerate(zip(self.parent, self.name_id))}
+        names = self.names
+        self._top_length = max((len(names[nid]) for parent, nid in zip(self.parent, self.name_id) if parent < 0),
+                               default=0)
+
+    @classmethod
+    def from_columns(cls, parent, name_id, names):
+        """由已有的列重建路径表，各列直接引用不复制
+        Args:
+            parent/name_id: 整数序列（array，或结果文件中的memoryview）
+            names: 名称序列
+        只用于路径重建时不建立查询字典；列为只读的memoryview时不能再加入目录。
+        """
+        table = cls()
+        table.__setstate__({'parent': parent, 'name_id': name_id, 'names': names})
+        return table
+
+    def __getstate__(self):
+        # 名称和子目录字典、查询缓存可以由各列重建，不随进程间传递
+        return {'parent': self.parent, 'name_id': self.name_id, 'names': self.names}
+
+    def __setstate__(self, state):
+        self.parent = state['parent']
+        self.name_id = state['name_id']
+        self.names = state['names']
+        self._name_bytes = None  # 需要时由memory_used()计算
+        self.drop_index()
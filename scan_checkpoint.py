@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描检查点
+长时间扫描过程中定期把待扫描的目录栈和已累计的统计结果保存到本地文件，
+进程退出或扫描被取消后，用相同的参数再次扫描时从检查点继续
+"""
+
+import os
+import time
+import pickle
+
+CHECKPOINT_VERSION = 2
+
+# GUI中启用“可中断续扫”时使用的检查点文件
+CHECKPOINT_FILE = "scan_checkpoint.pkl"
+
+
+class ScanCheckpoint:
+    """扫描检查点文件
+
+    检查点只在两个目录之间保存（单个目录总是完整处理），由两个文件组成：
+    - 检查点文件：扫描参数、待扫描目录栈和大小有上限的统计状态，每次保存时整体替换
+      （先写临时文件再替换，进程在写入中途退出也不会损坏旧检查点）；
+    - 增量文件（检查点文件名加.delta）：每次保存时追加上次保存之后新增的记录，
+      检查点文件中记录增量文件的有效长度，读取时忽略之后未完成的部分。
+    每次保存写入的数据量只与两次保存之间的扫描量有关，与已扫描的总量无关。
+    pickle文件可以执行任意代码，只应加载本机扫描器自己写入的检查点。
+    """
+
+    def __init__(self, checkpoint_path, interval=60.0):
+        self.checkpoint_path = checkpoint_path
+        self.delta_path = checkpoint_path + ".delta"
+        self.interval = interval
+        self.saves = 0
+        self._last_save = time.monotonic()
+        # 增量文件的有效长度：从检查点继续时为读取到的长度，重新开始扫描时为0
+        self._delta_size = 0
+
+    def due(self):
+        """距离上次保存是否已超过保存间隔"""
+        return time.monotonic() - self._last_save >= self.interval
+
+    def save(self, params, state, delta=None):
+        """保存检查点
+        Args:
+            params: 扫描参数字典，恢复时必须完全相同
+            state: 扫描状态字典
+            delta: 上次保存之后新增的记录，追加到增量文件；None表示没有
+        """
+        delta_size = self._delta_size
+        if delta is not None:
+            mode = 'r+b' if delta_size else 'wb'
+            with open(self.delta_path, mode) as f:
+                # 丢弃之前写入但检查点文件未记录（保存失败）的部分
+                f.seek(delta_size)
+                f.truncate()
+                pickle.dump(delta, f, protocol=pickle.HIGHEST_PROTOCOL)
+                delta_size = f.tell()
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump({'version': CHECKPOINT_VERSION, 'params': params, 'state': state,
+                         'delta_size': delta_size},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.checkpoint_path)
+        # 检查点文件替换成功后才计入这次的增量，保存失败时下次保存从同一位置重写
+        self._delta_size = delta_size
+        self.saves += 1
+        self._last_save = time.monotonic()
+
+    def load(self, params):
+        """读取与扫描参数匹配的检查点
+        Returns:
+            tuple: (扫描状态, 按保存顺序排列的增量列表)；没有检查点、参数不同或文件损坏时返回None
+        """
+        self._last_save = time.monotonic()
+        self._delta_size = 0
+        try:
+            with open(self.checkpoint_path, 'rb') as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            print(f"[警告] 无法读取检查点 {self.checkpoint_path}: {e}")
+            return None
+        if not isinstance(data, dict) or data.get('version') != CHECKPOINT_VERSION:
+            return None
+        if data.get('params') != params:
+            return None
+
+        deltas = []
+        delta_size = data['delta_size']
+        if delta_size:
+            try:
+                with open(self.delta_path, 'rb') as f:
+                    while f.tell() < delta_size:
+                        deltas.append(pickle.load(f))
+                    if f.tell() != delta_size:
+                        raise EOFError("增量记录与检查点不一致")
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+                print(f"[警告] 无法读取检查点增量 {self.delta_path}: {e}")
+                return None
+        self._delta_size = delta_size
+        return data['state'], deltas
+
+    def clear(self):
+        """扫描完成后删除检查点"""
+        self._delta_size = 0
+        for path in (self.checkpoint_path, self.checkpoint_path + ".tmp", self.delta_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
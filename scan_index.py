@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化扫描索引（SQLite）
+记录每个目录的mtime/ctime和其中的文件信息，重复扫描同一目录树时
+跳过未变化目录的列目录和stat操作，直接使用索引中的记录
+"""
+
+import os
+import sqlite3
+import time
+from array import array
+from collections import namedtuple
+from functools import partial
+from operator import itemgetter
+
+from file_records import FS_ENCODING, FS_ERRORS
+
+# 索引中保存的文件stat字段，字段名与os.stat_result一致
+IndexedStat = namedtuple('IndexedStat', [
+    'st_size', 'st_mtime_ns', 'st_atime_ns', 'st_ino', 'st_dev', 'st_nlink', 'st_blocks'
+])
+
+# 目录修改时间距离列目录时刻小于该值时不信任缓存（时间戳精度不足时的竞态）
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+# 索引结构版本，与文件中的user_version不同时清空重建（索引只是缓存）
+SCHEMA_VERSION = 3
+
+# 名称列表的分隔符（文件名中不可能出现NUL）
+NAME_SEPARATOR = '\0'
+
+# 每个目录的列目录结果保存为一行：子目录名和文件名各为一个以NUL分隔的名称列表，
+# 文件的stat字段按列（先全部size，再全部mtime_ns……）存为本机字节序的int64数组。
+# 路径和名称按文件系统编码存为BLOB（与os.fsencode相同），不是合法UTF-8的名称也能原样保存
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS directories (
+    id INTEGER PRIMARY KEY,
+    path BLOB NOT NULL UNIQUE,
+    parent_id INTEGER,
+    mtime_ns INTEGER NOT NULL,
+    ctime_ns INTEGER NOT NULL,
+    listed_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_directories_parent ON directories(parent_id);
+CREATE TABLE IF NOT EXISTS listings (
+    dir_id INTEGER PRIMARY KEY,
+    subdirs BLOB NOT NULL,
+    names BLOB NOT NULL,
+    stats BLOB NOT NULL
+);
+"""
+
+DROP_SCHEMA = """
+DROP TABLE IF EXISTS directories;
+DROP TABLE IF EXISTS files;
+DROP TABLE IF EXISTS listings;
+"""
+
+
+def _encode(text):
+    """路径或名称列表按文件系统编码转为bytes（与os.fsencode相同）"""
+    return text.encode(FS_ENCODING, FS_ERRORS)
+
+
+def _split_names(joined):
+    """以NUL分隔的名称列表BLOB整体解码后拆分"""
+    return joined.decode(FS_ENCODING, FS_ERRORS).split(NAME_SEPARATOR) if joined else []
+
+
+class IndexedEntry(tuple):
+    """索引中的文件记录 (name, path, stat)，提供与os.DirEntry相同的常用接口
+
+    继承tuple，命中索引时用tuple.__new__直接构造，不经过Python层的__init__。
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, name, path, stat):
+        return tuple.__new__(cls, (name, path, stat))
+
+    name = property(itemgetter(0))
+    path = property(itemgetter(1))
+
+    def is_file(self, follow_symlinks=True):
+        return True
+
+    def is_dir(self, follow_symlinks=True):
+        return False
+
+    def stat(self, follow_symlinks=True):
+        return self[2]
+
+
+def _stat_fields(st):
+    """从os.stat_result中取出索引需要的字段"""
+    return IndexedStat(
+        st.st_size,
+        st.st_mtime_ns,
+        st.st_atime_ns,
+        st.st_ino,
+        st.st_dev,
+        st.st_nlink,
+        getattr(st, 'st_blocks', (st.st_size + 511) // 512),
+    )
+
+
+class ScanIndex:
+    """基于SQLite的目录扫描索引
+
+    目录的mtime/ctime没有变化时，其中的文件名列表不会变化，直接返回索引中
+    的记录，不再调用os.scandir和stat。注意：就地修改文件内容不会改变目录的
+    mtime，这类变化需要verify_files=True（只跳过列目录，仍然stat每个文件）
+    或完整扫描才能反映。
+    """
+
+    def __init__(self, index_path, verify_files=False):
+        self.index_path = index_path
+        self.verify_files = verify_files
+        self.conn = sqlite3.connect(index_path, check_same_thread=False)
+        (version,) = self.conn.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION:
+            # 旧版本的索引没有完整的子目录列表，清空后重新建立
+            self.conn.executescript(DROP_SCHEMA)
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        self._pending_writes = 0
+
+    def close(self):
+        """提交并关闭索引"""
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def commit(self):
+        """提交尚未写入的更改"""
+        self.conn.commit()
+        self._pending_writes = 0
+
+    def list_directory(self, dir_path):
+        """列出目录，未变化时使用索引中的记录
+        Args:
+            dir_path: 目录路径字符串
+        Returns:
+            tuple: (子目录路径列表, 文件条目列表)；目录无法访问时返回None
+        """
+        try:
+            dir_stat = os.stat(dir_path)
+        except OSError:
+            return None
+
+        row = self.conn.execute(
+            "SELECT id, mtime_ns, ctime_ns, listed_ns FROM directories WHERE path = ?",
+            (_encode(dir_path),)).fetchone()
+
+        if row is not None:
+            dir_id, mtime_ns, ctime_ns, listed_ns = row
+            unchanged = (mtime_ns == dir_stat.st_mtime_ns and ctime_ns == dir_stat.st_ctime_ns
+                         and listed_ns - mtime_ns > RACY_WINDOW_NS)
+            if unchanged:
+                self.hits += 1
+                return self._load_directory(dir_id, dir_path)
+
+        self.misses += 1
+        return self._relist_directory(dir_path, dir_stat, row[0] if row else None)
+
+    def _load_directory(self, dir_id, dir_path):
+        """从索引读取目录内容
+
+        子目录取自列目录时保存的完整列表，不依赖子目录本身是否被列出过
+        （上次扫描中被取消、被过滤或无法访问的子目录同样返回）。
+        整个目录只读取一行，条目由zip/map在C层构造。
+        """
+        subdirs_joined, names_joined, blob = self.conn.execute(
+            "SELECT subdirs, names, stats FROM listings WHERE dir_id = ?", (dir_id,)).fetchone()
+        prefix = os.path.join(dir_path, '')
+        subdirs = [prefix + name for name in _split_names(subdirs_joined)]
+        names = _split_names(names_joined)
+        paths = list(map(prefix.__add__, names))
+
+        if self.verify_files:
+            entries = []
+            for name, path in zip(names, paths):
+                try:
+                    st = _stat_fields(os.stat(path, follow_symlinks=False))
+                except OSError:
+                    continue
+                entries.append(IndexedEntry(name, path, st))
+            return subdirs, entries
+
+        count = len(names)
+        stats = array('q')
+        stats.frombytes(blob)
+        columns = [stats[i * count:(i + 1) * count] for i in range(len(IndexedStat._fields))]
+        new_stat = partial(tuple.__new__, IndexedStat)
+        entries = list(map(partial(tuple.__new__, IndexedEntry),
+                           zip(names, paths, map(new_stat, zip(*columns)))))
+        return subdirs, entries
+
+    def _relist_directory(self, dir_path, dir_stat, dir_id):
+        """重新列出目录并更新索引"""
+        try:
+            with os.scandir(dir_path) as it:
+                dir_entries = list(it)
+        except OSError:
+            return None
+
+        subdirs = []
+        subdir_names = []
+        entries = []
+        for entry in dir_entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    subdir_names.append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    st = _stat_fields(entry.stat(follow_symlinks=False))
+                    entries.append(IndexedEntry(entry.name, entry.path, st))
+            except OSError:
+                continue
+
+        # 保存完整的子目录列表（不受隐藏、排除等过滤条件影响），未变化时由此继续遍历
+        stats = array('q')
+        for column in zip(*[entry.stat() for entry in entries]):
+            stats.extend(column)
+        listing = (_encode(NAME_SEPARATOR.join(subdir_names)),
+                   _encode(NAME_SEPARATOR.join(entry.name for entry in entries)), stats.tobytes())
+
+        conn = self.conn
+        parent_row = conn.execute("SELECT id FROM directories WHERE path = ?",
+                                  (_encode(os.path.dirname(dir_path)),)).fetchone()
+        parent_id = parent_row[0] if parent_row else None
+        listed_ns = int(time.time() * 1e9)
+
+        if dir_id is None:
+            dir_id = conn.execute(
+                "INSERT INTO directories (path, parent_id, mtime_ns, ctime_ns, listed_ns) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (_encode(dir_path), parent_id, dir_stat.st_mtime_ns, dir_stat.st_ctime_ns, listed_ns)).lastrowid
+        else:
+            conn.execute(
+                "UPDATE directories SET parent_id = ?, mtime_ns = ?, ctime_ns = ?, listed_ns = ? "
+                "WHERE id = ?",
+                (parent_id, dir_stat.st_mtime_ns, dir_stat.st_ctime_ns, listed_ns, dir_id))
+
+            # 已被删除或改名的子目录连同其下的整棵子树一起从索引中移除
+            current = set(map(_encode, subdirs))
+            for (child_path,) in conn.execute(
+                    "SELECT path FROM directories WHERE parent_id = ?", (dir_id,)).fetchall():
+                if child_path not in current:
+                    self._delete_subtree(child_path)
+
+        conn.execute("INSERT OR REPLACE INTO listings (dir_id, subdirs, names, stats) VALUES (?, ?, ?, ?)",
+                     (dir_id,) + listing)
+
+        self._pending_writes += 1
+        if self._pending_writes >= 1000:
+            self.commit()
+        return subdirs, entries
+
+    def _delete_subtree(self, dir_path):
+        """删除一个目录及其所有子目录的索引记录
+        Args:
+            dir_path: 按文件系统编码的目录路径（bytes，与索引中保存的相同）
+        """
+        prefix = os.path.join(dir_path, b'')
+        # 路径前缀的范围查询（BLOB按字节比较）：[prefix, prefix的最后一个字节+1)
+        upper = prefix[:-1] + bytes([prefix[-1] + 1])
+        condition = "path = ? OR (path >= ? AND path < ?)"
+        params = (dir_path, prefix, upper)
+        self.conn.execute(
+            f"DELETE FROM listings WHERE dir_id IN (SELECT id FROM directories WHERE {condition})", params)
+        self.conn.execute(f"DELETE FROM directories WHERE {condition}", params)
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二进制扫描结果文件
+扫描结果按列写入一个带版本号的二进制文件：每列为定长整数数组，文件名、目录名和路径
+存放在字符串堆中（结束位置数组+连续的编码字节），统计摘要和列目录以JSON保存在文件末尾。
+读取时用mmap映射整个文件，各列直接作为memoryview使用，不解析、不复制，
+千万级文件的扫描结果（包括重复文件组）也能立即重新打开，无需重新扫描
+"""
+
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from datetime import datetime
+
+from age_analysis import AGE_BUCKET_COUNT
+from column_stats import ScanColumns
+from directory_tree import DirectoryTree
+from duplicate_finder import DuplicateGroup
+from file_records import FS_ENCODING, FS_ERRORS, FileRecordStore
+from path_table import PathTable
+
+RESULTS_FILE = "scan_results.bin"
+RESULTS_FORMAT = "disk_scanner_results"
+RESULTS_VERSION = 3
+
+# 文件头：魔数、格式版本、保留、列目录（JSON）的位置和长度
+RESULTS_MAGIC = b"DSKSCAN\x00"
+_HEADER = struct.Struct("<8sIIQQ")
+
+# 列的起始位置按8字节对齐
+_ALIGNMENT = 8
+
+# 目录名、类型名等字符串的编码；surrogatepass可以保存任意Python字符串（含无法解码的文件名）
+STRING_ENCODING = "utf-8"
+STRING_ERRORS = "surrogatepass"
+
+# 摘要JSON中不保存路径（无法解码的文件名在JSON中不能编码为UTF-8），扫描路径、目录树根目录和
+# 重复文件路径与文件名一样按文件系统编码（os.fsencode）保存在字符串堆中
+
+
+class StringHeap:
+    """字符串堆的只读序列视图，按下标访问时才解码
+
+    ends[i]为第i个字符串在data中的结束位置；optional为True时空字符串表示None。
+    """
+
+    def __init__(self, ends, data, encoding=STRING_ENCODING, errors=STRING_ERRORS, optional=False):
+        self.ends = ends
+        self.data = data
+        self.encoding = encoding
+        self.errors = errors
+        self.optional = optional
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.ends)
+        start = self.ends[index - 1] if index else 0
+        end = self.ends[index]
+        if self.optional and start == end:
+            return None
+        return str(self.data[start:end], self.encoding, self.errors)
+
+    def __iter__(self):
+        for index in range(len(self.ends)):
+            yield self[index]
+
+
+class DuplicateGroupList:
+    """重复文件组的只读序列视图，按下标访问时才构造DuplicateGroup
+
+    第i组的路径为paths中 [group_ends[i-1], group_ends[i]) 范围内的字符串，
+    重新打开结果文件的耗时与重复文件组的数量无关。
+    """
+
+    def __init__(self, sizes, digests, group_ends, paths):
+        self.sizes = sizes
+        self.digests = digests
+        self.group_ends = group_ends
+        self.paths = paths
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.sizes)))]
+        if index < 0:
+            index += len(self.sizes)
+        if not 0 <= index < len(self.sizes):
+            raise IndexError("重复文件组下标超出范围")
+        start = self.group_ends[index - 1] if index else 0
+        paths = [self.paths[i] for i in range(start, self.group_ends[index])]
+        return DuplicateGroup(self.sizes[index], self.digests[index], paths)
+
+    def __iter__(self):
+        for index in range(len(self.sizes)):
+            yield self[index]
+
+
+class _ColumnWriter:
+    """依次写入各列并记录列目录"""
+
+    def __init__(self, f):
+        self.f = f
+        self.columns = {}
+
+    def column(self, name, values, typecode):
+        """写入一列整数；values已是相同类型的array/memoryview时直接写出，不复制"""
+        if isinstance(values, (bytes, bytearray)):
+            values = memoryview(values)
+        if typecode not in (getattr(values, 'typecode', None), getattr(values, 'format', None)):
+            values = array(typecode, values)
+        padding = -self.f.tell() % _ALIGNMENT
+        if padding:
+            self.f.write(b"\0" * padding)
+        self.columns[name] = [self.f.tell(), typecode, len(values)]
+        if len(values):
+            self.f.write(memoryview(values).cast('B'))
+
+    def strings(self, name, strings, optional=False, encoding=STRING_ENCODING, errors=STRING_ERRORS):
+        """写入一个字符串堆（name.ends和name.data两列）"""
+        ends = array('q')
+        data = bytearray()
+        for string in strings:
+            if string is not None:
+                data += string.encode(encoding, errors)
+            elif not optional:
+                raise ValueError(f"字符串列 {name} 中不能有None")
+            ends.append(len(data))
+        self.column(name + ".ends", ends, 'q')
+        self.column(name + ".data", data, 'B')
+
+    def paths(self, name, paths):
+        """按文件系统编码写入一个路径字符串堆"""
+        self.strings(name, (os.fspath(path) for path in paths), encoding=FS_ENCODING, errors=FS_ERRORS)
+
+    def duplicate_groups(self, name, groups):
+        sizes = array('q')
+        digests = []
+        group_ends = array('q')
+        paths = []
+        for group in groups:
+            sizes.append(group.size)
+            digests.append(group.digest)
+            paths.extend(group.paths)
+            group_ends.append(len(paths))
+        self.column(name + ".size", sizes, 'q')
+        self.strings(name + ".digest", digests)
+        self.column(name + ".group_ends", group_ends, 'q')
+        self.paths(name + ".paths", paths)
+
+    def path_table(self, name, table):
+        self.column(name + ".parent", table.parent, 'q')
+        self.column(name + ".name_id", table.name_id, 'q')
+        self.strings(name + ".names", table.names)
+
+    def file_store(self, name, store):
+        self.column(name + ".size", store.size, 'q')
+        self.column(name + ".allocated", store.allocated, 'q')
+        self.column(name + ".last_used", store.last_used, 'q')
+        self.column(name + ".directory", store.directory, 'q')
+        self.column(name + ".name_ends", store._name_ends, 'q')
+        self.column(name + ".names", store._names, 'B')
+        self.path_table(name + ".directories", store.directories)
+
+
+def save_results_file(scanner, file_path, scan_path, settings=None):
+    """把扫描器的结果写入二进制结果文件（先写临时文件，完成后替换）
+    Args:
+        scanner: 完成扫描（或已载入结果）的DiskScanner
+        scan_path: 扫描路径
+        settings: 扫描设置字典（最小文件大小等），原样保存
+    Returns:
+        int: 写入的字节数
+    """
+    meta = {
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "scan_time": scanner.scan_time(),
+        "settings": settings or {},
+        "scan_complete": scanner.scan_complete,
+        "scanned_files": scanner.scanned_files,
+        "total_files": scanner.total_files,
+        "total_size": scanner.total_size,
+        "total_allocated": scanner.total_allocated,
+        "hardlinks_skipped": scanner.hardlinks_skipped,
+        "age_sizes": list(scanner.age_sizes),
+        "file_types": {file_type: dict(stats, ages=list(stats['ages']))
+                       for file_type, stats in scanner.file_types.items()},
+        # 文件记录中的文件名按扫描时的文件系统编码保存
+        "fs_encoding": FS_ENCODING,
+        "fs_errors": FS_ERRORS,
+    }
+
+    temp_path = file_path + ".tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            size = _write_results(f, scanner, scan_path, meta)
+        os.replace(temp_path, file_path)
+    finally:
+        # 写入失败时不留下临时文件（替换成功后临时文件已不存在）
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return size
+
+
+def _write_results(f, scanner, scan_path, meta):
+    """写出文件头、各列和列目录，返回文件大小"""
+    f.write(b"\0" * _HEADER.size)
+    writer = _ColumnWriter(f)
+    writer.paths("scan_path", [scan_path])
+    writer.file_store("largest", scanner.largest_files)
+    writer.file_store("cold", scanner.cold_files)
+    writer.duplicate_groups("duplicates", scanner.duplicate_groups)
+
+    tree = scanner.directory_tree
+    if tree is not None:
+        writer.paths("tree.root", [tree.root])
+        writer.path_table("tree.paths", tree.table)
+        writer.column("tree.parent", tree.parent, 'q')
+        writer.column("tree.depth", tree.depth, 'q')
+        writer.column("tree.total_bytes", tree.total_bytes, 'q')
+        writer.column("tree.file_count", tree.file_count, 'q')
+        writer.column("tree.largest_size", tree.largest_size, 'q')
+        writer.strings("tree.largest_name", tree.largest_name, optional=True)
+        for bucket, column in enumerate(tree.age_bytes):
+            writer.column(f"tree.age_bytes.{bucket}", column, 'q')
+
+    columns = scanner.columns
+    if columns is not None:
+        meta["categories"] = list(columns.categories)
+        writer.column("columns.size", columns.size, 'q')
+        writer.column("columns.last_used", columns.last_used, 'q')
+        writer.column("columns.category", columns.category, 'H')
+        writer.column("columns.directory", columns.directory, 'q')
+        writer.path_table("columns.directories", columns.directories)
+
+    toc = json.dumps({
+        "format": RESULTS_FORMAT,
+        "version": RESULTS_VERSION,
+        "byteorder": sys.byteorder,
+        "meta": meta,
+        "columns": writer.columns,
+    }, ensure_ascii=False).encode("utf-8")
+    toc_offset = f.tell()
+    f.write(toc)
+    size = f.tell()
+    f.seek(0)
+    f.write(_HEADER.pack(RESULTS_MAGIC, RESULTS_VERSION, 0, toc_offset, len(toc)))
+    return size
+
+
+class ScanResultsFile:
+    """用mmap打开的二进制结果文件
+
+    meta为统计摘要，largest_files()等方法返回直接引用映射内存的只读结果对象。
+    映射在所有结果对象都不再使用后自动释放。
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < _HEADER.size:
+                raise ValueError(f"不是扫描结果文件: {file_path}")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, version, _, toc_offset, toc_length = _HEADER.unpack_from(self._view)
+        if magic != RESULTS_MAGIC:
+            raise ValueError(f"不是扫描结果文件: {file_path}")
+        if version != RESULTS_VERSION:
+            raise ValueError(f"不支持的结果文件版本: {version}")
+        toc = json.loads(str(self._view[toc_offset:toc_offset + toc_length], "utf-8"))
+        self.meta = toc["meta"]
+        self._columns = toc["columns"]
+        # 在字节序不同的机器上读取时各列需要复制并转换字节序
+        self._swap = toc["byteorder"] != sys.byteorder
+        self.meta["scan_path"] = self.paths("scan_path")[0]
+
+    def has(self, name):
+        return name in self._columns
+
+    def column(self, name):
+        """返回一列（memoryview，字节序不同时为转换后的array）"""
+        offset, typecode, count = self._columns[name]
+        view = self._view[offset:offset + count * array(typecode).itemsize]
+        if self._swap and typecode != 'B':
+            values = array(typecode)
+            values.frombytes(view)
+            values.byteswap()
+            return values
+        return view.cast(typecode)
+
+    def strings(self, name, optional=False):
+        return StringHeap(self.column(name + ".ends"), self.column(name + ".data"), optional=optional)
+
+    def paths(self, name):
+        """按保存时的文件系统编码解码的路径字符串堆"""
+        return StringHeap(self.column(name + ".ends"), self.column(name + ".data"),
+                          self.meta["fs_encoding"], self.meta["fs_errors"])
+
+    def path_table(self, name):
+        return PathTable.from_columns(self.column(name + ".parent"), self.column(name + ".name_id"),
+                                      self.strings(name + ".names"))
+
+    def _file_store(self, name):
+        store = FileRecordStore.from_columns(
+            self.column(name + ".size"), self.column(name + ".allocated"), self.column(name + ".last_used"),
+            self.column(name + ".directory"), self.path_table(name + ".directories"),
+            self.column(name + ".names"), self.column(name + ".name_ends"))
+        if (self.meta["fs_encoding"], self.meta["fs_errors"]) != (FS_ENCODING, FS_ERRORS):
+            # 文件名编码与本机不同（在其他系统上保存的结果），按本机编码重新存放
+            copied = FileRecordStore()
+            for row in range(len(store)):
+                name_start = store._name_ends[row - 1] if row else 0
+                file_name = str(store._names[name_start:store._name_ends[row]],
+                                self.meta["fs_encoding"], self.meta["fs_errors"])
+                copied.append(os.path.join(store.directories.path(store.directory[row]), file_name),
+                              store.size[row], store.allocated[row], store.last_used[row])
+            store = copied
+        return store
+
+    def largest_files(self):
+        return self._file_store("largest")
+
+    def cold_files(self):
+        return self._file_store("cold")
+
+    def directory_tree(self):
+        """目录树，扫描时没有建立目录树时返回None"""
+        if not self.has("tree.parent"):
+            return None
+        return DirectoryTree.from_columns(
+            self.paths("tree.root")[0], self.path_table("tree.paths"),
+            self.column("tree.parent"), self.column("tree.depth"), self.column("tree.total_bytes"),
+            self.column("tree.file_count"), self.strings("tree.largest_name", optional=True),
+            self.column("tree.largest_size"),
+            [self.column(f"tree.age_bytes.{bucket}") for bucket in range(AGE_BUCKET_COUNT)])
+
+    def columns(self):
+        """列式结果，扫描时没有收集时返回None"""
+        if not self.has("columns.size"):
+            return None
+        return ScanColumns.from_columns(
+            self.column("columns.size"), self.column("columns.last_used"), self.column("columns.category"),
+            self.column("columns.directory"), self.meta["categories"], self.path_table("columns.directories"))
+
+    def duplicate_groups(self):
+        """重复文件组（DuplicateGroupList，访问时才构造各组）"""
+        return DuplicateGroupList(self.column("duplicates.size"), self.strings("duplicates.digest"),
+                                  self.column("duplicates.group_ends"), self.paths("duplicates.paths"))
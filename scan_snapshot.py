@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描快照与快照对比
+快照按相对路径排序保存每个被扫描文件的大小，两个快照对比时按路径做流式归并，
+内存占用与快照大小无关，可以直接对比千万级文件的快照
+用法: python scan_snapshot.py 旧快照 新快照 [显示条数]
+"""
+
+import os
+import sys
+import json
+import gzip
+import heapq
+import tempfile
+from array import array
+from datetime import datetime
+
+from memory_estimate import INT_BYTES, POINTER_BYTES, tuple_bytes
+from path_table import PathTable
+from sorted_runs import MAX_MERGE_RUNS
+
+SNAPSHOT_FORMAT = "disk_scanner_snapshot"
+SNAPSHOT_VERSION = 1
+
+# 写入快照时内存中最多保留的记录数，超出后排序写入临时文件（归并段）
+DEFAULT_RUN_SIZE = 500000
+
+# 每条缓存记录除文件名以外的估计占用（字节）：三列各8字节和文件名列表中的一项，
+# 以及写入归并段前排序用的 (相对路径, 大小, 占用空间) 元组（相对路径另按文件名和目录长度计算）
+RECORD_BYTES = 3 * 8 + 2 * POINTER_BYTES + tuple_bytes(3) + 2 * INT_BYTES
+
+_ESCAPES = {"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"}
+_UNESCAPES = {"\\": "\\", "t": "\t", "n": "\n", "r": "\r"}
+
+
+def _escape(path):
+    """转义路径中的反斜杠、制表符和换行，保证一行一条记录"""
+    if "\\" in path or "\t" in path or "\n" in path or "\r" in path:
+        return "".join(_ESCAPES.get(ch, ch) for ch in path)
+    return path
+
+
+def _unescape(field):
+    if "\\" not in field:
+        return field
+    result = []
+    chars = iter(field)
+    for ch in chars:
+        result.append(_UNESCAPES.get(next(chars, ""), "") if ch == "\\" else ch)
+    return "".join(result)
+
+
+def _open(file_path, mode, compress=False):
+    """打开快照文件；写入时compress为True则使用gzip压缩，读取时按文件头自动识别"""
+    if mode == "r":
+        with open(file_path, "rb") as f:
+            compress = f.read(2) == b"\x1f\x8b"
+    if compress:
+        return gzip.open(file_path, mode + "t", encoding="utf-8", errors="surrogateescape")
+    return open(file_path, mode, encoding="utf-8", errors="surrogateescape")
+
+
+def _write_records(f, records):
+    for path, size, allocated in records:
+        f.write(f"{_escape(path)}\t{size}\t{allocated}\n")
+
+
+def _parse(line):
+    path, size, allocated = line.rstrip("\n").rsplit("\t", 2)
+    return _unescape(path), int(size), int(allocated)
+
+
+def _read_records(f):
+    """逐行读取记录 (相对路径, 大小, 占用空间)"""
+    for line in f:
+        yield _parse(line)
+
+
+class SnapshotWriter:
+    """在扫描过程中收集文件记录并写出排序后的快照
+
+    路径保存为相对扫描根目录、以"/"分隔的形式。记录先按列缓存在内存中
+    （目录编号、文件名、大小、占用空间，目录在路径表directories中只保存一次），
+    超过run_size条时拼出相对路径、排序写入临时文件，finish()时把所有归并段和剩余记录
+    用heapq.merge合并为最终快照，写入时的内存占用不超过run_size条记录。
+    缓存写入归并段后路径表也重新开始，路径表只包含缓存中的记录所在的目录。
+    并行扫描时每个工作线程/进程各有一个实例，最后用absorb()合并。
+    """
+
+    def __init__(self, root_prefix_len, run_size=DEFAULT_RUN_SIZE, temp_dir=None):
+        self.root_prefix_len = root_prefix_len
+        self.run_size = run_size
+        self.temp_dir = temp_dir
+        self.runs = []
+        self.directories = PathTable()
+        self._rel_dir_len = 0
+        self._clear_buffer()
+        self._convert_sep = os.sep != "/"
+
+    def _clear_buffer(self):
+        self._directory = array('q')
+        self._names = []
+        self._size = array('q')
+        self._allocated = array('q')
+        self._buffer_bytes = 0
+
+    def directory_id(self, directory):
+        """返回目录在路径表中的编号，供append()使用"""
+        if not self._names and len(self.directories):
+            # 缓存已写入归并段，之前的目录编号都不再使用
+            self.directories = PathTable()
+        # 之后append()的记录属于该目录，相对路径比文件名多出目录部分
+        self._rel_dir_len = max(0, len(directory) - self.root_prefix_len + 1)
+        return self.directories.intern(directory)
+
+    def append(self, dir_id, name, size, allocated):
+        """记录directory_id()所返回目录中的一个文件（扫描热路径中同一目录只查询一次编号）"""
+        self._directory.append(dir_id)
+        self._names.append(name)
+        self._size.append(size)
+        self._allocated.append(allocated)
+        self._buffer_bytes += RECORD_BYTES + 2 * sys.getsizeof(name) + self._rel_dir_len
+        if len(self._names) >= self.run_size:
+            self.spill()
+
+    def add(self, path, size, allocated):
+        """记录一个文件
+        Args:
+            path: 文件完整路径（以扫描根目录开头）
+        """
+        directory, name = os.path.split(path)
+        self.append(self.directory_id(directory), name, size, allocated)
+
+    def buffered(self):
+        """内存中尚未写入归并段的记录数"""
+        return len(self._names)
+
+    def memory_used(self):
+        """估计占用的内存（字节）：缓存的记录（包括写入归并段时排序所需的部分）和路径表"""
+        return self._buffer_bytes + self.directories.memory_used()
+
+    def _sorted_buffer(self):
+        """由缓存的各列拼出 (相对路径, 大小, 占用空间) 并排序，同时清空缓存"""
+        prefixes = {}
+        records = []
+        for dir_id, name, size, allocated in zip(self._directory, self._names, self._size, self._allocated):
+            prefix = prefixes.get(dir_id)
+            if prefix is None:
+                rel_dir = self.directories.path(dir_id)[self.root_prefix_len:]
+                if self._convert_sep:
+                    rel_dir = rel_dir.replace(os.sep, "/")
+                prefix = prefixes[dir_id] = rel_dir + "/" if rel_dir else ""
+            records.append((prefix + name, size, allocated))
+        self._clear_buffer()
+        records.sort()
+        return records
+
+    def spill(self):
+        """把内存中的记录排序后写入一个临时归并段"""
+        if not self._names:
+            return
+        records = self._sorted_buffer()
+        fd, run_path = tempfile.mkstemp(prefix="snapshot_run_", suffix=".tsv", dir=self.temp_dir)
+        with os.fdopen(fd, "w", encoding="utf-8", errors="surrogateescape") as f:
+            _write_records(f, records)
+        self.runs.append(run_path)
+
+    def _reduce_runs(self):
+        """归并段多于MAX_MERGE_RUNS个时先按写入顺序分组归并，最终归并时同时打开的文件数有上限"""
+        while len(self.runs) > MAX_MERGE_RUNS:
+            remaining = self.runs
+            self.runs = []
+            while remaining:
+                group, remaining = remaining[:MAX_MERGE_RUNS], remaining[MAX_MERGE_RUNS:]
+                run_files = []
+                try:
+                    for group_path in group:
+                        run_files.append(open(group_path, "r", encoding="utf-8", errors="surrogateescape"))
+                    fd, run_path = tempfile.mkstemp(prefix="snapshot_run_", suffix=".tsv", dir=self.temp_dir)
+                    self.runs.append(run_path)
+                    with os.fdopen(fd, "w", encoding="utf-8", errors="surrogateescape") as f:
+                        _write_records(f, heapq.merge(*[_read_records(rf) for rf in run_files]))
+                except BaseException:
+                    self.runs.extend(group + remaining)  # 出错时仍由discard()删除
+                    raise
+                finally:
+                    for rf in run_files:
+                        rf.close()
+                for group_path in group:
+                    os.remove(group_path)
+
+    def absorb(self, other):
+        """合并另一个写入器收集的记录和归并段"""
+        self.runs.extend(other.runs)
+        other.runs = []
+        directory_map = [self.directories.intern(other.directories.path(dir_id))
+                         for dir_id in range(len(other.directories))]
+        self._directory.extend(directory_map[dir_id] for dir_id in other._directory)
+        self._names.extend(other._names)
+        self._size.extend(other._size)
+        self._allocated.extend(other._allocated)
+        self._buffer_bytes += other._buffer_bytes
+        other._clear_buffer()
+        if len(self._names) >= self.run_size:
+            self.spill()
+
+    def __getstate__(self):
+        # 缓存为空时路径表中的目录编号都不再使用（见directory_id()），不随进程间传递和检查点保存
+        state = self.__dict__.copy()
+        if not self._names:
+            state['directories'] = PathTable()
+        return state
+
+    def discard(self, keep=()):
+        """删除临时归并段，不写出快照（扫描被取消时）
+        Args:
+            keep: 保留的归并段路径（检查点引用的部分）
+        """
+        for run_path in self.runs:
+            if run_path in keep:
+                continue
+            try:
+                os.remove(run_path)
+            except OSError:
+                pass
+        self.runs = []
+        self._clear_buffer()
+
+    def finish(self, file_path, root, compress=None):
+        """归并所有记录并写出快照（先写临时文件，完成后替换）
+        Args:
+            compress: 是否使用gzip压缩，None表示文件名以.gz结尾时压缩
+        Returns:
+            int: 写入的记录数
+        """
+        records = self._sorted_buffer()
+        run_files = []
+        count = 0
+        temp_path = file_path + ".tmp"
+        if compress is None:
+            compress = file_path.endswith(".gz")
+        try:
+            self._reduce_runs()
+            for run_path in self.runs:
+                run_files.append(open(run_path, "r", encoding="utf-8", errors="surrogateescape"))
+            header = {
+                "format": SNAPSHOT_FORMAT,
+                "version": SNAPSHOT_VERSION,
+                "root": os.path.abspath(root),
+                "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            with _open(temp_path, "w", compress) as f:
+                f.write(json.dumps(header, ensure_ascii=False) + "\n")
+                previous = None
+                for record in heapq.merge(records, *[_read_records(rf) for rf in run_files]):
+                    if record[0] == previous:
+                        continue  # 同一路径只保留一条
+                    previous = record[0]
+                    _write_records(f, (record,))
+                    count += 1
+            os.replace(temp_path, file_path)
+        finally:
+            for rf in run_files:
+                rf.close()
+            self.discard()
+        return count
+
+
+def read_snapshot_header(file_path):
+    """读取快照文件头 {format, version, root, created}"""
+    with _open(file_path, "r") as f:
+        header = json.loads(f.readline())
+    if header.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"不是扫描快照文件: {file_path}")
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"不支持的快照版本: {header.get('version')}")
+    return header
+
+
+def iter_snapshot(file_path):
+    """按路径顺序逐条读取快照记录 (相对路径, 大小, 占用空间)"""
+    read_snapshot_header(file_path)
+    with _open(file_path, "r") as f:
+        f.readline()
+        yield from _read_records(f)
+
+
+class SnapshotDiff:
+    """两个快照的对比结果
+
+    各类变化的总数和总字节数完整统计，具体条目只保留字节变化最大的top个：
+    - added:   新增的文件 [(相对路径, 大小), ...]
+    - removed: 删除的文件 [(相对路径, 大小), ...]
+    - grown:   变大的文件 [(相对路径, 旧大小, 新大小), ...]
+    - grown_dirs: 变大的目录 [(相对路径, 增加的字节数), ...]（"."为扫描根目录）
+    """
+
+    def __init__(self, old_header, new_header, top):
+        self.old_header = old_header
+        self.new_header = new_header
+        self.top = top
+        self.added_count = self.added_bytes = 0
+        self.removed_count = self.removed_bytes = 0
+        self.grown_count = self.grown_bytes = 0
+        self.shrunk_count = self.shrunk_bytes = 0
+        self.unchanged_count = 0
+        self._added = []
+        self._removed = []
+        self._grown = []
+        self._grown_dirs = []
+
+    @property
+    def net_bytes(self):
+        """总大小的净变化"""
+        return self.added_bytes - self.removed_bytes + self.grown_bytes - self.shrunk_bytes
+
+    def _push(self, heap, key, item):
+        if len(heap) < self.top:
+            heapq.heappush(heap, (key, item))
+        elif (key, item) > heap[0]:
+            heapq.heapreplace(heap, (key, item))
+
+    @staticmethod
+    def _ranked(heap):
+        return [item for key, item in sorted(heap, key=lambda pair: (-pair[0], pair[1]))]
+
+    @property
+    def added(self):
+        return self._ranked(self._added)
+
+    @property
+    def removed(self):
+        return self._ranked(self._removed)
+
+    @property
+    def grown(self):
+        return self._ranked(self._grown)
+
+    @property
+    def grown_dirs(self):
+        return self._ranked(self._grown_dirs)
+
+
+def _merge_entries(old_records, new_records):
+    """按路径归并两个已排序的记录流
+    Yields:
+        tuple: (相对路径, 旧大小或None, 新大小或None)
+    """
+    old_iter = iter(old_records)
+    new_iter = iter(new_records)
+    old = next(old_iter, None)
+    new = next(new_iter, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield old[0], old[1], None
+            old = next(old_iter, None)
+        elif old is None or new[0] < old[0]:
+            yield new[0], None, new[1]
+            new = next(new_iter, None)
+        else:
+            yield old[0], old[1], new[1]
+            old = next(old_iter, None)
+            new = next(new_iter, None)
+
+
+def _merge_lines(old_lines, new_lines):
+    """按路径归并两个快照的数据行
+
+    大多数文件在两次扫描之间没有变化，对应的行完全相同，
+    这种情况不解析行内容，直接产生None。
+    """
+    old_iter = iter(old_lines)
+    new_iter = iter(new_lines)
+    old_line = next(old_iter, None)
+    new_line = next(new_iter, None)
+    while True:
+        if old_line == new_line:
+            if old_line is None:
+                return
+            yield None
+            old_line = next(old_iter, None)
+            new_line = next(new_iter, None)
+            continue
+        old = _parse(old_line) if old_line is not None else None
+        new = _parse(new_line) if new_line is not None else None
+        if new is None or (old is not None and old[0] < new[0]):
+            yield old[0], old[1], None
+            old_line = next(old_iter, None)
+        elif old is None or new[0] < old[0]:
+            yield new[0], None, new[1]
+            new_line = next(new_iter, None)
+        else:
+            yield old[0], old[1], new[1]
+            old_line = next(old_iter, None)
+            new_line = next(new_iter, None)
+
+
+def diff_records(old_records, new_records, top=20, dir_depth=None,
+                 old_header=None, new_header=None):
+    """对比两个按路径排序的记录流
+    Args:
+        old_records/new_records: (相对路径, 大小, 占用空间) 的有序迭代器
+        top: 每类变化保留的条目数
+        dir_depth: 只统计该深度的目录（扫描根目录为0），None表示任意深度
+    Returns:
+        SnapshotDiff
+    """
+    result = SnapshotDiff(old_header, new_header, top)
+    _accumulate(result, _merge_entries(old_records, new_records), dir_depth)
+    return result
+
+
+def _accumulate(result, entries, dir_depth):
+    """统计归并后的条目，条目为None表示文件未变化"""
+
+    # 路径有序时同一目录下的条目是连续的，只需维护当前路径上各级目录的增量：
+    # stack[i] = [目录名, 该目录下已处理条目的字节增量]，离开目录时汇总到上一级
+    stack = [[".", 0]]
+
+    def close_dirs(keep):
+        while len(stack) > keep:
+            name, delta = stack.pop()
+            depth = len(stack)
+            if delta > 0 and (dir_depth is None or depth == dir_depth):
+                path = "/".join([item[0] for item in stack[1:]] + [name])
+                result._push(result._grown_dirs, delta, (path, delta))
+            stack[-1][1] += delta
+
+    for entry in entries:
+        if entry is None:
+            result.unchanged_count += 1
+            continue
+        path, old_size, new_size = entry
+        if old_size is None:
+            delta = new_size
+            result.added_count += 1
+            result.added_bytes += new_size
+            result._push(result._added, new_size, (path, new_size))
+        elif new_size is None:
+            delta = -old_size
+            result.removed_count += 1
+            result.removed_bytes += old_size
+            result._push(result._removed, old_size, (path, old_size))
+        else:
+            delta = new_size - old_size
+            if delta > 0:
+                result.grown_count += 1
+                result.grown_bytes += delta
+                result._push(result._grown, delta, (path, old_size, new_size))
+            elif delta < 0:
+                result.shrunk_count += 1
+                result.shrunk_bytes -= delta
+            else:
+                result.unchanged_count += 1
+                continue
+
+        parts = path.split("/")[:-1]
+        common = 0
+        while common < len(parts) and common + 1 < len(stack) and stack[common + 1][0] == parts[common]:
+            common += 1
+        close_dirs(common + 1)
+        for name in parts[common:]:
+            stack.append([name, 0])
+        stack[-1][1] += delta
+
+    close_dirs(1)
+    if stack[0][1] > 0 and (dir_depth is None or dir_depth == 0):
+        result._push(result._grown_dirs, stack[0][1], (".", stack[0][1]))
+
+
+def diff_snapshots(old_path, new_path, top=20, dir_depth=None):
+    """对比两个快照文件
+    Returns:
+        SnapshotDiff
+    Raises:
+        ValueError: 文件不是快照，或两个快照的扫描根目录不同
+    """
+    old_header = read_snapshot_header(old_path)
+    new_header = read_snapshot_header(new_path)
+    if old_header["root"] != new_header["root"]:
+        raise ValueError(f"快照的扫描根目录不同: {old_header['root']} / {new_header['root']}")
+    result = SnapshotDiff(old_header, new_header, top)
+    with _open(old_path, "r") as old_f, _open(new_path, "r") as new_f:
+        old_f.readline()
+        new_f.readline()
+        _accumulate(result, _merge_lines(old_f, new_f), dir_depth)
+    return result
+
+
+def format_diff(diff, format_size, limit=10):
+    """把对比结果格式化为文本行"""
+    lines = [
+        f"对比: {diff.old_header['created']} -> {diff.new_header['created']}",
+        f"总大小变化: {'+' if diff.net_bytes >= 0 else '-'}{format_size(abs(diff.net_bytes))}",
+        f"新增文件: {diff.added_count:,} 个, +{format_size(diff.added_bytes)}",
+        f"删除文件: {diff.removed_count:,} 个, -{format_size(diff.removed_bytes)}",
+        f"变大文件: {diff.grown_count:,} 个, +{format_size(diff.grown_bytes)}",
+        f"变小文件: {diff.shrunk_count:,} 个, -{format_size(diff.shrunk_bytes)}",
+    ]
+    if diff.grown_dirs:
+        lines.append(f"增长最多的目录 (前{min(limit, len(diff.grown_dirs))}个):")
+        lines.extend(f"   +{format_size(delta):<12} {path}" for path, delta in diff.grown_dirs[:limit])
+    if diff.added:
+        lines.append(f"最大的新增文件 (前{min(limit, len(diff.added))}个):")
+        lines.extend(f"   +{format_size(size):<12} {path}" for path, size in diff.added[:limit])
+    if diff.grown:
+        lines.append(f"增长最多的文件 (前{min(limit, len(diff.grown))}个):")
+        lines.extend(f"   +{format_size(new - old):<12} {path} ({format_size(old)} -> {format_size(new)})"
+                     for path, old, new in diff.grown[:limit])
+    if diff.removed:
+        lines.append(f"最大的删除文件 (前{min(limit, len(diff.removed))}个):")
+        lines.extend(f"   -{format_size(size):<12} {path}" for path, size in diff.removed[:limit])
+    return lines
+
+
+def main():
+    """对比两个快照文件并输出变化"""
+    if len(sys.argv) < 3:
+        print("用法: python scan_snapshot.py 旧快照 新快照 [显示条数]")
+        return 1
+    limit = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    from disk_scanner_simple import format_size
+    try:
+        diff = diff_snapshots(sys.argv[1], sys.argv[2], top=limit)
+    except (OSError, ValueError) as e:
+        print(f"[错误] 无法对比快照: {e}")
+        return 1
+    print(f"[信息] 扫描根目录: {diff.new_header['root']}")
+    for line in format_diff(diff, format_size, limit):
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+外部排序归并段
+内存中的记录超过预算时排序写入临时文件，最后与内存中剩余的记录一起用
+heapq.merge按顺序归并，处理超出内存的记录集合时内存占用有上限：
+归并时每个归并段只载入一块记录，归并段过多时先分组归并，同时打开的归并段数也有上限
+"""
+
+import os
+import heapq
+import pickle
+import tempfile
+import itertools
+
+# 每次pickle写入的记录数，读取时一次只载入一块
+CHUNK_RECORDS = 64
+
+# 最终归并时同时打开的归并段数，超出时先分组归并为较大的归并段
+MAX_MERGE_RUNS = 16
+
+
+def _write_run(f, records):
+    """按块写入已排序的记录（可以是迭代器）"""
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, CHUNK_RECORDS))
+        if not chunk:
+            return
+        pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read_run(run_path):
+    """按块读取一个归并段中的记录"""
+    with open(run_path, 'rb') as f:
+        while True:
+            try:
+                chunk = pickle.load(f)
+            except EOFError:
+                return
+            yield from chunk
+
+
+class SortedRuns:
+    """一组已排序的临时归并段
+
+    记录为元组，按key（默认为整个元组）排序。归并段用pickle分块写入，
+    只由本进程或同一次扫描的工作进程写入和读取。
+    """
+
+    def __init__(self, temp_dir=None, prefix="spill_", key=None):
+        self.temp_dir = temp_dir
+        self.prefix = prefix
+        self.key = key
+        self.runs = []
+
+    def __len__(self):
+        return len(self.runs)
+
+    def spill(self, records):
+        """把一批记录排序后写入一个新的归并段"""
+        records = sorted(records, key=self.key)
+        if not records:
+            return
+        fd, run_path = tempfile.mkstemp(prefix=self.prefix, suffix=".run", dir=self.temp_dir)
+        self.runs.append(run_path)
+        with os.fdopen(fd, 'wb') as f:
+            _write_run(f, records)
+
+    def extend(self, other):
+        """接管另一组归并段"""
+        self.runs.extend(other.runs)
+        other.runs = []
+
+    def _merge_group(self, group):
+        """把一组归并段归并为一个新的临时归并段，返回其路径"""
+        fd, run_path = tempfile.mkstemp(prefix=self.prefix, suffix=".run", dir=self.temp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                _write_run(f, heapq.merge(*[_read_run(path) for path in group], key=self.key))
+        except BaseException:
+            os.remove(run_path)
+            raise
+        return run_path
+
+    def _merge_all(self, records):
+        """归并段多于MAX_MERGE_RUNS个时按写入顺序分组归并为中间归并段（保持key相同的记录的先后顺序），
+        最后与内存中的记录一起归并；中间归并段在归并结束后删除，原有的归并段只由discard()删除
+        """
+        runs = self.runs
+        intermediate = []
+        try:
+            while len(runs) > MAX_MERGE_RUNS:
+                merged_runs = []
+                for i in range(0, len(runs), MAX_MERGE_RUNS):
+                    group = runs[i:i + MAX_MERGE_RUNS]
+                    if len(group) == 1:
+                        merged_runs.append(group[0])
+                        continue
+                    run_path = self._merge_group(group)
+                    intermediate.append(run_path)
+                    merged_runs.append(run_path)
+                runs = merged_runs
+            streams = [_read_run(run_path) for run_path in runs]
+            streams.append(records)
+            yield from heapq.merge(*streams, key=self.key)
+        finally:
+            for run_path in intermediate:
+                try:
+                    os.remove(run_path)
+                except OSError:
+                    pass
+
+    def merged(self, records=()):
+        """按顺序归并所有归并段和内存中的记录
+
+        key相同的记录按归并段写入的先后排列，内存中的记录排在最后。
+        """
+        return self._merge_all(sorted(records, key=self.key))
+
+    def discard(self, keep=()):
+        """删除临时归并段
+        Args:
+            keep: 保留的归并段路径（如检查点引用的归并段）
+        """
+        for run_path in self.runs:
+            if run_path in keep:
+                continue
+            try:
+                os.remove(run_path)
+            except OSError:
+                pass
+        self.runs = []
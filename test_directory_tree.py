@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目录树的回归测试：相对根目录"."下名称只有一个字符的子目录不能并入根节点
+"""
+
+import os
+
+from disk_scanner_simple import DiskScanner
+
+
+def make_tree(root):
+    """a/、b/c/、bb/ 各一个文件，根目录一个文件"""
+    for sub_dir, size in (("", 1000), ("a", 2000), (os.path.join("b", "c"), 3000), ("bb", 4000)):
+        directory = os.path.join(root, sub_dir)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "file.dat"), 'wb') as f:
+            f.write(b'\0' * size)
+
+
+def scan_tree(path, history_dir):
+    scanner = DiskScanner()
+    scanner.set_quiet(True)
+    scanner.history_file = os.path.join(history_dir, "history.json")
+    scanner.scan_directory(path, 0, 100, False)
+    tree = scanner.directory_tree
+    return sorted((os.path.relpath(tree.path(node), path), tree.depth[node]) + tree.info(node)[1:]
+                  for node in range(len(tree)))
+
+
+def test_relative_root_with_short_names(tmp_path, monkeypatch):
+    root = tmp_path / "tree"
+    make_tree(str(root))
+    absolute = scan_tree(str(root), str(tmp_path))
+
+    monkeypatch.chdir(root)
+    relative = scan_tree(".", str(tmp_path))
+    assert relative == absolute
+    assert [(path, depth) for path, depth, *_ in relative] == [
+        (".", 0), ("a", 1), ("b", 1), (os.path.join("b", "c"), 2), ("bb", 1)]
+    assert relative[0][2:] == (10000, 4, "bb" + os.sep, 4000)
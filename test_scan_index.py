@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描索引的回归测试：上次扫描没有列出的子目录在重复扫描时不能丢失
+"""
+
+import os
+import time
+
+from disk_scanner_simple import DiskScanner
+
+
+def make_tree(root):
+    """根目录下3个文件，普通子目录和隐藏子目录（各含子目录）共7个文件，合计63,000字节"""
+    layout = {
+        "": [1000, 2000, 3000],
+        "a": [4000, 5000],
+        os.path.join("a", "deep"): [6000, 7000],
+        ".hidden": [8000, 9000],
+        os.path.join(".hidden", "inner"): [18000],
+    }
+    for sub_dir, sizes in layout.items():
+        directory = os.path.join(root, sub_dir)
+        os.makedirs(directory, exist_ok=True)
+        for i, size in enumerate(sizes):
+            with open(os.path.join(directory, f"file{i}.dat"), 'wb') as f:
+                f.write(b'\0' * size)
+    # 目录的修改时间调到过去，索引才会信任这些目录
+    past = time.time() - 3600
+    for directory, _, _ in os.walk(root):
+        os.utime(directory, (past, past))
+
+
+def scan(root, index_path=None, include_hidden=True, configure=None):
+    scanner = DiskScanner()
+    scanner.set_quiet(True)
+    scanner.history_file = os.path.join(os.path.dirname(root), "history.json")
+    if index_path is not None:
+        scanner.set_scan_index(index_path)
+    if configure is not None:
+        configure(scanner)
+    scanner.scan_directory(root, 0, 100, include_hidden)
+    if scanner.scan_index is not None:
+        scanner.scan_index.close()
+    return scanner
+
+
+def test_rescan_after_cancelled_scan(tmp_path):
+    root = str(tmp_path / "tree")
+    index_path = str(tmp_path / "index.db")
+    make_tree(root)
+
+    def cancel_after_first_directory(scanner):
+        # 每个目录都报告进度，第一次报告（根目录列完）时取消
+        scanner.set_progress_interval(0)
+        scanner.set_progress_callback(lambda progress, scanned, total: scanner.cancel())
+
+    cancelled = scan(root, index_path, configure=cancel_after_first_directory)
+    assert not cancelled.scan_complete
+
+    rescan = scan(root, index_path)
+    assert rescan.scan_complete
+    assert (rescan.total_files, rescan.total_size) == (10, 63000)
+
+
+def test_rescan_with_changed_filter(tmp_path):
+    root = str(tmp_path / "tree")
+    index_path = str(tmp_path / "index.db")
+    make_tree(root)
+
+    visible = scan(root, index_path, include_hidden=False)
+    assert (visible.total_files, visible.total_size) == (7, 28000)
+
+    rescan = scan(root, index_path, include_hidden=True)
+    full = scan(root)
+    assert (rescan.total_files, rescan.total_size) == (full.total_files, full.total_size) == (10, 63000)
+    assert rescan.scan_index.hits > 0
+
+
+def test_undecodable_names(tmp_path):
+    # 不是合法UTF-8的目录名和文件名，使用索引时也不能让扫描失败
+    root = os.path.join(os.fsencode(str(tmp_path / "tree")), b"d\xff")
+    os.makedirs(root)
+    for name, size in ((b"f\xfe.dat", 5000), (b"ok.dat", 3000)):
+        with open(os.path.join(root, name), 'wb') as f:
+            f.write(b'\0' * size)
+    past = time.time() - 3600
+    os.utime(root, (past, past))
+    tree = str(tmp_path / "tree")
+    index_path = str(tmp_path / "index.db")
+
+    plain = scan(tree)
+    indexed = scan(tree, index_path)
+    rescan = scan(tree, index_path)
+    assert (plain.total_files, plain.total_size) == (2, 8000)
+    assert (indexed.total_files, indexed.total_size) == (rescan.total_files, rescan.total_size) == (2, 8000)
+    assert rescan.scan_index.hits > 0